@@ -0,0 +1,216 @@
+"""
+Pipeline benchmark over a ladder of synthetic dataset sizes.
+For every size a CSV is generated once (benchmarks/synthetic_data.py, cached in
+--data-dir), then each ml_pipeline function and each process.py stage (in-memory
+and streaming graphs) is timed on it: wall and CPU seconds, rows per second and
+peak Python-heap memory (tracemalloc; numpy buffers included). Stages run
+in-process in graph order on their dependencies' results, so each number is
+that stage alone, without pool scheduling or uploads. Peak RSS of the process
+during each call is recorded too (Linux; elsewhere the lifetime peak), and
+--compact runs everything with float32/int8 dtypes.
+Results are written as JSON tagged with the git revision; --compare prints the
+ratio against an earlier results file.
+
+Usage:
+    python benchmarks/bench_pipeline.py
+    python benchmarks/bench_pipeline.py --sizes 100000,1000000,10000000 --modes streaming
+    python benchmarks/bench_pipeline.py --sizes 100000 --compare benchmarks/results/abc1234.json
+    python benchmarks/bench_pipeline.py --sizes 1000000 --compact --out compact.json --compare default.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from functools import partial
+from typing import Callable, Dict, List
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+# config refuses to load without these; nothing is uploaded, so their values do not matter
+for _name, _value in (("SUPABASE_URL", "http://localhost"), ("SUPABASE_ANON_KEY", "anon"),
+                      ("SUPABASE_SERVICE_KEY", "service")):
+    os.environ.setdefault(_name, _value)
+
+import numpy as np  # noqa: E402
+
+import config  # noqa: E402
+import ml_pipeline as ml  # noqa: E402
+import process  # noqa: E402
+from metrics import peak_rss_mb, reset_peak_rss  # noqa: E402
+from synthetic_data import write_csv  # noqa: E402
+
+DEFAULT_SIZES = "10000,100000,1000000"
+
+
+class Recorder:
+    """Runs callables under the timers and collects one result row per call."""
+
+    def __init__(self, memory: bool = True):
+        self.memory = memory
+        self.results: List[Dict] = []
+        if memory:
+            tracemalloc.start()
+
+    def measure(self, kind: str, mode: str, rows: int, name: str, func: Callable, *args, **kwargs):
+        if self.memory:
+            baseline = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        reset_peak_rss()
+        wall, cpu = time.perf_counter(), time.process_time()
+        result = func(*args, **kwargs)
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        row = {
+            "size": rows, "kind": kind, "mode": mode, "name": name,
+            "seconds": round(wall, 4), "cpu_seconds": round(cpu, 4),
+            "rows_per_second": round(rows / wall, 1) if wall > 0 else None,
+            "peak_mb": round((tracemalloc.get_traced_memory()[1] - baseline) / 2**20, 2) if self.memory else None,
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+        }
+        self.results.append(row)
+        print(f"{rows:>10} {kind:<8} {mode:<9} {name:<22} {row['seconds']:9.3f}s {row['cpu_seconds']:9.3f}s "
+              f"{row['rows_per_second'] or 0:12.0f} {row['peak_mb'] if self.memory else '-':>9} "
+              f"{row['peak_rss_mb']:>8}", flush=True)
+        return result
+
+
+def bench_functions(rec: Recorder, csv_path: str, rows: int, n_clusters: int, chunk_rows: int,
+                    compact: bool = False):
+    """Each ml_pipeline building block, fed the way process.py feeds it."""
+    run = partial(rec.measure, "function", "-", rows)
+
+    schema, _ = run("scan_csv", ml.scan_csv, csv_path, chunk_rows, sample_rows=config.STREAM_SAMPLE_ROWS,
+                    compact=compact)
+    df, _ = run("read_preprocessed", ml.read_preprocessed, csv_path, chunk_rows, compact=compact)
+    numeric = df.select_dtypes(include=[np.number]).columns.tolist()
+
+    def streaming_stats():
+        stats = ml.StreamingStats(numeric, config.QUANTILE_SKETCH_K)
+        for chunk in ml.iter_preprocessed_chunks(csv_path, schema, chunk_rows):
+            stats.update(chunk)
+        return stats
+
+    run("summarize_frame", ml.summarize_frame, df)
+    run("StreamingStats", streaming_stats)
+    run("compute_correlation", ml.compute_correlation, df)
+    scaled, _ = run("scale_features", ml.scale_features, df)
+    _, models = run("elbow_sweep", ml.elbow_sweep, scaled, keep_all=True, n_jobs=config.ELBOW_JOBS,
+                    minibatch_rows=config.ELBOW_MINIBATCH_ROWS, sample_rows=config.ELBOW_SAMPLE_ROWS,
+                    flat_tol=config.ELBOW_FLAT_TOL)
+    clustered, _, _ = run("run_kmeans", ml.run_kmeans, df, n_clusters, scaled_data=scaled,
+                          model=models.get(n_clusters))
+    labels = run("label_by_k", ml.label_by_k, scaled, {k: m for k, m in models.items() if k >= 2})
+    run("pack_labels", ml.pack_labels, labels)
+    run("compute_histograms", ml.compute_histograms, clustered, n_clusters, bins=config.HIST_BINS,
+        grid=config.DENSITY_GRID)
+    run("compute_tsne", ml.compute_tsne, scaled, clustered["cluster_id"].values, fit_points=config.TSNE_FIT_POINTS,
+        max_rows=config.TSNE_MAX_ROWS, angle=config.TSNE_ANGLE, n_iter=config.TSNE_ITER)
+    run("fit_streaming_kmeans", ml.fit_streaming_kmeans,
+        partial(ml.iter_preprocessed_chunks, csv_path, schema, chunk_rows),
+        n_clusters=n_clusters, sample_rows=config.STREAM_SAMPLE_ROWS)
+
+
+def bench_stages(rec: Recorder, csv_path: str, rows: int, n_clusters: int, chunk_rows: int, streaming: bool,
+                 compact: bool = False):
+    """Every stage of process.build_stages, run in dependency order."""
+    mode = "streaming" if streaming else "memory"
+    results: Dict[str, object] = {}
+    pending = process.build_stages(csv_path, n_clusters, streaming, chunk_rows, compact=compact)
+    while pending:
+        stage = next(s for s in pending if all(d in results for d in s.deps))
+        results[stage.name] = rec.measure("stage", mode, rows, stage.name, stage.func,
+                                          *(results[d] for d in stage.deps), **stage.kwargs)
+        pending.remove(stage)
+
+
+def git_revision() -> str:
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                             text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "diff", "--quiet", "HEAD", "--", "*.py"], cwd=ROOT).returncode != 0
+        return rev + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(results: List[Dict], base_path: str):
+    """Print seconds and peak memory against a previous results file (ratio > 1 is slower/larger)."""
+    with open(base_path) as fh:
+        base = json.load(fh)
+    key = lambda r: (r["size"], r["kind"], r["mode"], r["name"])  # noqa: E731
+    before = {key(r): r for r in base["results"]}
+    print(f"\nAgainst {base.get('revision', base_path)}:")
+    print(f"{'size':>10} {'kind':<8} {'mode':<9} {'name':<22} {'time x':>8} {'memory x':>9} {'RSS x':>7}")
+    for r in results:
+        old = before.get(key(r))
+        if old is None:
+            continue
+        t = r["seconds"] / old["seconds"] if old["seconds"] else float("nan")
+        mem = (r["peak_mb"] / old["peak_mb"] if r["peak_mb"] is not None and old.get("peak_mb")
+               else float("nan"))
+        rss = r["peak_rss_mb"] / old["peak_rss_mb"] if old.get("peak_rss_mb") else float("nan")
+        print(f"{r['size']:>10} {r['kind']:<8} {r['mode']:<9} {r['name']:<22} {t:8.2f} {mem:9.2f} {rss:7.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="comma-separated row counts")
+    parser.add_argument("--modes", default="memory,streaming", help="stage graphs to run (memory, streaming)")
+    parser.add_argument("--skip-functions", action="store_true", help="only benchmark the process.py stages")
+    parser.add_argument("--clusters", type=int, default=3)
+    parser.add_argument("--chunk-rows", type=int, default=100_000)
+    parser.add_argument("--nan-rate", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--data-dir", default=os.path.join(HERE, "data"), help="where generated CSVs are kept")
+    parser.add_argument("--out", help="results JSON (default benchmarks/results/<revision>.json)")
+    parser.add_argument("--compare", metavar="BASE", help="results JSON of an earlier revision")
+    parser.add_argument("--no-memory", action="store_true", help="skip tracemalloc (it slows Python-heavy code)")
+    parser.add_argument("--compact", action="store_true", help="float32/int8 dtypes (process.py --compact)")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    revision = git_revision()
+    # ml_pipeline imports scikit-learn on first use; load it now so no timed call pays for it
+    import sklearn.cluster, sklearn.manifold, sklearn.neighbors, sklearn.preprocessing  # noqa: E401, F401
+    rec = Recorder(memory=not args.no_memory)
+    os.makedirs(args.data_dir, exist_ok=True)
+
+    print(f"{'size':>10} {'kind':<8} {'mode':<9} {'name':<22} {'wall':>10} {'cpu':>10} {'rows/s':>12} {'peak MB':>9} "
+          f"{'RSS MB':>8}")
+    for rows in sizes:
+        csv_path = os.path.join(args.data_dir, f"synthetic_{rows}_s{args.seed}_nan{args.nan_rate:g}.csv")
+        if not os.path.exists(csv_path):
+            write_csv(csv_path, rows, seed=args.seed, nan_rate=args.nan_rate)
+        if not args.skip_functions:
+            bench_functions(rec, csv_path, rows, args.clusters, args.chunk_rows, args.compact)
+        for mode in modes:
+            bench_stages(rec, csv_path, rows, args.clusters, args.chunk_rows, streaming=(mode == "streaming"),
+                         compact=args.compact)
+
+    out = args.out or os.path.join(HERE, "results", f"{revision}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as fh:
+        json.dump({
+            "revision": revision,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "settings": {"clusters": args.clusters, "chunk_rows": args.chunk_rows, "nan_rate": args.nan_rate,
+                         "seed": args.seed, "tsne_iter": config.TSNE_ITER, "memory": not args.no_memory,
+                         "compact": args.compact},
+            "results": rec.results,
+        }, fh, indent=2)
+    print(f"\nWrote {out}")
+    if args.compare:
+        compare(rec.results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
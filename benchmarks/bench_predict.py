@@ -0,0 +1,180 @@
+"""
+Latency and throughput of cluster assignment (predict.py).
+Fits a clustering state on a synthetic CSV (or loads --model), checks that the
+compiled predictor labels rows exactly like the pipeline's own preprocess +
+KMeans.predict path, then measures:
+  - single-record latency (p50/p99 over --calls calls) in process and over HTTP
+  - batch throughput in records per second for each --batch-sizes entry, for the
+    predictor on JSON-style dicts and on a raw DataFrame, and, as the baseline, for
+    preprocess_chunk + ClusterState.assign on the same DataFrame (pandas + scikit-learn);
+    speedup compares the two DataFrame paths
+Results are written as JSON tagged with the git revision.
+
+Usage:
+    python benchmarks/bench_predict.py
+    python benchmarks/bench_predict.py --model models/<run_id>.joblib --batch-sizes 1,100,10000
+"""
+
+import argparse
+import http.client
+import json
+import os
+import sys
+import threading
+import time
+from typing import Callable, Dict, List
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+# config refuses to load without these; nothing is uploaded, so their values do not matter
+for _name, _value in (("SUPABASE_URL", "http://localhost"), ("SUPABASE_ANON_KEY", "anon"),
+                      ("SUPABASE_SERVICE_KEY", "service")):
+    os.environ.setdefault(_name, _value)
+
+import numpy as np  # noqa: E402
+
+import config  # noqa: E402
+import ml_pipeline as ml  # noqa: E402
+from bench_pipeline import git_revision  # noqa: E402
+from cluster_state import ClusterState  # noqa: E402
+from predict import Predictor, serve  # noqa: E402
+from synthetic_data import SyntheticProfile, write_csv  # noqa: E402
+
+
+def fit_state(csv_path: str, n_clusters: int) -> ClusterState:
+    """A ClusterState fitted on csv_path the way an in-memory process.py run fits it."""
+    from sklearn.cluster import KMeans
+
+    df, schema = ml.read_preprocessed(csv_path)
+    scaled, scaler = ml.scale_features(df)
+    model = KMeans(n_clusters=n_clusters, random_state=42, n_init=10).fit(scaled)
+    numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
+    return ClusterState("bench", schema, numeric_cols, scaler, model, ml.ClusterSummary(n_clusters),
+                        ml.StreamingStats(numeric_cols, config.QUANTILE_SKETCH_K), n_rows=len(df))
+
+
+def percentiles(seconds: List[float]) -> Dict[str, float]:
+    ms = np.asarray(seconds) * 1000
+    return {"p50_ms": round(float(np.percentile(ms, 50)), 4), "p99_ms": round(float(np.percentile(ms, 99)), 4),
+            "max_ms": round(float(ms.max()), 4)}
+
+
+def time_calls(func: Callable, args_list: list) -> List[float]:
+    out = []
+    for args in args_list:
+        start = time.perf_counter()
+        func(*args)
+        out.append(time.perf_counter() - start)
+    return out
+
+
+def throughput(func: Callable, batch, min_seconds: float = 0.5) -> float:
+    """Records per second of func(batch), repeated for at least min_seconds."""
+    func(batch)
+    calls, start = 0, time.perf_counter()
+    while True:
+        func(batch)
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds:
+            return calls * len(batch) / elapsed
+
+
+def http_latency(predictor: Predictor, records: List[dict], batch: List[dict]) -> Dict[str, Dict[str, float]]:
+    """Single-record latency and one batch's latency against a local server, over one keep-alive connection."""
+    server = serve(predictor, "127.0.0.1", 0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    conn = http.client.HTTPConnection("127.0.0.1", server.server_address[1])
+
+    def post(payload):
+        conn.request("POST", "/predict", body=json.dumps(payload), headers={"Content-Type": "application/json"})
+        resp = conn.getresponse()
+        resp.read()
+        assert resp.status == 200, resp.status
+
+    try:
+        single = time_calls(post, [(r,) for r in records])
+        batched = time_calls(post, [(batch,)] * 20)
+        service = server.RequestHandlerClass.latency.summary()
+    finally:
+        conn.close()
+        server.shutdown()
+        server.server_close()
+    return {"single": percentiles(single), f"batch_{len(batch)}": percentiles(batched), "server_side": service}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", help="saved clustering state to benchmark (default: fit one on synthetic data)")
+    parser.add_argument("--train-rows", type=int, default=50_000)
+    parser.add_argument("--clusters", type=int, default=3)
+    parser.add_argument("--calls", type=int, default=5000, help="single-record calls for the latency percentiles")
+    parser.add_argument("--batch-sizes", default="1,10,100,1000,10000,100000")
+    parser.add_argument("--nan-rate", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--no-http", action="store_true", help="skip the HTTP round-trip measurements")
+    parser.add_argument("--data-dir", default=os.path.join(HERE, "data"))
+    parser.add_argument("--out", help="results JSON (default benchmarks/results/predict-<revision>.json)")
+    args = parser.parse_args()
+
+    if args.model:
+        state = ClusterState.load(args.model)
+    else:
+        os.makedirs(args.data_dir, exist_ok=True)
+        csv_path = os.path.join(args.data_dir, f"synthetic_{args.train_rows}_s{args.seed}_nan{args.nan_rate:g}.csv")
+        if not os.path.exists(csv_path):
+            write_csv(csv_path, args.train_rows, seed=args.seed, nan_rate=args.nan_rate)
+        state = fit_state(csv_path, args.clusters)
+    predictor = Predictor(state)
+
+    sizes = [int(s) for s in args.batch_sizes.split(",") if s]
+    frame = SyntheticProfile().sample(max(sizes + [args.calls]), np.random.default_rng(args.seed + 1), args.nan_rate)
+    frame = frame[[c for c in frame.columns if c in state.schema.input_columns]]
+    records = [{k: (None if isinstance(v, float) and np.isnan(v) else v) for k, v in r.items()}
+               for r in frame.to_dict(orient="records")]
+
+    expected = state.assign(ml.preprocess_chunk(frame, state.schema))
+    agree = float((predictor.predict(frame)[0] == expected).mean())
+    agree_records = float((predictor.predict(records)[0] == expected).mean())
+    print(f"Run {state.run_id}: K={predictor.n_clusters}, {len(predictor.features)} features; "
+          f"agreement with the pipeline: {agree:.4%} (frame), {agree_records:.4%} (records)")
+
+    latency = percentiles(time_calls(predictor.predict_one, [(r,) for r in records[:args.calls]]))
+    print(f"\nin-process single record: p50 {latency['p50_ms']:.3f} ms, p99 {latency['p99_ms']:.3f} ms")
+
+    print(f"\n{'batch':>8} {'dicts rec/s':>12} {'frame rec/s':>12} {'pipeline rec/s':>15} {'speedup':>8}")
+    batches = []
+    for size in sizes:
+        batch, sub = records[:size], frame.iloc[:size]
+        dicts = throughput(predictor.predict, batch)
+        fast = throughput(predictor.predict, sub)
+        base = throughput(lambda b: state.assign(ml.preprocess_chunk(b, state.schema)), sub)
+        batches.append({"size": size, "records_per_second": {
+            "predictor_dicts": round(dicts, 1), "predictor_frame": round(fast, 1), "pipeline_frame": round(base, 1)}})
+        print(f"{size:>8} {dicts:12,.0f} {fast:12,.0f} {base:15,.0f} {fast / base:8.1f}")
+
+    http = None
+    if not args.no_http:
+        http = http_latency(predictor, records[:min(args.calls, 2000)], records[:1000])
+        print(f"\nHTTP single record: p50 {http['single']['p50_ms']:.3f} ms, p99 {http['single']['p99_ms']:.3f} ms; "
+              f"batch of 1000: p50 {http['batch_1000']['p50_ms']:.3f} ms")
+
+    revision = git_revision()
+    out = args.out or os.path.join(HERE, "results", f"predict-{revision}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as fh:
+        json.dump({
+            "revision": revision,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "model": args.model or f"synthetic {args.train_rows} rows, K={args.clusters}",
+            "agreement": agree,
+            "single_record": latency,
+            "batches": batches,
+            "http": http,
+        }, fh, indent=2)
+    print(f"\nWrote {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""
+Upload formats of process.insert_frame, against a local PostgREST stand-in.
+Builds a clustered_data-like frame from a synthetic CSV (preprocessed features,
+cluster_id, cluster_ids, run_id, with --null-rate of the feature values blanked)
+and sends it as:
+  - json       row dicts as JSON arrays (supabase_client bulk_insert)
+  - csv        column-ordered CSV bodies (bulk_insert_columns, compress=False)
+  - csv+gzip   the same, gzip-compressed (what insert_frame uses for large frames)
+For each format it reports the serialization CPU of the frame -> request bodies
+path alone (compression included), then uploads to the stand-in and reports
+requests, bytes on the wire and upload wall time. The stand-in decodes every
+body the way PostgREST does (Content-Encoding gzip, text/csv with a header line
+and NULL as SQL null) and the run fails unless it received exactly the frame's
+rows. --reject-gzip makes it answer 400 to compressed bodies, exercising the
+client's fallback to plain CSV.
+Results are written as JSON tagged with the git revision.
+
+Usage:
+    python benchmarks/bench_upload.py
+    python benchmarks/bench_upload.py --rows 1000000 --workers 8
+    python benchmarks/bench_upload.py --rows 20000 --reject-gzip
+"""
+
+import argparse
+import csv
+import gzip
+import io
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+# config refuses to load without these; uploads go to the local stand-in, never to them
+for _name, _value in (("SUPABASE_URL", "http://localhost"), ("SUPABASE_ANON_KEY", "anon"),
+                      ("SUPABASE_SERVICE_KEY", "service")):
+    os.environ.setdefault(_name, _value)
+
+import numpy as np  # noqa: E402
+
+import ml_pipeline as ml  # noqa: E402
+import process  # noqa: E402
+import supabase_client as sc  # noqa: E402
+from bench_pipeline import git_revision  # noqa: E402
+from metrics import REQUESTS  # noqa: E402
+from synthetic_data import write_csv  # noqa: E402
+
+FORMATS = ("json", "csv", "csv+gzip")
+TABLE = "clustered_data"
+
+
+class _StandIn(BaseHTTPRequestHandler):
+    """POST /rest/v1/<table>: decode the body like PostgREST and keep the rows."""
+    protocol_version = "HTTP/1.1"
+    reject_gzip = False
+    lock = threading.Lock()
+    rows: List[dict] = []
+    bodies: Dict[str, int] = {}
+
+    def do_POST(self):
+        raw = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        encoding = self.headers.get("Content-Encoding")
+        ctype = self.headers.get("Content-Type", "")
+        if encoding == "gzip" and self.reject_gzip:
+            return self._send(400, b'{"message":"invalid input"}')
+        try:
+            body = gzip.decompress(raw) if encoding == "gzip" else raw
+            if ctype.startswith("text/csv"):
+                reader = csv.reader(io.StringIO(body.decode()))
+                header = next(reader)
+                rows = [{k: None if v == "NULL" else v for k, v in zip(header, line, strict=True)} for line in reader]
+            elif ctype.startswith("application/json"):
+                rows = json.loads(body)
+            else:
+                return self._send(415, b'{"message":"unsupported media type"}')
+        except (OSError, ValueError, UnicodeDecodeError) as e:
+            return self._send(400, json.dumps({"message": str(e)}).encode())
+        with self.lock:
+            self.rows.extend(rows)
+            kind = f"{ctype}+{encoding}" if encoding else ctype
+            self.bodies[kind] = self.bodies.get(kind, 0) + 1
+        self._send(201)
+
+    def _send(self, code: int, body: bytes = b""):
+        self.send_response(code)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def canonical(rows: List[dict], columns: List[str]) -> List[tuple]:
+    """Rows as sorted tuples of text values (None kept), comparable across JSON and CSV."""
+    return sorted(tuple("\0" if r[c] is None else str(r[c]) for c in columns) for r in rows)
+
+
+def sample_frame(csv_path: str, null_rate: float, seed: int):
+    """A preprocessed frame with clustered_data's label columns and some missing feature values."""
+    df, _ = ml.read_preprocessed(csv_path)
+    rng = np.random.default_rng(seed)
+    for col in df.select_dtypes(include="float").columns:
+        df.loc[rng.random(len(df)) < null_rate, col] = np.nan
+    df["cluster_id"] = rng.integers(0, 3, len(df))
+    df["cluster_ids"] = ml.pack_labels(np.stack([rng.integers(0, k, len(df)) for k in range(1, 11)], axis=1))
+    return df
+
+
+def encode(fmt: str, df, run_id: str, chunk_size: int) -> List[bytes]:
+    """Request bodies of one format, as insert_frame would produce them."""
+    if fmt == "json":
+        rows = (r for batch in process.iter_record_batches(df, chunk_size, run_id) for r in batch)
+        return [p for p, _ in sc._encode_chunks(rows, sc.UPLOAD_CHUNK_BYTES, sc.UPLOAD_CHUNK_ROWS)]
+    bodies = sc._encode_csv_chunks(process.frame_columns(df, run_id), process.iter_column_batches(df, chunk_size, run_id),
+                                   sc.UPLOAD_CHUNK_BYTES, sc.UPLOAD_CHUNK_ROWS)
+    if fmt == "csv+gzip":
+        return [gzip.compress(p, sc.CSV_GZIP_LEVEL) for p, _ in bodies]
+    return [p for p, _ in bodies]
+
+
+def upload(fmt: str, client: sc.SupabaseClient, df, run_id: str, chunk_size: int, workers: int) -> int:
+    if fmt == "json":
+        rows = (r for batch in process.iter_record_batches(df, chunk_size, run_id) for r in batch)
+        return client.bulk_insert(TABLE, rows, workers=workers)
+    return client.bulk_insert_columns(TABLE, process.frame_columns(df, run_id),
+                                      process.iter_column_batches(df, chunk_size, run_id),
+                                      workers=workers, compress=fmt == "csv+gzip")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--chunk-size", type=int, default=1000, help="insert_frame's conversion chunk")
+    parser.add_argument("--workers", type=int, default=sc.UPLOAD_WORKERS)
+    parser.add_argument("--null-rate", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--reject-gzip", action="store_true", help="stand-in answers 400 to gzip bodies")
+    parser.add_argument("--data-dir", default=os.path.join(HERE, "data"))
+    parser.add_argument("--out", help="results JSON (default benchmarks/results/upload-<revision>.json)")
+    args = parser.parse_args()
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    csv_path = os.path.join(args.data_dir, f"synthetic_{args.rows}_s{args.seed}_nan0.01.csv")
+    if not os.path.exists(csv_path):
+        write_csv(csv_path, args.rows, seed=args.seed)
+    df = sample_frame(csv_path, args.null_rate, args.seed)
+    run_id = "bench"
+    columns = process.frame_columns(df, run_id)
+    expected = canonical(process.frame_to_records(df.assign(run_id=run_id)), columns)
+
+    handler = type("StandIn", (_StandIn,), {"reject_gzip": args.reject_gzip, "rows": [], "bodies": {}})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    # REST_BASE is read whenever a query is built, so this points every request at the stand-in
+    sc.REST_BASE = f"http://127.0.0.1:{server.server_address[1]}/rest/v1"
+    client = sc.SupabaseClient(sc.REST_BASE, "bench")
+
+    print(f"{len(df):,} rows x {len(columns)} columns"
+          f"{' (stand-in rejects gzip bodies)' if args.reject_gzip else ''}\n")
+    print(f"{'format':>9} {'encode CPU s':>13} {'requests':>9} {'MB sent':>9} {'bytes/row':>10} {'upload s':>9}  received")
+    results = []
+    try:
+        for fmt in FORMATS:
+            start = time.process_time()
+            encoded = encode(fmt, df, run_id, args.chunk_size)
+            cpu = time.process_time() - start
+            del encoded
+
+            handler.rows, handler.bodies = [], {}
+            REQUESTS.reset()
+            start = time.perf_counter()
+            sent = upload(fmt, client, df, run_id, args.chunk_size, args.workers)
+            seconds = time.perf_counter() - start
+            posts = [r for r in REQUESTS.to_records() if r["method"] == "POST"]
+            requests = sum(r["requests"] for r in posts)
+            sent_bytes = sum(r["sent_bytes"]["sum"] for r in posts)
+            if sent != len(df) or canonical(handler.rows, columns) != expected:
+                raise SystemExit(f"{fmt}: the stand-in received different rows than the frame holds")
+            results.append({"format": fmt, "encode_cpu_seconds": round(cpu, 4), "requests": requests,
+                            "sent_bytes": int(sent_bytes), "upload_seconds": round(seconds, 4),
+                            "bodies": dict(handler.bodies)})
+            print(f"{fmt:>9} {cpu:13.3f} {requests:9d} {sent_bytes / 1e6:9.2f} {sent_bytes / len(df):10.1f} "
+                  f"{seconds:9.2f}  {handler.bodies}")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    base = results[0]
+    for r in results[1:]:
+        print(f"\n{r['format']} vs json: {base['sent_bytes'] / r['sent_bytes']:.1f}x fewer bytes, "
+              f"{base['encode_cpu_seconds'] / max(r['encode_cpu_seconds'], 1e-9):.1f}x less encode CPU", end="")
+    print()
+
+    revision = git_revision()
+    out = args.out or os.path.join(HERE, "results", f"upload-{revision}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as fh:
+        json.dump({
+            "revision": revision,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "rows": len(df),
+            "columns": columns,
+            "workers": args.workers,
+            "reject_gzip": args.reject_gzip,
+            "results": results,
+        }, fh, indent=2)
+    print(f"\nWrote {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Import-time benchmark for the pipeline's entry modules.
+Each module is imported in a fresh interpreter (best of --repeat runs), which is
+what the CLI and every spawned pipeline worker pay before doing any work.
+Fails (exit 1) when a module goes over its time budget or pulls in a heavy
+dependency it should only load on demand.
+
+Usage:
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --repeat 5 --scale 2 --json import_times.json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# module -> (seconds budget, modules it must not import)
+BUDGETS = {
+    "config": (0.1, ("streamlit", "sklearn")),
+    "metrics": (0.1, ("streamlit", "sklearn", "numpy")),
+    "supabase_client": (0.5, ("streamlit", "sklearn")),
+    "stage_cache": (0.5, ("streamlit", "sklearn")),
+    "scheduler": (0.5, ("streamlit", "sklearn")),
+    "ml_pipeline": (1.5, ("streamlit", "sklearn")),
+    "process": (2.0, ("streamlit", "sklearn")),
+}
+
+PROBE = """
+import sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(elapsed, ",".join(m for m in {forbidden!r} if m in sys.modules))
+"""
+
+
+def measure(module: str, forbidden: tuple, repeat: int) -> tuple[float, list[str]]:
+    """Best-of-repeat import time in a fresh interpreter, and forbidden modules it loaded."""
+    env = {
+        **os.environ,
+        # config refuses to load without these; their values do not matter here
+        "SUPABASE_URL": os.getenv("SUPABASE_URL", "http://localhost"),
+        "SUPABASE_ANON_KEY": os.getenv("SUPABASE_ANON_KEY", "anon"),
+        "SUPABASE_SERVICE_KEY": os.getenv("SUPABASE_SERVICE_KEY", "service"),
+    }
+    best, loaded = float("inf"), []
+    for _ in range(repeat):
+        out = subprocess.run(
+            [sys.executable, "-c", PROBE.format(module=module, forbidden=forbidden)],
+            cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+        ).stdout.split()
+        best = min(best, float(out[0]))
+        loaded = out[1].split(",") if len(out) > 1 else []
+    return best, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3, help="imports per module; the fastest counts")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply every time budget (slow machines)")
+    parser.add_argument("--json", metavar="PATH", help="also write the results as JSON")
+    args = parser.parse_args()
+
+    results, failed = [], False
+    print(f"{'module':<16} {'seconds':>8} {'budget':>8}  status")
+    for module, (budget, forbidden) in BUDGETS.items():
+        seconds, loaded = measure(module, forbidden, args.repeat)
+        budget *= args.scale
+        problems = [f"imports {name}" for name in loaded]
+        if seconds > budget:
+            problems.append("over budget")
+        failed = failed or bool(problems)
+        print(f"{module:<16} {seconds:8.3f} {budget:8.2f}  {'; '.join(problems) or 'ok'}")
+        results.append({"module": module, "seconds": round(seconds, 4), "budget": budget,
+                        "heavy_imports": loaded, "ok": not problems})
+
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump({"python": sys.version.split()[0], "repeat": args.repeat, "results": results}, fh, indent=2)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
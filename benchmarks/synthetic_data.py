@@ -0,0 +1,124 @@
+"""
+Synthetic allocation logs shaped like cloud_resource_allocation_dataset.csv.
+Numeric columns are drawn from the shipped CSV's empirical quantiles,
+Workload_Type from its category frequencies, Task_Priority from its
+distribution per workload type, Predicted_Workload from its quantiles per
+priority, and Optimized_Resource_Allocation per (Task_Priority,
+Predicted_Workload decile), which keeps the strong correlations of the real
+data. A fraction of values is blanked to exercise NaN handling.
+Rows are produced in chunks, so files far larger than memory can be written.
+
+Usage:
+    python benchmarks/synthetic_data.py 1000000 synthetic_1m.csv
+    python benchmarks/synthetic_data.py 10000000 synthetic_10m.csv --nan-rate 0.02 --seed 7
+"""
+
+import argparse
+import os
+from typing import Dict, Iterator, Tuple
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCE_CSV = os.path.join(ROOT, "cloud_resource_allocation_dataset.csv")
+
+CATEGORY = "Workload_Type"
+PRIORITY = "Task_Priority"
+TARGET = "Optimized_Resource_Allocation"
+PREDICTED = "Predicted_Workload (%)"
+QUANTILES = np.linspace(0, 1, 1001)
+
+
+def _distribution(values: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    counts = values.value_counts()
+    return counts.index.to_numpy(), (counts / counts.sum()).to_numpy()
+
+
+class SyntheticProfile:
+    """Marginal and conditional distributions fitted on a source CSV."""
+
+    def __init__(self, source_csv: str = SOURCE_CSV):
+        df = pd.read_csv(source_csv).dropna()
+        self.columns = list(df.columns)
+        self.numeric = [c for c in df.columns
+                        if c not in (CATEGORY, PRIORITY, TARGET) and pd.api.types.is_numeric_dtype(df[c])]
+        self.quantiles = {c: np.quantile(df[c].to_numpy(dtype=np.float64), QUANTILES) for c in self.numeric}
+        self.predicted_by_priority = {
+            p: np.quantile(g[PREDICTED].to_numpy(dtype=np.float64), QUANTILES) for p, g in df.groupby(PRIORITY)
+        }
+        self.categories = _distribution(df[CATEGORY])
+        self.priority_by_category = {cat: _distribution(g[PRIORITY]) for cat, g in df.groupby(CATEGORY)}
+        self.decile_edges = np.quantile(df[PREDICTED], np.linspace(0, 1, 11)[1:-1])
+        deciles = np.searchsorted(self.decile_edges, df[PREDICTED].to_numpy())
+        self.target_by_group: Dict[tuple, tuple] = {
+            key: _distribution(g[TARGET]) for key, g in df.groupby([df[PRIORITY].to_numpy(), deciles])
+        }
+        self.target_fallback = _distribution(df[TARGET])
+
+    def sample(self, n: int, rng: np.random.Generator, nan_rate: float = 0.01) -> pd.DataFrame:
+        """n rows in the source's column order, with about nan_rate of each feature blanked."""
+        out = {c: np.interp(rng.random(n), QUANTILES, self.quantiles[c]) for c in self.numeric}
+
+        cats, probs = self.categories
+        category = cats[rng.choice(len(cats), n, p=probs)]
+        priority = np.empty(n, dtype=np.int64)
+        for cat, (values, p) in self.priority_by_category.items():
+            rows = np.flatnonzero(category == cat)
+            priority[rows] = values[rng.choice(len(values), len(rows), p=p)]
+        for p, quantiles in self.predicted_by_priority.items():
+            rows = np.flatnonzero(priority == p)
+            out[PREDICTED][rows] = np.interp(rng.random(len(rows)), QUANTILES, quantiles)
+
+        deciles = np.searchsorted(self.decile_edges, out[PREDICTED])
+        target = np.empty(n, dtype=np.int64)
+        group_ids = priority * 100 + deciles
+        for gid in np.unique(group_ids):
+            rows = np.flatnonzero(group_ids == gid)
+            values, p = self.target_by_group.get((gid // 100, gid % 100), self.target_fallback)
+            target[rows] = values[rng.choice(len(values), len(rows), p=p)]
+
+        out[CATEGORY] = category.astype(object)
+        out[PRIORITY] = priority.astype(np.float64) if nan_rate > 0 else priority
+        out[TARGET] = target
+        df = pd.DataFrame(out)[self.columns]
+
+        if nan_rate > 0:
+            # Blank features (never the target) independently per column
+            for col in self.numeric + [CATEGORY, PRIORITY]:
+                mask = rng.random(n) < nan_rate
+                df.loc[mask, col] = np.nan
+        return df
+
+
+def generate(n_rows: int, seed: int = 42, nan_rate: float = 0.01, chunk_rows: int = 500_000,
+             profile: SyntheticProfile = None) -> Iterator[pd.DataFrame]:
+    """Yield n_rows synthetic rows in chunks of at most chunk_rows."""
+    profile = profile or SyntheticProfile()
+    rng = np.random.default_rng(seed)
+    for start in range(0, n_rows, chunk_rows):
+        yield profile.sample(min(chunk_rows, n_rows - start), rng, nan_rate)
+
+
+def write_csv(path: str, n_rows: int, seed: int = 42, nan_rate: float = 0.01, chunk_rows: int = 500_000) -> str:
+    """Write a synthetic CSV (atomically) and return its path."""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    for i, chunk in enumerate(generate(n_rows, seed, nan_rate, chunk_rows)):
+        chunk.to_csv(tmp, mode="w" if i == 0 else "a", header=(i == 0), index=False)
+    os.replace(tmp, path)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("rows", type=int)
+    parser.add_argument("path")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--nan-rate", type=float, default=0.01)
+    args = parser.parse_args()
+    write_csv(args.path, args.rows, args.seed, args.nan_rate)
+    print(f"Wrote {args.rows} rows to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Persisted clustering state of a published run, for incremental appends.
+A full run saves the preprocessing schema, the fitted scaler and centroids, and
+the running aggregates behind cluster_summary, data_stats and histogram_data.
+An incremental run loads it, labels only the new rows, folds them into the
+aggregates (optionally moving the centroids towards them) and saves it again.
+The other K of the elbow sweep are kept too, so appended rows get a label and
+a cluster_summary_by_k entry under every precomputed K.
+predict.py serves cluster assignments from the same file.
+Files are compressed joblib dumps in MODEL_DIR, one per run id, tagged with
+ARTIFACT_VERSION.
+"""
+
+from __future__ import annotations
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from config import MODEL_DIR
+from ml_pipeline import (
+    ClusterSummary, FeatureHistograms, PreprocessSchema, StreamingStats, label_by_k, preprocess_chunk,
+)
+
+
+# Bumped when ClusterState changes incompatibly; load() refuses newer files
+ARTIFACT_VERSION = 1
+
+
+def state_name(run_id: str) -> str:
+    return f"{run_id}.joblib"
+
+
+def state_path(run_id: str, root: str = MODEL_DIR) -> str:
+    return os.path.join(root, state_name(run_id))
+
+
+@dataclass
+class ClusterState:
+    """Everything needed to label new rows and keep the run's aggregate tables current."""
+    run_id: str
+    schema: PreprocessSchema
+    numeric_cols: List[str]
+    scaler: Any  # fitted StandardScaler
+    model: Any  # fitted KMeans or MiniBatchKMeans
+    summary: ClusterSummary
+    stats: StreamingStats
+    histograms: Optional[FeatureHistograms] = None
+    n_rows: int = 0
+    updated_at: str = ""
+    version: int = ARTIFACT_VERSION
+    # Precomputed clusterings ({k: model}, {k: summary}) whose labels clustered_data packs into cluster_ids
+    alternatives: Optional[Dict[int, Any]] = None
+    alternative_summaries: Optional[Dict[int, ClusterSummary]] = None
+
+    @property
+    def n_clusters(self) -> int:
+        return len(self.model.cluster_centers_)
+
+    def preprocess(self, raw_chunk: pd.DataFrame) -> pd.DataFrame:
+        """A raw CSV chunk preprocessed exactly like the run's original input."""
+        return preprocess_chunk(raw_chunk, self.schema)
+
+    def scaled(self, chunk: pd.DataFrame) -> np.ndarray:
+        """Preprocessed rows standardized with the run's scaler, in the centroids' dtype."""
+        features = chunk[self.numeric_cols]
+        if not hasattr(self.scaler, "feature_names_in_"):  # fitted on a bare matrix
+            features = features.to_numpy(dtype=self.model.cluster_centers_.dtype)
+        return self.scaler.transform(features).astype(self.model.cluster_centers_.dtype, copy=False)
+
+    def assign(self, chunk: pd.DataFrame) -> np.ndarray:
+        """Cluster labels of preprocessed rows, with the run's scaler and centroids."""
+        return self.model.predict(self.scaled(chunk)).astype(np.int64)
+
+    def alternative_labels(self, chunk: pd.DataFrame) -> Optional[np.ndarray]:
+        """(rows, alternatives) labels of preprocessed rows in ascending k, or None without alternatives."""
+        if not self.alternatives:
+            return None
+        return label_by_k(self.scaled(chunk), self.alternatives)
+
+    def partial_fit(self, chunk: pd.DataFrame, labels: np.ndarray):
+        """
+        Move each centroid to the running mean of every row assigned to it (the
+        per-center 1/count step of MiniBatchKMeans.partial_fit), weighting the
+        history by the cluster sizes. The scaler stays fixed.
+        """
+        scaled = self.scaled(chunk)
+        added = np.bincount(labels, minlength=self.n_clusters)
+        sums = np.zeros_like(self.model.cluster_centers_)
+        np.add.at(sums, labels, scaled)
+        seen = self.summary.counts.astype(np.float64)
+        moved = added > 0
+        centers = self.model.cluster_centers_
+        centers[moved] = (centers[moved] * seen[moved, None] + sums[moved]) / (seen[moved] + added[moved])[:, None]
+
+    def update(self, clustered_chunk: pd.DataFrame, alternative_labels: Optional[np.ndarray] = None):
+        """Fold labelled rows (and their alternative_labels, if any) into the running aggregates."""
+        self.summary.update(clustered_chunk)
+        if alternative_labels is not None:
+            for j, k in enumerate(sorted(self.alternative_summaries)):
+                self.alternative_summaries[k].update(clustered_chunk, alternative_labels[:, j])
+        self.stats.update(clustered_chunk)
+        if self.histograms is not None:
+            self.histograms.update(clustered_chunk)
+        self.n_rows += len(clustered_chunk)
+
+    def save(self, path: Optional[str] = None) -> str:
+        """Write the state atomically (to state_path(run_id) by default) and return the path."""
+        path = path or state_path(self.run_id)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.updated_at = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        tmp = f"{path}.{os.getpid()}.tmp"
+        joblib.dump(self, tmp, compress=("zlib", 3))
+        os.replace(tmp, path)
+        return path
+
+    @classmethod
+    def load(cls, path: str) -> "ClusterState":
+        state = joblib.load(path)
+        if not isinstance(state, cls):
+            raise ValueError(f"{path} does not hold a ClusterState")
+        if state.version > ARTIFACT_VERSION:
+            raise ValueError(f"{path} is artifact version {state.version}; this code reads up to {ARTIFACT_VERSION}")
+        return state
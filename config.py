@@ -1,32 +1,169 @@
 """
 Configuration for the Cloud Resource Allocation project.
-Reads configuration from Streamlit secrets.
+Reads configuration from Streamlit secrets or environment variables, without
+importing Streamlit unless it is already running.
 """
-import streamlit as st
 import os
+import sys
 
-# Read from Streamlit secrets or environment variables
-# For local development, add secrets to .streamlit/secrets.toml
-try:
-    SUPABASE_URL = st.secrets.get("SUPABASE_URL") or os.getenv("SUPABASE_URL")
-    SUPABASE_ANON_KEY = st.secrets.get("SUPABASE_ANON_KEY") or os.getenv("SUPABASE_ANON_KEY")
-    SUPABASE_SERVICE_KEY = st.secrets.get("SUPABASE_SERVICE_KEY") or os.getenv("SUPABASE_SERVICE_KEY")
-except Exception as e:
-    # Fallback to environment variables only
-    SUPABASE_URL = os.getenv("SUPABASE_URL")
-    SUPABASE_ANON_KEY = os.getenv("SUPABASE_ANON_KEY")
-    SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
+
+def _secrets_file():
+    """
+    .streamlit/secrets.toml read directly (user-level, then project-level, as
+    Streamlit does), so CLI runs configured that way keep working without Streamlit.
+    """
+    try:
+        import tomllib
+    except ImportError:  # Python < 3.11
+        return {}
+    secrets = {}
+    for path in (os.path.expanduser("~/.streamlit/secrets.toml"),
+                 os.path.join(os.getcwd(), ".streamlit", "secrets.toml")):
+        try:
+            with open(path, "rb") as fh:
+                secrets.update(tomllib.load(fh))
+        except (OSError, ValueError):
+            pass
+    return secrets
+
+
+def _setting(name):
+    """
+    A Streamlit secret, falling back to the environment variable.
+    st.secrets is only used when Streamlit is already loaded (the dashboard), so
+    the CLI and pipeline workers never pay for importing it.
+    """
+    st = sys.modules.get("streamlit")
+    if st is None:
+        value = _secrets_file().get(name)
+    else:
+        try:
+            value = st.secrets.get(name)
+        except Exception:
+            value = None
+    return value or os.getenv(name)
+
+
+SUPABASE_URL = _setting("SUPABASE_URL")
+SUPABASE_ANON_KEY = _setting("SUPABASE_ANON_KEY")
+SUPABASE_SERVICE_KEY = _setting("SUPABASE_SERVICE_KEY")
+
+# Storage backend: "supabase" (PostgREST over HTTP) or "sqlite", an embedded
+# database file at SQLITE_PATH for offline runs (see sqlite_client.py)
+DATA_BACKEND = (_setting("DATA_BACKEND") or "supabase").lower()
+SQLITE_PATH = _setting("SQLITE_PATH") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "local_data", "pipeline.db"
+)
+if DATA_BACKEND not in ("supabase", "sqlite"):
+    raise ValueError(f"Unknown DATA_BACKEND {DATA_BACKEND!r}; use 'supabase' or 'sqlite'.")
 
 # Validate required secrets are present
-if not SUPABASE_URL or not SUPABASE_ANON_KEY or not SUPABASE_SERVICE_KEY:
+if DATA_BACKEND == "supabase" and (not SUPABASE_URL or not SUPABASE_ANON_KEY or not SUPABASE_SERVICE_KEY):
     raise ValueError(
         "Missing required Supabase configuration. "
         "Please set SUPABASE_URL, SUPABASE_ANON_KEY, and SUPABASE_SERVICE_KEY "
-        "in .streamlit/secrets.toml for local development or in Streamlit Cloud secrets."
+        "in .streamlit/secrets.toml for local development, in Streamlit Cloud secrets, "
+        "or as environment variables."
     )
 
 # Supabase table names
 TABLE_RAW_DATA = "raw_data"
 TABLE_CLUSTERED_DATA = "clustered_data"
 TABLE_CLUSTER_SUMMARY = "cluster_summary"
-TABLE_OUTLIER_COUNTS = "outlier_counts"
\ No newline at end of file
+TABLE_OUTLIER_COUNTS = "outlier_counts"
+
+# Bulk upload tuning (process.py -> Supabase), overridable via environment
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "4"))
+UPLOAD_MAX_RETRIES = int(os.getenv("UPLOAD_MAX_RETRIES", "5"))
+# Longest wait between retries, however long a server's Retry-After asks for
+UPLOAD_MAX_RETRY_AFTER = float(os.getenv("UPLOAD_MAX_RETRY_AFTER", "60"))
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(1_000_000)))
+UPLOAD_CHUNK_ROWS = int(os.getenv("UPLOAD_CHUNK_ROWS", "5000"))
+# Frames of at least UPLOAD_CSV_MIN_ROWS rows (raw_data, clustered_data) are bulk
+# loaded as CSV bodies, gzip-compressed unless UPLOAD_GZIP=0 or the server
+# rejects them; 0 keeps every upload JSON
+UPLOAD_CSV_MIN_ROWS = int(os.getenv("UPLOAD_CSV_MIN_ROWS", "1000"))
+UPLOAD_GZIP = os.getenv("UPLOAD_GZIP", "1").lower() in ("1", "true", "yes")
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "8"))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "0").lower() in ("1", "true", "yes")
+
+# Pipeline stage parallelism (process.py); 0 means one worker per CPU core
+PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", "0")) or (os.cpu_count() or 1)
+
+# Elbow sweep (ml_pipeline.elbow_sweep). ELBOW_JOBS is the number of threads fitting
+# K values at once (unset = as many as the process's thread budget allows, -1 = one
+# per K); the other options are "off" when unset
+ELBOW_JOBS = int(os.getenv("ELBOW_JOBS", "0")) or None
+ELBOW_MINIBATCH_ROWS = int(os.getenv("ELBOW_MINIBATCH_ROWS", "0")) or None
+ELBOW_SAMPLE_ROWS = int(os.getenv("ELBOW_SAMPLE_ROWS", "0")) or None
+ELBOW_FLAT_TOL = float(os.getenv("ELBOW_FLAT_TOL", "0"))
+
+# Chunked CSV ingestion / streaming mode. Rows per chunk are derived from
+# INGEST_MEMORY_MB unless STREAM_CHUNK_ROWS is set.
+INGEST_MEMORY_MB = float(os.getenv("INGEST_MEMORY_MB", "256"))
+STREAM_CHUNK_ROWS = int(os.getenv("STREAM_CHUNK_ROWS", "0"))
+STREAM_SAMPLE_ROWS = int(os.getenv("STREAM_SAMPLE_ROWS", "10000"))
+# Compact dtypes (process.py --compact): float32 features and int8 category
+# columns, roughly halving the in-memory frame and scaled matrix
+COMPACT_DTYPES = os.getenv("COMPACT_DTYPES", "0").lower() in ("1", "true", "yes")
+
+# Streaming mode computes data_stats and outlier counts over every row, using
+# mergeable quantile sketches of this size for the median and quartiles
+QUANTILE_SKETCH_K = int(os.getenv("QUANTILE_SKETCH_K", "400"))
+
+# Pre-binned distributions (histogram_data): bins per feature histogram and
+# cells per side of each 2D density grid
+HIST_BINS = int(os.getenv("HIST_BINS", "40"))
+DENSITY_GRID = int(os.getenv("DENSITY_GRID", "30"))
+
+# Dashboard scatter level of detail: SVG up to SVG_MAX_POINTS, WebGL with a
+# per-cluster sample of at most DASHBOARD_POINT_BUDGET points up to
+# DENSITY_MIN_POINTS, binned density above that
+DASHBOARD_POINT_BUDGET = int(os.getenv("DASHBOARD_POINT_BUDGET", "20000"))
+SVG_MAX_POINTS = int(os.getenv("SVG_MAX_POINTS", "5000"))
+DENSITY_MIN_POINTS = int(os.getenv("DENSITY_MIN_POINTS", "200000"))
+
+# After a dashboard page renders, fetch the other pages' tables in the background
+DASHBOARD_PREFETCH = os.getenv("DASHBOARD_PREFETCH", "1").lower() in ("1", "true", "yes")
+
+# t-SNE embedding: fit on at most TSNE_FIT_POINTS rows (others placed by kNN
+# interpolation) and store at most TSNE_MAX_ROWS rows in tsne_data
+TSNE_FIT_POINTS = int(os.getenv("TSNE_FIT_POINTS", "10000"))
+TSNE_MAX_ROWS = int(os.getenv("TSNE_MAX_ROWS", "50000"))
+TSNE_ANGLE = float(os.getenv("TSNE_ANGLE", "0.5"))
+TSNE_ITER = int(os.getenv("TSNE_ITER", "1000"))
+
+# On-disk cache of stage results (process.py), keyed by input data and
+# parameters; least recently used entries are evicted past PIPELINE_CACHE_MB.
+# Set PIPELINE_CACHE_MB=0 to disable.
+PIPELINE_CACHE_DIR = os.getenv(
+    "PIPELINE_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".pipeline_cache")
+)
+PIPELINE_CACHE_MB = float(os.getenv("PIPELINE_CACHE_MB", "1024"))
+
+# Columnar snapshot of each run (all result tables in one compressed file),
+# kept in SNAPSHOT_DIR and uploaded to the SNAPSHOT_BUCKET Storage bucket.
+# The dashboard loads it instead of paging through the tables when it exists.
+SNAPSHOT_ENABLED = os.getenv("SNAPSHOT_ENABLED", "1").lower() in ("1", "true", "yes")
+SNAPSHOT_DIR = os.getenv(
+    "SNAPSHOT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "snapshots")
+)
+SNAPSHOT_BUCKET = os.getenv("SNAPSHOT_BUCKET", "snapshots")
+
+# Clustering state of the published run (scaler, centroids, running aggregates)
+# used by process.py --incremental; kept in MODEL_DIR and uploaded to the private
+# MODEL_BUCKET Storage bucket so another machine can append to the run.
+MODEL_DIR = os.getenv("MODEL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "models"))
+MODEL_BUCKET = os.getenv("MODEL_BUCKET", "models")
+
+# predict.py HTTP service (cluster assignment for incoming records)
+PREDICT_HOST = os.getenv("PREDICT_HOST", "127.0.0.1")
+PREDICT_PORT = int(os.getenv("PREDICT_PORT", "8765"))
+
+# Run reports (process.py): per-stage and per-request metrics as
+# RUN_REPORT_DIR/<run_id>.json (empty disables), plus a Prometheus textfile at
+# PROMETHEUS_TEXTFILE for node_exporter's textfile collector when set
+RUN_REPORT_DIR = os.getenv(
+    "RUN_REPORT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "run_reports")
+)
+PROMETHEUS_TEXTFILE = os.getenv("PROMETHEUS_TEXTFILE", "")
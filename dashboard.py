@@ -4,10 +4,28 @@ Reads pre-computed ML results from Supabase and renders interactive charts.
 """
 
 import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 import plotly.express as px
 import plotly.graph_objects as go
+import numpy as np
 import pandas as pd
+from config import (
+    HTTP_MAX_CONNECTIONS,
+    DASHBOARD_POINT_BUDGET,
+    SVG_MAX_POINTS,
+    DENSITY_MIN_POINTS,
+    DENSITY_GRID,
+    DASHBOARD_PREFETCH,
+    SNAPSHOT_ENABLED,
+    SNAPSHOT_DIR,
+    SNAPSHOT_BUCKET,
+)
+from ml_pipeline import label_pattern, stratified_sample, unpack_labels
+from snapshot import Match, Snapshot, snapshot_name, snapshot_path
 from supabase_client import get_anon_client
 
 st.set_page_config(
@@ -34,34 +52,261 @@ st.markdown("""
 
 
 # -- Data fetching --------------------------------------------------------
+# Bookkeeping columns that are not part of the data itself (cluster_ids packs
+# each row's labels under the precomputed K, see ml_pipeline.pack_labels)
+META_COLUMNS = ("id", "created_at", "run_id", "cluster_ids")
+# PostgREST's default max-rows; larger pages are truncated by the server anyway
+FETCH_PAGE_SIZE = 1000
+
+
+@st.cache_data(ttl=30)
+def fetch_current_version():
+    """The pipeline_version row published by process.py, or None if the tables are not versioned."""
+    try:
+        rows = get_anon_client().table("pipeline_version").select("*").eq("id", 1).execute().data
+    except Exception:
+        return None
+    return rows[0] if rows else None
+
+
+def fetch_current_run():
+    """Run id published by process.py, or None if the tables are not versioned."""
+    version = fetch_current_version()
+    return version["run_id"] if version else None
+
+
 @st.cache_data(ttl=300)
-def fetch_table(name, limit=10000):
-    """Fetch all rows from a Supabase table with pagination."""
+def fetch_table(name, run_id=None, limit=None, columns="*", filters=()):
+    """
+    Fetch the rows of one published run from a Supabase table.
+    filters is a tuple of (column, value) equality filters; a list/tuple value
+    matches any of its items and a snapshot.Match value is a regular expression.
+    The first page also returns the exact row count; the remaining pages are then
+    requested concurrently and stitched back together in id order.
+    """
     client = get_anon_client()
-    rows = []
-    page_size = 1000
-    offset = 0
-    while offset < limit:
-        batch = client.table(name).select("*").limit(page_size).execute().data
-        if not batch:
-            break
-        rows.extend(batch)
-        if len(batch) < page_size:
-            break
-        offset += page_size
+    if limit is not None and limit <= 0:
+        return []
+
+    def page(start, end):
+        query = client.table(name).select(columns, count="exact" if start == 0 else None)
+        if run_id is not None:
+            query = query.eq("run_id", run_id)
+        for column, value in filters:
+            if isinstance(value, Match):
+                query = query.match(column, value.pattern)
+            elif isinstance(value, (list, tuple)):
+                query = query.in_(column, value)
+            else:
+                query = query.eq(column, value)
+        return query.order("id").range(start, end).execute()
+
+    first = page(0, min(FETCH_PAGE_SIZE, limit or FETCH_PAGE_SIZE) - 1)
+    rows = list(first.data)
+    total = first.count if first.count is not None else len(rows)
+    if limit is not None:
+        total = min(total, limit)
+    # The server may cap page sizes below ours; page by what it actually returned
+    size = len(rows)
+    if size == 0 or total <= size:
+        return rows[:total]
+    starts = range(size, total, size)
+    with ThreadPoolExecutor(max_workers=HTTP_MAX_CONNECTIONS) as pool:
+        for resp in pool.map(lambda start: page(start, min(start + size, total) - 1), starts):
+            rows.extend(resp.data)
     return rows
 
 
 @st.cache_data(ttl=300)
-def load_all():
-    stats = fetch_table("data_stats")
-    outliers = fetch_table("outlier_counts")
-    corr = fetch_table("correlation_data")
-    elbow = fetch_table("elbow_data")
-    summary = fetch_table("cluster_summary")
-    clustered = fetch_table("clustered_data")
-    tsne = fetch_table("tsne_data")
-    return stats, outliers, corr, elbow, summary, clustered, tsne
+def fetch_sample(name, run_id, columns, cluster_counts, budget, min_blocks=8):
+    """
+    Stratified sample of about budget rows without reading the whole table: each
+    cluster's share is proportional to its size (cluster_counts is a tuple of
+    (cluster_id, rows)) and is pulled as evenly spaced id-ordered pages, so the
+    sample spans the table instead of just its first rows.
+    """
+    client = get_anon_client()
+    total = sum(n for _, n in cluster_counts)
+    requests = []
+    for cid, n in cluster_counts:
+        quota = min(n, max(1, round(budget * n / max(total, 1))))
+        blocks = min(n, max(min_blocks, -(-quota // FETCH_PAGE_SIZE)))
+        size = -(-quota // blocks)
+        starts = [i * n // blocks for i in range(blocks)] + [n]
+        requests += [(cid, lo, min(lo + size, hi)) for lo, hi in zip(starts, starts[1:])]
+
+    def page(req):
+        cid, start, end = req
+        query = client.table(name).select(columns).eq("cluster_id", cid)
+        if run_id is not None:
+            query = query.eq("run_id", run_id)
+        return query.order("id").range(start, end - 1).execute().data
+
+    with ThreadPoolExecutor(max_workers=HTTP_MAX_CONNECTIONS) as pool:
+        return [row for rows in pool.map(page, requests) for row in rows]
+
+
+@st.cache_resource(show_spinner=False)
+def open_snapshot(run_id):
+    """
+    The run's columnar snapshot, memory-mapped from SNAPSHOT_DIR (downloaded from
+    Storage on first use), or None to read the REST tables instead.
+    """
+    if not SNAPSHOT_ENABLED or run_id is None:
+        return None
+    path = snapshot_path(run_id)
+    try:
+        if not os.path.exists(path):
+            os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+            get_anon_client().download_file(SNAPSHOT_BUCKET, snapshot_name(run_id), path)
+            # Older runs' downloads are superseded
+            for name in os.listdir(SNAPSHOT_DIR):
+                if name.endswith(".arrow.zip") and name != snapshot_name(run_id):
+                    os.remove(os.path.join(SNAPSHOT_DIR, name))
+        return Snapshot(path)
+    except Exception:
+        return None
+
+
+def run_snapshot(run_id):
+    """open_snapshot, unless incremental appends have made the run's snapshot stale."""
+    version = fetch_current_version()
+    stale = version is not None and version.get("snapshot") is not None and not version["snapshot"]
+    if stale and version.get("run_id") == run_id:
+        return None
+    return open_snapshot(run_id)
+
+
+def read_rows(name, run_id=None, limit=None, columns="*", filters=()):
+    """fetch_table, served from the run snapshot when there is one."""
+    snap = run_snapshot(run_id)
+    if snap is not None and name in snap:
+        return snap.rows(name, columns, filters, limit)
+    return fetch_table(name, run_id, limit, columns, filters)
+
+
+def read_sample(name, run_id, columns, cluster_counts, budget):
+    """fetch_sample, served from the run snapshot when there is one."""
+    snap = run_snapshot(run_id)
+    if snap is not None and name in snap:
+        labels = snap.table(name).column("cluster_id").to_numpy()
+        return snap.rows(name, columns, indices=stratified_sample(labels, budget))
+    return fetch_sample(name, run_id, columns, cluster_counts, budget)
+
+
+# What each page reads: (table, projected columns, filters). Every dataset is its
+# own fetch_table cache entry, so a page only downloads the tables it draws.
+DATASETS = {
+    "stats": ("data_stats", ("feature_name", "mean_val", "std_val", "min_val", "max_val", "median_val", "row_count"), ()),
+    "outliers": ("outlier_counts", ("feature_name", "outlier_count"), ()),
+    "corr": ("correlation_data", ("columns_list", "matrix_data"), ()),
+    "elbow": ("elbow_data", ("k", "inertia"), ()),
+    "summary": ("cluster_summary", "*", ()),
+    "ksummary": ("cluster_summary_by_k", "*", ()),
+    "hists": ("histogram_data", ("feature_x", "cluster_id", "x_min", "x_max", "y_min", "y_max", "counts"),
+              (("kind", "hist"),)),
+    "tsne": ("tsne_data", ("x", "y", "cluster_id", "cluster_ids"), ()),
+}
+
+
+def fetch_dataset(key, run_id=None):
+    name, columns, filters = DATASETS[key]
+    return read_rows(name, run_id, columns=columns, filters=filters)
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def prefetch(run_id, keys):
+    """
+    Warm the cache for other pages' datasets (run in a background thread that
+    carries the session's script run context, which st.cache_data needs).
+    Cached itself so the nested fetches skip the spinner, which needs a page to draw on.
+    """
+    for key in keys:
+        try:
+            fetch_dataset(key, run_id)
+        except Exception:
+            pass  # the page that needs it will fetch again and report the error
+
+
+def decoded(value):
+    """JSON text columns arrive as text from the REST tables and decoded from the snapshot."""
+    return json.loads(value) if isinstance(value, str) else value
+
+
+def binned(rows, clusters=None):
+    """
+    Sum histogram_data rows over the selected clusters (all by default).
+    Returns (counts array, x_min, x_max, y_min, y_max); counts is None without rows.
+    """
+    rows = [r for r in rows if clusters is None or r["cluster_id"] in clusters]
+    if not rows:
+        return None, None, None, None, None
+    counts = sum(np.array(decoded(r["counts"])) for r in rows)
+    r = rows[0]
+    return counts, r["x_min"], r["x_max"], r["y_min"], r["y_max"]
+
+
+def bin_centers(lo, hi, n):
+    width = (hi - lo) / n
+    return lo + width * (np.arange(n) + 0.5), width
+
+
+# -- Level of detail ------------------------------------------------------
+# Small point sets are drawn as SVG, larger ones as WebGL from a per-cluster
+# stratified sample of at most the point budget, and the largest as binned density.
+def lod_mode(n_points, budget):
+    if n_points <= min(SVG_MAX_POINTS, budget):
+        return "svg"
+    if n_points <= DENSITY_MIN_POINTS:
+        return "webgl"
+    return "density"
+
+
+def cluster_scatter(df, x, y, budget, opacity=0.6, labels=None):
+    """Scatter colored by cluster, downsampled per cluster to the point budget."""
+    n = len(df)
+    if n > budget:
+        df = df.iloc[stratified_sample(df["cluster_id"].to_numpy(), budget)]
+    df = df.assign(cluster_label="Cluster " + df["cluster_id"].astype(str))
+    return px.scatter(
+        df, x=x, y=y, color="cluster_label",
+        color_discrete_sequence=COLORS,
+        opacity=opacity,
+        labels=labels,
+        render_mode="svg" if n <= SVG_MAX_POINTS else "webgl",
+    )
+
+
+def point_density(df, x, y):
+    """density_figure layers binned from points on a DENSITY_GRID x DENSITY_GRID grid."""
+    xe = np.linspace(df[x].min(), df[x].max(), DENSITY_GRID + 1)
+    ye = np.linspace(df[y].min(), df[y].max(), DENSITY_GRID + 1)
+    layers = []
+    for cid, grp in df.groupby("cluster_id"):
+        z, _, _ = np.histogram2d(grp[x], grp[y], bins=[xe, ye])
+        layers.append((int(cid), (xe[:-1] + xe[1:]) / 2, (ye[:-1] + ye[1:]) / 2, z.T))
+    return layers
+
+
+def density_figure(layers):
+    """Per-cluster density contours; layers are (cluster_id, x centers, y centers, counts[y][x])."""
+    fig = go.Figure()
+    for cid, xs, ys, counts in layers:
+        color = COLORS[cid % len(COLORS)]
+        fig.add_trace(go.Contour(
+            x=xs, y=ys, z=counts, name=f"Cluster {cid}", showscale=False,
+            contours_coloring="lines", colorscale=[[0, color], [1, color]],
+            line_width=2, ncontours=6, showlegend=True,
+        ))
+    return fig
+
+
+def lod_caption(n_points, shown, mode):
+    if mode == "density":
+        return f"{n_points:,} points, drawn as binned density"
+    if shown < n_points:
+        return f"{n_points:,} points, showing a stratified sample of {shown:,} ({mode.upper()})"
+    return f"{n_points:,} points ({mode.upper()})"
 
 
 # -- Sidebar --------------------------------------------------------------
@@ -76,6 +321,11 @@ with st.sidebar:
         label_visibility="collapsed",
     )
     st.divider()
+    point_budget = st.number_input(
+        "Max points per chart", min_value=1000, max_value=1_000_000,
+        value=DASHBOARD_POINT_BUDGET, step=1000,
+        help="Larger point sets are downsampled per cluster or drawn as density.",
+    )
     if st.button("Refresh Data"):
         st.cache_data.clear()
         st.rerun()
@@ -83,20 +333,55 @@ with st.sidebar:
 
 
 # -- Load data ------------------------------------------------------------
-try:
-    stats, outliers, corr_raw, elbow, summary, clustered, tsne = load_all()
-except Exception as e:
-    st.error(f"Failed to load data from Supabase: {e}")
-    st.info("Make sure you've run `python process.py <csv>` to populate the database.")
-    st.stop()
-
-COLORS = ["#0f3460", "#e94560", "#16c79a", "#f5a623", "#7b68ee", "#00bcd4"]
+# Pages load their own datasets on demand; only the run id is fetched up front.
+def load(key):
+    try:
+        return fetch_dataset(key, run_id)
+    except Exception as e:
+        st.error(f"Failed to load data from Supabase: {e}")
+        st.info("Make sure you've run `python process.py <csv>` to populate the database.")
+        st.stop()
+
+
+def select_k(summary):
+    """
+    K selector of the pages that color by cluster. Returns (k, its cluster_summary
+    rows, its position in each row's cluster_ids, or None for the run's own K).
+    Every K of the elbow sweep is precomputed in cluster_summary_by_k and in the
+    rows' cluster_ids, so switching K reads nothing new.
+    """
+    alternatives = load("ksummary")
+    ks = sorted({int(r["k"]) for r in alternatives})
+    base_k = len(summary)
+    if not ks:
+        return base_k, summary, None
+    k = st.select_slider("Number of clusters (K)", options=sorted(set(ks) | {base_k}), value=base_k,
+                         key="view_k", help=f"K={base_k} was chosen by process.py; the others come from the elbow sweep.")
+    if k == base_k:
+        return k, summary, None
+    return k, [r for r in alternatives if r["k"] == k], ks.index(k)
+
+
+def relabel(df, position):
+    """Points with cluster_id taken from their cluster_ids at position (None keeps the run's own K)."""
+    if position is None or df.empty:
+        return df
+    return df.assign(cluster_id=unpack_labels(df["cluster_ids"].to_numpy(), position))
+
+
+run_id = fetch_current_run()
+
+# One color per cluster up to K=10, the largest K the elbow sweep precomputes
+COLORS = ["#0f3460", "#e94560", "#16c79a", "#f5a623", "#7b68ee", "#00bcd4",
+          "#8bc34a", "#ff7043", "#795548", "#9e9e9e"]
 
 # -- Pages ----------------------------------------------------------------
 
 if page == "Overview":
     st.header("Dataset Overview")
 
+    stats, hists = load("stats"), load("hists")
+
     if stats:
         df_stats = pd.DataFrame(stats)
         cols = st.columns(3)
@@ -114,12 +399,23 @@ if page == "Overview":
         st.dataframe(display_df, use_container_width=True, hide_index=True)
 
         st.subheader("Feature Distributions")
-        if clustered:
-            df_c = pd.DataFrame(clustered)
-            numeric_cols = [c for c in df_c.columns if c not in ("id", "created_at", "cluster_id")]
-            selected = st.selectbox("Select feature", numeric_cols)
-            fig = px.histogram(df_c, x=selected, nbins=40, color_discrete_sequence=[COLORS[0]])
-            fig.update_layout(template="plotly_white")
+        if hists:
+            features = list(dict.fromkeys(r["feature_x"] for r in hists))
+            selected = st.selectbox("Select feature", features)
+            by_cluster = st.checkbox("Split by cluster")
+            rows = [r for r in hists if r["feature_x"] == selected]
+            fig = go.Figure()
+            groups = sorted({r["cluster_id"] for r in rows}) if by_cluster else [None]
+            for cid in groups:
+                counts, lo, hi, _, _ = binned(rows, None if cid is None else {cid})
+                x, width = bin_centers(lo, hi, len(counts))
+                fig.add_trace(go.Bar(
+                    x=x, y=counts, width=width,
+                    name="All rows" if cid is None else f"Cluster {cid}",
+                    marker_color=COLORS[0 if cid is None else cid % len(COLORS)],
+                ))
+            fig.update_layout(template="plotly_white", barmode="stack", bargap=0,
+                              xaxis_title=selected, yaxis_title="count")
             st.plotly_chart(fig, use_container_width=True)
     else:
         st.warning("No statistics found. Run process.py first.")
@@ -128,6 +424,8 @@ if page == "Overview":
 elif page == "Outliers":
     st.header("Outlier Analysis (IQR Method)")
 
+    outliers = load("outliers")
+
     if outliers:
         df_out = pd.DataFrame(outliers)
         total = df_out["outlier_count"].sum()
@@ -149,10 +447,12 @@ elif page == "Outliers":
 elif page == "Correlation":
     st.header("Feature Correlation Matrix")
 
+    corr_raw = load("corr")
+
     if corr_raw:
         row = corr_raw[0]
-        cols_list = json.loads(row["columns_list"])
-        matrix = json.loads(row["matrix_data"])
+        cols_list = decoded(row["columns_list"])
+        matrix = decoded(row["matrix_data"])
 
         fig = go.Figure(data=go.Heatmap(
             z=matrix, x=cols_list, y=cols_list,
@@ -169,6 +469,8 @@ elif page == "Correlation":
 elif page == "Elbow Method":
     st.header("Elbow Method - Optimal K")
 
+    elbow = load("elbow")
+
     if elbow:
         df_elbow = pd.DataFrame(elbow).sort_values("k")
         fig = px.line(
@@ -188,7 +490,10 @@ elif page == "Elbow Method":
 elif page == "Clustering":
     st.header("KMeans Clustering Results")
 
+    summary = load("summary")
+
     if summary:
+        _, summary, _ = select_k(summary)
         df_summary = pd.DataFrame(summary).sort_values("cluster_id")
 
         cols = st.columns(len(df_summary))
@@ -200,7 +505,7 @@ elif page == "Clustering":
                 )
 
         st.subheader("Cluster Centroids")
-        display_cols = [c for c in df_summary.columns if c not in ("id", "created_at")]
+        display_cols = [c for c in df_summary.columns if c not in META_COLUMNS and c != "k"]
         st.dataframe(df_summary[display_cols], use_container_width=True, hide_index=True)
 
         st.subheader("Cluster Comparison")
@@ -225,36 +530,93 @@ elif page == "Clustering":
 elif page == "Cluster Explorer":
     st.header("Cluster Data Explorer")
 
-    if clustered:
-        df_c = pd.DataFrame(clustered)
-        numeric_cols = [c for c in df_c.columns if c not in ("id", "created_at", "cluster_id")]
+    summary = load("summary")
+    # Features are the clustered rows' own columns; a run without histogram_data still plots its points
+    try:
+        probe = read_rows("clustered_data", run_id, limit=1)
+    except Exception as e:
+        st.error(f"Failed to load data from Supabase: {e}")
+        st.info("Make sure you've run `python process.py <csv>` to populate the database.")
+        st.stop()
+    features = [c for c in (probe[0] if probe else ()) if c not in META_COLUMNS + ("cluster_id",)]
+    if summary and features:
+        # Rows are stored, sampled and binned by the run's own K; other K relabel them
+        base_summary = pd.DataFrame(summary).sort_values("cluster_id")
+        _, k_summary, position = select_k(summary)
+        df_summary = pd.DataFrame(k_summary).sort_values("cluster_id")
+        all_clusters = df_summary["cluster_id"].astype(int).tolist()
+        label_cols = ("cluster_id", "cluster_ids") if load("ksummary") else ("cluster_id",)
 
         col1, col2 = st.columns(2)
         with col1:
-            x_col = st.selectbox("X Axis", numeric_cols, index=0)
+            x_col = st.selectbox("X Axis", features, index=0)
         with col2:
-            y_col = st.selectbox("Y Axis", numeric_cols, index=min(1, len(numeric_cols) - 1))
-
-        df_c["cluster_label"] = "Cluster " + df_c["cluster_id"].astype(str)
-        fig = px.scatter(
-            df_c, x=x_col, y=y_col, color="cluster_label",
-            color_discrete_sequence=COLORS,
-            opacity=0.6,
-            labels={x_col: x_col.replace("_", " ").title(), y_col: y_col.replace("_", " ").title()},
-        )
-        fig.update_layout(template="plotly_white")
-        st.plotly_chart(fig, use_container_width=True)
+            y_col = st.selectbox("Y Axis", features, index=min(1, len(features) - 1))
+
+        counts = tuple(zip(base_summary["cluster_id"].astype(int), base_summary["record_count"].astype(int)))
+        n_points = sum(n for _, n in counts)
+        mode = lod_mode(n_points, point_budget)
+        if mode == "density":
+            show_points = st.checkbox(f"Show raw points (sampled to {point_budget:,})", key="explorer_raw_points")
+        labels = {x_col: x_col.replace("_", " ").title(), y_col: y_col.replace("_", " ").title()}
+
+        columns = tuple(dict.fromkeys((x_col, y_col, *label_cols)))
+        if mode == "svg":
+            points = relabel(pd.DataFrame(read_rows("clustered_data", run_id, columns=columns)), position)
+        elif mode == "webgl" or show_points or position is not None:
+            # The density grids are binned by the run's own K, so other K bin this sample instead
+            if mode == "webgl" or show_points:
+                mode = "webgl"
+            points = relabel(pd.DataFrame(read_sample("clustered_data", run_id, columns, counts, point_budget)),
+                             position)
+
+        if mode != "density":
+            fig = cluster_scatter(points, x_col, y_col, point_budget, labels=labels)
+            fig.update_layout(template="plotly_white")
+            st.plotly_chart(fig, use_container_width=True)
+            st.caption(lod_caption(n_points, min(len(points), point_budget), mode))
+        elif x_col == y_col:
+            st.info("Pick two different features to see their joint density.")
+        elif position is not None:
+            fig = density_figure(point_density(points, x_col, y_col))
+            fig.update_layout(template="plotly_white", xaxis_title=labels[x_col], yaxis_title=labels[y_col])
+            st.plotly_chart(fig, use_container_width=True)
+            st.caption(f"{n_points:,} points, drawn as binned density of a {len(points):,}-point sample")
+        else:
+            # Density grids are stored once per unordered pair; fetch whichever orientation exists
+            grids = read_rows("histogram_data", run_id, filters=(
+                ("kind", "density"), ("feature_x", (x_col, y_col)), ("feature_y", (x_col, y_col)),
+            ))
+            if not grids:
+                st.info("No density grid was precomputed for this pair of features.")
+            else:
+                a = grids[0]["feature_x"]
+                layers = []
+                for cid in all_clusters:
+                    z, xl, xh, yl, yh = binned(grids, {cid})
+                    if z is None:
+                        continue
+                    if a != x_col:
+                        z, xl, xh, yl, yh = z.T, yl, yh, xl, xh
+                    layers.append((cid, bin_centers(xl, xh, z.shape[1])[0], bin_centers(yl, yh, z.shape[0])[0], z))
+                fig = density_figure(layers)
+                fig.update_layout(template="plotly_white", xaxis_title=labels[x_col], yaxis_title=labels[y_col])
+                st.plotly_chart(fig, use_container_width=True)
+                st.caption(lod_caption(n_points, 0, mode))
 
         st.subheader("Filtered Data")
-        cluster_filter = st.multiselect(
-            "Filter by cluster",
-            sorted(df_c["cluster_id"].unique()),
-            default=sorted(df_c["cluster_id"].unique()),
-        )
-        filtered = df_c[df_c["cluster_id"].isin(cluster_filter)]
-        display_cols = [c for c in filtered.columns if c not in ("id", "created_at", "cluster_label")]
-        st.dataframe(filtered[display_cols].head(200), use_container_width=True, hide_index=True)
-        st.caption(f"Showing {min(200, len(filtered))} of {len(filtered)} rows")
+        cluster_filter = st.multiselect("Filter by cluster", all_clusters, default=all_clusters)
+        total_rows = int(df_summary[df_summary["cluster_id"].isin(cluster_filter)]["record_count"].sum())
+        if position is None:
+            label_filter = ("cluster_id", tuple(cluster_filter))
+        else:
+            label_filter = ("cluster_ids", Match(label_pattern(position, cluster_filter)))
+        rows = read_rows("clustered_data", run_id, limit=200, filters=(label_filter,)) if cluster_filter else []
+        if rows:
+            filtered = relabel(pd.DataFrame(rows), position)
+            display_cols = [c for c in filtered.columns if c not in META_COLUMNS]
+            st.dataframe(filtered[display_cols], use_container_width=True, hide_index=True)
+        st.caption(f"Showing {len(rows)} of {total_rows} rows")
     else:
         st.warning("No clustered data found.")
 
@@ -262,21 +624,37 @@ elif page == "Cluster Explorer":
 elif page == "t-SNE":
     st.header("t-SNE Visualization")
 
+    tsne, summary = load("tsne"), load("summary")
+
     if tsne:
-        df_tsne = pd.DataFrame(tsne)
-        df_tsne["cluster_label"] = "Cluster " + df_tsne["cluster_id"].astype(str)
-
-        fig = px.scatter(
-            df_tsne, x="x", y="y", color="cluster_label",
-            color_discrete_sequence=COLORS,
-            opacity=0.7,
-            labels={"x": "t-SNE Dimension 1", "y": "t-SNE Dimension 2"},
-        )
-        fig.update_layout(template="plotly_white", height=600)
-        fig.update_traces(marker=dict(size=4))
+        position = select_k(summary)[2] if summary else None
+        df_tsne = relabel(pd.DataFrame(tsne), position)
+        mode = lod_mode(len(df_tsne), point_budget)
+        if mode == "density" and st.checkbox(f"Show raw points (sampled to {point_budget:,})", key="tsne_raw_points"):
+            mode = "webgl"
+
+        if mode == "density":
+            fig = density_figure(point_density(df_tsne, "x", "y"))
+        else:
+            fig = cluster_scatter(df_tsne, "x", "y", point_budget, opacity=0.7,
+                                  labels={"x": "t-SNE Dimension 1", "y": "t-SNE Dimension 2"})
+            fig.update_traces(marker=dict(size=4))
+        fig.update_layout(template="plotly_white", height=600,
+                          xaxis_title="t-SNE Dimension 1", yaxis_title="t-SNE Dimension 2")
         st.plotly_chart(fig, use_container_width=True)
+        st.caption(lod_caption(len(df_tsne), min(len(df_tsne), point_budget), mode))
 
         with st.expander("t-SNE Data Sample"):
             st.dataframe(df_tsne[["x", "y", "cluster_id"]].head(100), use_container_width=True, hide_index=True)
     else:
         st.warning("No t-SNE data found.")
+
+
+# -- Background prefetch --------------------------------------------------
+# Once per session and run, warm the other pages' caches (big tables last) after
+# this page has rendered, so switching pages does not wait on the network.
+if DASHBOARD_PREFETCH and st.session_state.get("prefetched_run", "") != run_id:
+    st.session_state["prefetched_run"] = run_id
+    worker = threading.Thread(target=prefetch, args=(run_id, tuple(DATASETS)), daemon=True)
+    add_script_run_ctx(worker, get_script_run_ctx())
+    worker.start()
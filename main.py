@@ -5,6 +5,9 @@ Usage:
     python main.py                          # launch Streamlit dashboard
     python main.py process <csv_file>       # run ML pipeline then launch dashboard
     python main.py process <csv_file> -k 4  # run ML pipeline with 4 clusters
+    python main.py process <csv_file> --streaming  # out-of-core KMeans for large CSVs
+    python main.py predict <records_file>   # assign records to the published clusters
+    python main.py serve [--port N]         # HTTP cluster-assignment service
     python main.py sql                      # print table creation SQL
 """
 
@@ -15,8 +18,10 @@ import os
 ROOT = os.path.dirname(os.path.abspath(__file__))
 
 
-def run_process(csv_path, n_clusters=3):
+def run_process(csv_path, n_clusters=3, streaming=False):
     cmd = [sys.executable, os.path.join(ROOT, "process.py"), csv_path, "--clusters", str(n_clusters)]
+    if streaming:
+        cmd.append("--streaming")
     print(f"Running ML pipeline: {' '.join(cmd)}\n")
     result = subprocess.run(cmd, cwd=ROOT)
     if result.returncode != 0:
@@ -31,6 +36,12 @@ def run_dashboard():
     subprocess.run(cmd, cwd=ROOT)
 
 
+def run_predict(args):
+    """predict.py loads the published run's model once, then assigns records or serves them."""
+    cmd = [sys.executable, os.path.join(ROOT, "predict.py"), *args]
+    sys.exit(subprocess.run(cmd, cwd=ROOT).returncode)
+
+
 def print_sql():
     cmd = [sys.executable, os.path.join(ROOT, "setup_supabase.py"), "--sql"]
     subprocess.run(cmd, cwd=ROOT)
@@ -48,21 +59,34 @@ def main():
     if command == "sql":
         print_sql()
 
+    elif command == "predict":
+        if len(args) < 2:
+            print("Usage: python main.py predict <records.csv|.json|-> [--out FILE] [--run ID | --model PATH]")
+            sys.exit(1)
+        run_predict(args[1:])
+
+    elif command == "serve":
+        run_predict(["serve", *args[1:]])
+
     elif command == "process":
         if len(args) < 2:
-            print("Usage: python main.py process <csv_file> [-k N]")
+            print("Usage: python main.py process <csv_file> [-k N] [--streaming]")
             sys.exit(1)
         csv_path = args[1]
         n_clusters = 3
         if "-k" in args:
             n_clusters = int(args[args.index("-k") + 1])
-        run_process(csv_path, n_clusters)
+        run_process(csv_path, n_clusters, streaming="--streaming" in args)
         run_dashboard()
 
     else:
         print("Usage:")
         print("  python main.py                          Launch dashboard")
-        print("  python main.py process <csv> [-k N]     Run ML pipeline + dashboard")
+        print("  python main.py process <csv> [-k N] [--streaming]")
+        print("                                          Run ML pipeline + dashboard")
+        print("  python main.py predict <records> [--out FILE]")
+        print("                                          Assign records to the published clusters")
+        print("  python main.py serve [--port N]         Cluster-assignment HTTP service")
         print("  python main.py sql                      Print table creation SQL")
         sys.exit(1)
 
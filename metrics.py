@@ -0,0 +1,244 @@
+"""
+Run instrumentation for the pipeline and the REST client.
+Stages report wall/CPU time, rows and peak RSS (see scheduler.StageTiming);
+every PostgREST request is recorded here with its latency, status and payload
+bytes, aggregated into fixed-bucket histograms per table and method. A run ends
+with a JSON report and, optionally, a Prometheus textfile for node_exporter's
+textfile collector. The predict service keeps a LatencyWindow for p50/p99.
+Standard library only, so importing it stays cheap.
+"""
+
+from __future__ import annotations
+import bisect
+import json
+import math
+import os
+import resource
+import sys
+import threading
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+# Histogram upper bounds (the +Inf bucket is implicit)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BYTES_BUCKETS = (1_000, 10_000, 100_000, 250_000, 500_000, 1_000_000, 2_500_000, 10_000_000)
+
+
+# Highest peak RSS of this process in the windows closed by reset_peak_rss()
+_earlier_peak_mb = 0.0
+
+
+def reset_peak_rss():
+    """
+    Start a new peak-RSS window for this process (Linux 4.0+: writing 5 to
+    clear_refs resets VmHWM). Elsewhere peak_rss_mb() stays the lifetime peak.
+    The closing window's peak is kept for lifetime_peak_rss_mb().
+    """
+    global _earlier_peak_mb
+    _earlier_peak_mb = max(_earlier_peak_mb, peak_rss_mb())
+    try:
+        with open("/proc/self/clear_refs", "w") as fh:
+            fh.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process, since the last reset_peak_rss() where supported."""
+    try:
+        with open("/proc/self/status") as fh:
+            for line in fh:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+
+def lifetime_peak_rss_mb() -> float:
+    """Peak resident set size of this process since it started, across reset_peak_rss() windows."""
+    return max(_earlier_peak_mb, peak_rss_mb())
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style."""
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """(le, count of observations <= le) for every bucket, ending with +Inf."""
+        out, total = [], 0
+        for bound, n in zip([*map(repr, self.bounds), "+Inf"], self.counts):
+            total += n
+            out.append((bound, total))
+        return out
+
+    def to_dict(self) -> dict:
+        return {"count": self.count, "sum": round(self.sum, 6), "buckets": dict(self.cumulative())}
+
+
+class RequestMetrics:
+    """Thread-safe per-(table, method) aggregates of REST requests."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple[str, str], dict] = {}
+
+    def record(self, table: str, method: str, status: Optional[int], seconds: float,
+               sent_bytes: int = 0, received_bytes: int = 0):
+        """One request attempt; status is None when it failed without a response."""
+        with self._lock:
+            series = self._series.get((table, method))
+            if series is None:
+                series = self._series[(table, method)] = {
+                    "latency": Histogram(LATENCY_BUCKETS),
+                    "sent": Histogram(BYTES_BUCKETS),
+                    "received_bytes": 0,
+                    "status": {},
+                }
+            series["latency"].observe(seconds)
+            series["sent"].observe(sent_bytes)
+            series["received_bytes"] += received_bytes
+            key = "error" if status is None else str(status)
+            series["status"][key] = series["status"].get(key, 0) + 1
+
+    def reset(self):
+        with self._lock:
+            self._series = {}
+
+    def to_records(self) -> List[dict]:
+        with self._lock:
+            return [
+                {
+                    "table": table, "method": method,
+                    "requests": s["latency"].count,
+                    "status": dict(s["status"]),
+                    "latency_seconds": s["latency"].to_dict(),
+                    "sent_bytes": s["sent"].to_dict(),
+                    "received_bytes": s["received_bytes"],
+                }
+                for (table, method), s in sorted(self._series.items())
+            ]
+
+
+# Every REST request made by this process lands here
+REQUESTS = RequestMetrics()
+
+
+class LatencyWindow:
+    """Thread-safe latencies of the last `size` calls, for p50/p99 of a long-running service."""
+
+    def __init__(self, size: int = 10_000):
+        self._lock = threading.Lock()
+        self._recent: Deque[float] = deque(maxlen=size)
+        self.count = 0
+        self.items = 0
+
+    def record(self, seconds: float, items: int = 1):
+        with self._lock:
+            self._recent.append(seconds)
+            self.count += 1
+            self.items += items
+
+    def summary(self) -> dict:
+        """Call and item totals plus p50/p99/max latency in ms over the window (nearest rank)."""
+        with self._lock:
+            recent = sorted(self._recent)
+            count, items = self.count, self.items
+        out = {"calls": count, "items": items, "window": len(recent)}
+        for name, q in (("p50_ms", 0.50), ("p99_ms", 0.99), ("max_ms", 1.0)):
+            out[name] = round(recent[max(0, math.ceil(q * len(recent)) - 1)] * 1000, 3) if recent else None
+        return out
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value: float):
+    return int(value) if value.is_integer() or abs(value) >= 2**20 else round(value, 6)
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def prometheus_text(report: dict) -> str:
+    """The run report in the Prometheus text exposition format."""
+    lines: List[str] = []
+
+    def metric(name: str, kind: str, help_text: str, samples: List[Tuple[dict, float]]):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(f"{name}{_labels(**labels)} {value}" for labels, value in samples)
+
+    run = {"mode": report["mode"]}
+    metric("pipeline_run_success", "gauge", "1 if the last run published, else 0.",
+           [(run, int(report["status"] == "published"))])
+    metric("pipeline_run_seconds", "gauge", "Wall time of the last run.", [(run, report["seconds"])])
+    metric("pipeline_run_timestamp_seconds", "gauge", "Unix time the last run finished.",
+           [(run, report["finished_at"])])
+    metric("pipeline_run_rows", "gauge", "Rows in the last run's input.", [(run, report.get("rows") or 0)])
+    metric("pipeline_peak_rss_bytes", "gauge", "Peak RSS of the driver process.",
+           [(run, int(report["peak_rss_mb"] * 2**20))])
+
+    stages = report.get("stages", [])
+    for name, key, help_text, scale in (
+        ("pipeline_stage_seconds", "seconds", "Stage wall time.", 1),
+        ("pipeline_stage_cpu_seconds", "cpu_seconds", "Stage CPU time.", 1),
+        ("pipeline_stage_rows", "rows", "Rows a stage processed.", 1),
+        ("pipeline_stage_peak_rss_bytes", "peak_rss_mb", "Peak RSS of the process running the stage.", 2**20),
+        ("pipeline_stage_upload_seconds", "upload_seconds", "Time spent uploading a stage's results.", 1),
+        ("pipeline_stage_cached", "cached", "1 if the stage came from the stage cache.", 1),
+    ):
+        samples = [({**run, "stage": s["name"]}, _number(float(s[key]) * scale))
+                   for s in stages if s.get(key) is not None]
+        if samples:
+            metric(name, "gauge", help_text, samples)
+
+    requests = report.get("requests", [])
+    for name, key, help_text in (
+        ("supabase_request_duration_seconds", "latency_seconds", "REST request latency."),
+        ("supabase_request_sent_bytes", "sent_bytes", "REST request body size."),
+    ):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} histogram")
+        for r in requests:
+            labels = {"table": r["table"], "method": r["method"]}
+            hist = r[key]
+            lines.extend(f"{name}_bucket{_labels(**labels, le=le)} {n}" for le, n in hist["buckets"].items())
+            lines.append(f"{name}_sum{_labels(**labels)} {hist['sum']}")
+            lines.append(f"{name}_count{_labels(**labels)} {hist['count']}")
+    metric("supabase_requests_total", "counter", "REST requests by status (error: no response).",
+           [({"table": r["table"], "method": r["method"], "status": status}, n)
+            for r in requests for status, n in sorted(r["status"].items())])
+    metric("supabase_received_bytes_total", "counter", "REST response bytes.",
+           [({"table": r["table"], "method": r["method"]}, r["received_bytes"]) for r in requests])
+    return "\n".join(lines) + "\n"
+
+
+def _write_atomic(path: str, text: str):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as fh:
+        fh.write(text)
+    os.replace(tmp, path)
+
+
+def write_report(report: dict, json_path: Optional[str], prometheus_path: Optional[str] = None):
+    """Write the run report as JSON and/or as a Prometheus textfile (each atomically)."""
+    if json_path:
+        _write_atomic(json_path, json.dumps(report, indent=2))
+    if prometheus_path:
+        _write_atomic(prometheus_path, prometheus_text(report))
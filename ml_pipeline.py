@@ -2,14 +2,24 @@
 ML Pipeline module.
 Handles data preprocessing, clustering, outlier detection, and t-SNE.
 All heavy computation lives here, results are cached in Supabase.
+scikit-learn is imported inside the functions that use it, so importing this
+module (the dashboard, pipeline workers) does not pay for it up front.
 """
 
+from __future__ import annotations
+import contextlib
+import inspect
+import os
+from dataclasses import dataclass, field, asdict
+
 import numpy as np
 import pandas as pd
-from sklearn.cluster import KMeans
-from sklearn.manifold import TSNE
-from sklearn.preprocessing import StandardScaler
-from typing import Tuple, Dict, List
+from joblib import Parallel, delayed
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+if TYPE_CHECKING:
+    from sklearn.cluster import KMeans, MiniBatchKMeans
+    from sklearn.preprocessing import StandardScaler
 
 
 # Column name mapping from raw CSV to clean names
@@ -31,8 +41,34 @@ NUMERIC_FEATURES = [
     "service_latency",
 ]
 
+TARGET_COLUMN = "Optimized_Resource_Allocation"
+DROPPED_COLUMNS = ["Predicted_Workload (%)"]
+
+# Category vocabularies the Supabase tables are built for. Values seen in the data
+# are added on top, so the one-hot columns never depend on which categories a
+# particular export (or chunk) happens to contain.
+KNOWN_CATEGORIES = {"Workload_Type": ["High", "Low", "Medium"]}
+
+# Rows per block when fitting the scaler, which bounds its float64 temporaries
+SCALE_BLOCK_ROWS = 65536
+
+# Digits of packed label strings (see pack_labels): one character per clustering
+LABEL_DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+_DIGIT_CODES = np.frombuffer(LABEL_DIGITS.encode(), dtype=np.uint8)
+_DIGIT_VALUES = np.full(256, -1, dtype=np.int64)
+_DIGIT_VALUES[_DIGIT_CODES] = np.arange(len(LABEL_DIGITS))
+
 
-def load_and_preprocess(df_raw: pd.DataFrame) -> pd.DataFrame:
+def _int_dtype(lo: float, hi: float) -> type:
+    """Smallest signed integer type holding [lo, hi]."""
+    for dtype in (np.int8, np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if info.min <= lo and hi <= info.max:
+            return dtype
+    return np.int64
+
+
+def load_and_preprocess(df_raw: pd.DataFrame, inplace: bool = False, compact: bool = False) -> pd.DataFrame:
     """
     Clean the raw dataset:
     - Drop target column
@@ -40,8 +76,11 @@ def load_and_preprocess(df_raw: pd.DataFrame) -> pd.DataFrame:
     - One-hot encode categoricals
     - Convert booleans to int
     - Drop Predicted_Workload
+    inplace reuses df_raw's columns instead of copying the frame first (df_raw is
+    modified). compact stores floats as float32 and integer and one-hot columns in
+    the smallest integer type that holds them.
     """
-    df = df_raw.copy()
+    df = df_raw if inplace else df_raw.copy()
 
     # Drop target if present
     if "Optimized_Resource_Allocation" in df.columns:
@@ -52,16 +91,20 @@ def load_and_preprocess(df_raw: pd.DataFrame) -> pd.DataFrame:
     categorical_cols = df.select_dtypes(include=["object"]).columns
 
     for col in numerical_cols:
-        df[col].fillna(df[col].mean(), inplace=True)
+        df[col] = df[col].fillna(df[col].mean())
+        if compact:
+            values = df[col]
+            df[col] = (values.astype(np.float32) if values.dtype.kind == "f"
+                       else values.astype(_int_dtype(values.min(), values.max())))
     for col in categorical_cols:
-        df[col].fillna(df[col].mode()[0], inplace=True)
+        df[col] = df[col].fillna(df[col].mode()[0])
 
     # One-hot encode
     df = pd.get_dummies(df, drop_first=True)
 
     # Convert bools to int
     bool_columns = df.select_dtypes(include="bool").columns
-    df[bool_columns] = df[bool_columns].astype(int)
+    df[bool_columns] = df[bool_columns].astype(np.int8 if compact else int)
 
     # Drop predicted workload if present
     if "Predicted_Workload (%)" in df.columns:
@@ -83,6 +126,230 @@ def load_and_preprocess(df_raw: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
+def _clean_name(col: str) -> str:
+    """Same renaming as load_and_preprocess: COLUMN_MAP, then lowercase/no punctuation."""
+    col = COLUMN_MAP.get(col, col)
+    return col.lower().replace(" ", "_").replace("(", "").replace(")", "").replace("%", "pct")
+
+
+@dataclass
+class PreprocessSchema:
+    """
+    Everything needed to preprocess any chunk of a CSV identically:
+    fill values, category vocabularies and numeric dtypes, gathered in one scan.
+    """
+    input_columns: List[str]
+    numeric_fill: Dict[str, float]
+    numeric_dtypes: Dict[str, str]
+    categorical_fill: Dict[str, str]
+    categories: Dict[str, List[str]]
+    n_rows: int = 0
+    passthrough: List[str] = field(default_factory=list)
+    numeric_range: Dict[str, List[float]] = field(default_factory=dict)
+    # Compact dtypes: float32 features, smallest-int integer and one-hot columns
+    compact: bool = False
+
+    def output_dtype(self, col: str):
+        """dtype of a numeric input column after preprocessing."""
+        dtype = self.numeric_dtypes[col]
+        if not self.compact:
+            return dtype
+        if dtype.startswith("float"):
+            return np.float32
+        lo, hi = self.numeric_range.get(col, (0, 0))
+        return _int_dtype(min(lo, self.numeric_fill[col]), max(hi, self.numeric_fill[col]))
+
+    @property
+    def output_columns(self) -> List[str]:
+        return list(preprocess_chunk(self._empty_frame(), self).columns)
+
+    def value_ranges(self) -> Dict[str, Tuple[float, float]]:
+        """(min, max) of every output column as seen by the scan; one-hot and bool columns are 0/1."""
+        ranges = {col: (0.0, 1.0) for col in self.output_columns}
+        for col, (lo, hi) in self.numeric_range.items():
+            ranges[_clean_name(col)] = (lo, hi)
+        return ranges
+
+    def _empty_frame(self) -> pd.DataFrame:
+        return pd.DataFrame({c: pd.Series(dtype=self.numeric_dtypes.get(c, "object"))
+                             for c in self.input_columns})
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "PreprocessSchema":
+        return cls(**d)
+
+
+def _is_categorical(series: pd.Series) -> bool:
+    return series.dtype == object or pd.api.types.is_string_dtype(series.dtype)
+
+
+def scan_csv(csv_path: str, chunk_rows: int = 100000, sample_rows: int = 0,
+             compact: bool = False) -> Tuple[PreprocessSchema, pd.DataFrame]:
+    """
+    Pass one of the streaming ingestor: read the CSV in chunks and collect column
+    means and ranges, category counts (for the mode) and the category vocabulary.
+    Optionally keeps a uniform random sample of up to sample_rows raw rows.
+    compact makes the schema produce compact dtypes (see PreprocessSchema).
+    Returns (schema, raw sample).
+    """
+    sums: Dict[str, float] = {}
+    counts: Dict[str, int] = {}
+    ranges: Dict[str, List[float]] = {}
+    dtypes: Dict[str, str] = {}
+    value_counts: Dict[str, pd.Series] = {}
+    input_columns: List[str] = []
+    passthrough: List[str] = []
+    n_rows = 0
+    rng = np.random.default_rng(42)
+    sample, sample_keys = None, np.empty(0)
+
+    for chunk in pd.read_csv(csv_path, chunksize=chunk_rows):
+        chunk = chunk.drop(columns=[TARGET_COLUMN], errors="ignore")
+        if not input_columns:
+            input_columns = list(chunk.columns)
+            for col in input_columns:
+                if _is_categorical(chunk[col]):
+                    value_counts[col] = pd.Series(dtype=np.int64)
+                elif chunk[col].dtype.kind in "if":
+                    sums[col], counts[col] = 0.0, 0
+                else:
+                    passthrough.append(col)
+        for col in sums:
+            values = chunk[col]
+            sums[col] += float(values.sum())
+            counts[col] += int(values.count())
+            if values.count():
+                lo, hi = float(values.min()), float(values.max())
+                prev = ranges.get(col, [lo, hi])
+                ranges[col] = [min(prev[0], lo), max(prev[1], hi)]
+            # A column that is float (has NaNs) anywhere is float everywhere
+            if dtypes.get(col) != "float64":
+                dtypes[col] = "float64" if values.dtype.kind == "f" else "int64"
+        for col in value_counts:
+            value_counts[col] = value_counts[col].add(chunk[col].value_counts(), fill_value=0)
+        n_rows += len(chunk)
+
+        if sample_rows:
+            keys = rng.random(len(chunk))
+            sample = chunk if sample is None else pd.concat([sample, chunk], ignore_index=True)
+            sample_keys = np.concatenate([sample_keys, keys])
+            if len(sample) > sample_rows:
+                keep = np.sort(np.argpartition(sample_keys, sample_rows)[:sample_rows])
+                sample, sample_keys = sample.iloc[keep].reset_index(drop=True), sample_keys[keep]
+
+    numeric_fill = {col: (sums[col] / counts[col] if counts[col] else 0.0) for col in sums}
+    categorical_fill, categories = {}, {}
+    for col, vc in value_counts.items():
+        # Most frequent value; ties go to the smallest, like Series.mode()[0]
+        categorical_fill[col] = min(vc.index[vc == vc.max()]) if len(vc) else ""
+        categories[col] = sorted(set(vc.index) | set(KNOWN_CATEGORIES.get(col, [])))
+
+    schema = PreprocessSchema(
+        input_columns=input_columns,
+        numeric_fill=numeric_fill,
+        numeric_dtypes=dtypes,
+        categorical_fill=categorical_fill,
+        categories=categories,
+        n_rows=n_rows,
+        passthrough=passthrough,
+        numeric_range=ranges,
+        compact=compact,
+    )
+    return schema, sample if sample is not None else pd.DataFrame(columns=input_columns)
+
+
+def preprocess_chunk(chunk: pd.DataFrame, schema: PreprocessSchema) -> pd.DataFrame:
+    """
+    Pass two: preprocess one raw chunk with the global schema. Produces the same
+    columns, order and dtypes as load_and_preprocess on the whole file, for every chunk.
+    With a compact schema, integer values outside the scanned range (appended rows)
+    widen that chunk's column instead of wrapping around.
+    """
+    flag = np.int8 if schema.compact else np.int64
+    out = {}
+    for col in schema.input_columns:
+        if col in DROPPED_COLUMNS or col in schema.categories:
+            continue
+        values = chunk[col]
+        if col in schema.numeric_fill:
+            if values.hasnans:
+                values = values.fillna(schema.numeric_fill[col])
+            dtype = schema.output_dtype(col)
+            if schema.compact and values.dtype.kind in "iuf" and np.dtype(dtype).kind == "i" and len(values):
+                lo, hi = values.min(), values.max()
+                dtype = np.promote_types(dtype, _int_dtype(lo, hi)) if np.isfinite([lo, hi]).all() else np.int64
+            values = values.astype(dtype)
+        elif values.dtype == bool:
+            values = values.astype(flag)
+        out[_clean_name(col)] = values
+    # One-hot columns go last and drop the first category, like get_dummies(drop_first=True)
+    for col, cats in schema.categories.items():
+        values = chunk[col]
+        if values.hasnans:
+            values = values.fillna(schema.categorical_fill[col])
+        for cat in cats[1:]:
+            out[_clean_name(f"{col}_{cat}")] = (values == cat).to_numpy().astype(flag)
+    return pd.DataFrame(out, index=chunk.index)
+
+
+def iter_preprocessed_chunks(csv_path: str, schema: PreprocessSchema, chunk_rows: int = 100000) -> Iterator[pd.DataFrame]:
+    """Read the CSV again in chunks and yield each one preprocessed with the schema."""
+    for chunk in pd.read_csv(csv_path, chunksize=chunk_rows):
+        yield preprocess_chunk(chunk, schema)
+
+
+def chunk_rows_for_memory(csv_path: str, memory_mb: float, overhead: float = 4.0) -> int:
+    """
+    Rows per chunk that keep ingestion under memory_mb. Bytes per row are measured
+    on the first 1000 rows; overhead covers the raw chunk, the filled columns, the
+    one-hot columns and the float matrix built from them.
+    """
+    head = pd.read_csv(csv_path, nrows=1000)
+    bytes_per_row = head.memory_usage(deep=True).sum() / max(len(head), 1)
+    return max(1000, int(memory_mb * 2 ** 20 / (bytes_per_row * overhead)))
+
+
+def read_preprocessed(csv_path: str, chunk_rows: int = 100000,
+                      compact: bool = False) -> Tuple[pd.DataFrame, PreprocessSchema]:
+    """
+    Two-pass load into one frame, without holding the raw CSV and its copies at once.
+    The scan gives the row count, so every output column is allocated once and
+    filled chunk by chunk; the frame wraps those arrays without concatenating.
+    """
+    schema, _ = scan_csv(csv_path, chunk_rows, compact=compact)
+    columns: Dict[str, np.ndarray] = {}
+    pos = 0
+    for chunk in iter_preprocessed_chunks(csv_path, schema, chunk_rows):
+        if not columns:
+            columns = {c: np.empty(schema.n_rows, dtype=chunk[c].dtype) for c in chunk.columns}
+        for c, values in columns.items():
+            values[pos : pos + len(chunk)] = chunk[c].to_numpy()
+        pos += len(chunk)
+    if not columns:
+        return preprocess_chunk(schema._empty_frame(), schema), schema
+    return pd.DataFrame(columns, copy=False), schema
+
+
+def compute_feature_stats(df: pd.DataFrame) -> List[Dict]:
+    """Mean/std/min/max/median per numeric feature (data_stats rows)."""
+    stats_records = []
+    for col in NUMERIC_FEATURES:
+        if col in df.columns:
+            stats_records.append({
+                "feature_name": col,
+                "mean_val": round(float(df[col].mean()), 4),
+                "std_val": round(float(df[col].std()), 4),
+                "min_val": round(float(df[col].min()), 4),
+                "max_val": round(float(df[col].max()), 4),
+                "median_val": round(float(df[col].median()), 4),
+                "row_count": len(df),
+            })
+    return stats_records
+
+
 def compute_outliers(df: pd.DataFrame) -> Dict[str, int]:
     """Count outliers per numeric column using IQR method."""
     outlier_counts = {}
@@ -97,21 +364,279 @@ def compute_outliers(df: pd.DataFrame) -> Dict[str, int]:
     return outlier_counts
 
 
-def run_kmeans(df: pd.DataFrame, n_clusters: int = 3) -> Tuple[pd.DataFrame, pd.DataFrame, np.ndarray]:
+def _quartiles(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Per-column Q1, median and Q3 of a NaN-free matrix from a single partition.
+    Reproduces np.quantile's linear interpolation and np.median's midpoint mean,
+    i.e. exactly what pandas' quantile() and median() return.
+    """
+    n = len(values)
+    q = np.array([0.25, 0.75])
+    pos = n * q + (1 - q) - 1  # np.quantile's virtual index for method="linear"
+    lo = np.floor(pos).astype(int)
+    hi = np.minimum(lo + 1, n - 1)
+    mid = [(n - 1) // 2, n // 2]
+    part = np.partition(values, sorted(set(lo) | set(hi) | set(mid)), axis=0)
+    quartiles = []
+    for a, b, t in zip(part[lo], part[hi], pos - lo):
+        diff = b - a
+        quartiles.append(b - diff * (1 - t) if t >= 0.5 else a + diff * t)
+    median = (part[mid[0]] + part[mid[1]]) / 2
+    return quartiles[0], median, quartiles[1]
+
+
+def summarize_frame(df: pd.DataFrame) -> Tuple[List[Dict], Dict[str, int], Dict]:
+    """
+    compute_feature_stats, compute_outliers and compute_correlation in one go.
+    The numeric columns are copied once into a column-major float matrix, so every
+    reduction is a contiguous pass in pandas' own summation order; quartiles come
+    from one partition and the correlation from one matrix product.
+    Returns (data_stats rows, outlier counts, correlation) identical to the three
+    separate functions, up to last-bit rounding in the correlation matrix.
+    """
+    numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
+    if not numeric_cols or df.isna()[numeric_cols].to_numpy().any() or len(df) < 2:
+        # NaNs need pandas' pairwise-complete handling; tiny frames are not worth it
+        return compute_feature_stats(df), compute_outliers(df), compute_correlation(df)
+
+    values = np.asfortranarray(df[numeric_cols].to_numpy(dtype=np.float64))
+    n = len(values)
+    mean = values.sum(axis=0) / n
+    vmin, vmax = values.min(axis=0), values.max(axis=0)
+    q1, median, q3 = _quartiles(values)
+    iqr = q3 - q1
+    counts = ((values < q1 - 1.5 * iqr) | (values > q3 + 1.5 * iqr)).sum(axis=0)
+    # The matrix is ours: center it in place, shared by the variance and the correlation
+    dev = values
+    dev -= mean
+    std = np.sqrt(np.einsum("ij,ij->j", dev, dev) / (n - 1))
+
+    index = {c: i for i, c in enumerate(numeric_cols)}
+    stats_records = [
+        {
+            "feature_name": col,
+            "mean_val": round(float(mean[i]), 4),
+            "std_val": round(float(std[i]), 4),
+            "min_val": round(float(vmin[i]), 4),
+            "max_val": round(float(vmax[i]), 4),
+            "median_val": round(float(median[i]), 4),
+            "row_count": n,
+        }
+        for col, i in ((c, index[c]) for c in NUMERIC_FEATURES if c in index)
+    ]
+    outlier_counts = {col: int(counts[i]) for col, i in index.items()}
+
+    corr_cols = [c for c in numeric_cols if c != "cluster_id"]
+    corr_idx = [index[c] for c in corr_cols]
+    d = dev[:, corr_idx]
+    cov = d.T @ d
+    with np.errstate(divide="ignore", invalid="ignore"):
+        corr = cov / np.sqrt(np.outer(np.diag(cov), np.diag(cov)))
+    corr = np.clip(corr, -1.0, 1.0)
+    np.fill_diagonal(corr, np.where(np.diag(cov) > 0, 1.0, np.nan))
+    return stats_records, outlier_counts, {"columns": corr_cols, "matrix": corr.tolist()}
+
+
+class QuantileSketch:
+    """
+    Mergeable KLL quantile sketch of one numeric column (Karnin, Lang & Liberty 2016).
+    Values go into a stack of compactors; a full compactor sorts itself and
+    promotes every other item (random offset) one level up, at double weight.
+    Memory is O(k) items whatever the number of rows.
+
+    Error bound: quantile(q) returns a value whose rank is within eps * n of q * n,
+    with eps = O(1/k) with high probability: about 1.3% of n at k=200 and 0.65% at
+    k=400 (99% confidence, DataSketches' KLL tables); doubling k halves it. Over
+    1M normal values split into 50 chunks, k=400 stayed within 0.45%. Merging
+    sketches does not loosen the bound.
+    """
+
+    def __init__(self, k: int = 400, seed: int = 0):
+        self.k = k
+        self.n = 0
+        self._levels: List[np.ndarray] = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self._levels) - 1 - level
+        return max(8, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def _compress(self):
+        while True:
+            full = [h for h, items in enumerate(self._levels) if len(items) > self._capacity(h)]
+            if not full:
+                return
+            h = full[0]
+            if h + 1 == len(self._levels):
+                self._levels.append(np.empty(0))
+            items = np.sort(self._levels[h])
+            odd = len(items) % 2  # an odd item out stays behind, so total weight is kept
+            self._levels[h] = items[:odd]
+            promoted = items[odd + int(self._rng.integers(2))::2]
+            self._levels[h + 1] = np.concatenate([self._levels[h + 1], promoted])
+
+    def update(self, values) -> "QuantileSketch":
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        self._levels[0] = np.concatenate([self._levels[0], values])
+        self.n += len(values)
+        self._compress()
+        return self
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        """Fold in a sketch built elsewhere (another chunk range or worker process)."""
+        for h, items in enumerate(other._levels):
+            if h == len(self._levels):
+                self._levels.append(np.empty(0))
+            self._levels[h] = np.concatenate([self._levels[h], items])
+        self.n += other.n
+        self._compress()
+        return self
+
+    def quantile(self, q):
+        """Approximate quantile(s) q in [0, 1]; NaN if nothing was added."""
+        if self.n == 0:
+            return np.full(np.shape(q), np.nan) if np.ndim(q) else float("nan")
+        items = np.concatenate(self._levels)
+        weights = np.concatenate([np.full(len(items), 2.0 ** h) for h, items in enumerate(self._levels)])
+        order = np.argsort(items, kind="stable")
+        cum = np.cumsum(weights[order])
+        idx = np.searchsorted(cum, np.asarray(q) * cum[-1], side="left")
+        result = items[order][np.minimum(idx, len(items) - 1)]
+        return result if np.ndim(q) else float(result)
+
+
+class StreamingStats:
+    """
+    data_stats fields and IQR bounds from chunks: exact running count, mean, std
+    (Chan et al. parallel update), min and max, plus a QuantileSketch per column
+    for the median and quartiles. Two instances built on different chunks merge.
+    """
+
+    def __init__(self, columns: List[str], k: int = 400):
+        self.columns = list(columns)
+        d = len(self.columns)
+        self.count = 0
+        self.mean = np.zeros(d)
+        self.m2 = np.zeros(d)
+        self.min = np.full(d, np.inf)
+        self.max = np.full(d, -np.inf)
+        self.sketches = [QuantileSketch(k, seed=j) for j in range(d)]
+
+    def _combine(self, count, mean, m2, vmin, vmax):
+        total = self.count + count
+        if total == 0:
+            return
+        delta = mean - self.mean
+        self.mean = self.mean + delta * (count / total)
+        self.m2 = self.m2 + m2 + delta ** 2 * (self.count * count / total)
+        self.count = total
+        self.min = np.minimum(self.min, vmin)
+        self.max = np.maximum(self.max, vmax)
+
+    def update(self, chunk: pd.DataFrame):
+        if chunk.empty:
+            return
+        values = chunk[self.columns].to_numpy(dtype=np.float64)
+        mean = values.mean(axis=0)
+        self._combine(len(values), mean, ((values - mean) ** 2).sum(axis=0), values.min(axis=0), values.max(axis=0))
+        for j, sketch in enumerate(self.sketches):
+            sketch.update(values[:, j])
+
+    def merge(self, other: "StreamingStats") -> "StreamingStats":
+        self._combine(other.count, other.mean, other.m2, other.min, other.max)
+        for mine, theirs in zip(self.sketches, other.sketches):
+            mine.merge(theirs)
+        return self
+
+    def bounds(self) -> Dict[str, Tuple[float, float]]:
+        """IQR outlier fences (Q1 - 1.5 IQR, Q3 + 1.5 IQR) per column."""
+        out = {}
+        for col, sketch in zip(self.columns, self.sketches):
+            q1, q3 = sketch.quantile([0.25, 0.75])
+            iqr = q3 - q1
+            out[col] = (q1 - 1.5 * iqr, q3 + 1.5 * iqr)
+        return out
+
+    def stats_records(self) -> List[Dict]:
+        """data_stats rows for NUMERIC_FEATURES, like compute_feature_stats."""
+        std = np.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else np.full(len(self.columns), np.nan)
+        records = []
+        for col in NUMERIC_FEATURES:
+            if col in self.columns:
+                j = self.columns.index(col)
+                records.append({
+                    "feature_name": col,
+                    "mean_val": round(float(self.mean[j]), 4),
+                    "std_val": round(float(std[j]), 4),
+                    "min_val": round(float(self.min[j]), 4),
+                    "max_val": round(float(self.max[j]), 4),
+                    "median_val": round(float(self.sketches[j].quantile(0.5)), 4),
+                    "row_count": self.count,
+                })
+        return records
+
+
+def count_outliers(chunks: Iterable[pd.DataFrame], bounds: Dict[str, Tuple[float, float]]) -> Dict[str, int]:
+    """Second streaming pass of compute_outliers: count values outside precomputed fences."""
+    columns = list(bounds)
+    lower = np.array([bounds[c][0] for c in columns])
+    upper = np.array([bounds[c][1] for c in columns])
+    counts = np.zeros(len(columns), dtype=np.int64)
+    for chunk in chunks:
+        values = chunk[columns].to_numpy(dtype=np.float64)
+        counts += ((values < lower) | (values > upper)).sum(axis=0)
+    return {col: int(c) for col, c in zip(columns, counts)}
+
+
+def scale_features(df: pd.DataFrame) -> Tuple[np.ndarray, StandardScaler]:
+    """
+    Standardize all numeric columns. Shared by the elbow sweep and KMeans.
+    The numeric columns are copied once into a matrix (float32 if the frame is
+    compact, else float64) that is then standardized in place; the scaler is
+    fitted in row blocks so its float64 temporaries stay small.
+    """
+    from sklearn.preprocessing import StandardScaler
+
+    numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
+    dtype = np.result_type(np.float32, *df[numeric_cols].dtypes)
+    scaled_data = df[numeric_cols].to_numpy(dtype=dtype, copy=True)
+    scaler = StandardScaler(copy=False)
+    for start in range(0, len(scaled_data), SCALE_BLOCK_ROWS):
+        scaler.partial_fit(scaled_data[start : start + SCALE_BLOCK_ROWS])
+    scaled_data = scaler.transform(scaled_data)
+    return scaled_data, scaler
+
+
+def run_kmeans(
+    df: pd.DataFrame,
+    n_clusters: int = 3,
+    scaled_data: Optional[np.ndarray] = None,
+    model: Optional[KMeans] = None,
+) -> Tuple[pd.DataFrame, pd.DataFrame, np.ndarray]:
     """
     Run KMeans clustering on the dataframe.
+    Pass scaled_data (from scale_features) and/or an already fitted model
+    (from elbow_sweep) to skip rescaling and refitting.
     Returns: (clustered_df, cluster_summary, scaled_data)
     """
-    # Scale
-    scaler = StandardScaler()
     numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
-    scaled_data = scaler.fit_transform(df[numeric_cols])
+
+    # Scale
+    if scaled_data is None:
+        scaled_data, _ = scale_features(df)
 
     # Cluster
-    kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
-    labels = kmeans.fit_predict(scaled_data)
+    if model is None:
+        from sklearn.cluster import KMeans
+
+        kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
+        labels = kmeans.fit_predict(scaled_data)
+    else:
+        labels = model.predict(scaled_data)
 
-    clustered_df = df.copy()
+    # Shallow copy: the new frame shares df's columns and only adds cluster_id
+    clustered_df = df.copy(deep=False)
     clustered_df["cluster_id"] = labels
 
     # Summary
@@ -132,34 +657,454 @@ def run_kmeans(df: pd.DataFrame, n_clusters: int = 3) -> Tuple[pd.DataFrame, pd.
     return clustered_df, summary_df, scaled_data
 
 
-def compute_elbow(df: pd.DataFrame, k_range: range = range(1, 11)) -> List[Dict]:
-    """Compute inertia for a range of k values."""
+def iter_frame_chunks(df: pd.DataFrame, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """Yield consecutive row slices of a frame (a chunk source for the streaming mode)."""
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start : start + chunk_rows]
+
+
+def fit_streaming_kmeans(
+    chunk_source: Callable[[], Iterable[pd.DataFrame]],
+    n_clusters: int = 3,
+    batch_size: int = 4096,
+    n_epochs: int = 1,
+    sample_rows: int = 10000,
+) -> Tuple[StandardScaler, MiniBatchKMeans, List[str], np.ndarray, int]:
+    """
+    Out-of-core KMeans. chunk_source() must return a fresh iterator of preprocessed
+    chunks each time it is called; only one chunk (plus the sample) is in memory.
+    Pass 1 fits the scaler with partial_fit and keeps a uniform reservoir sample;
+    pass 2 (repeated n_epochs times) fits MiniBatchKMeans with partial_fit.
+    Returns (scaler, model, numeric_cols, scaled sample, total row count).
+    """
+    from sklearn.cluster import MiniBatchKMeans
+    from sklearn.preprocessing import StandardScaler
+
     scaler = StandardScaler()
-    numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
-    scaled = scaler.fit_transform(df[numeric_cols])
+    numeric_cols: List[str] = []
+    rng = np.random.default_rng(42)
+    sample = None
+    sample_keys = np.empty(0)
+    n_rows = 0
+    for chunk in chunk_source():
+        if not numeric_cols:
+            numeric_cols = chunk.select_dtypes(include=[np.number]).columns.tolist()
+        values = chunk[numeric_cols].to_numpy(dtype=np.float64)
+        scaler.partial_fit(values)
+        n_rows += len(values)
+        # Reservoir sample: keep the rows with the smallest random keys
+        keys = rng.random(len(values))
+        if sample is None:
+            sample, sample_keys = values, keys
+        else:
+            sample = np.vstack([sample, values])
+            sample_keys = np.concatenate([sample_keys, keys])
+        if len(sample) > sample_rows:
+            keep = np.argpartition(sample_keys, sample_rows)[:sample_rows]
+            sample, sample_keys = sample[keep], sample_keys[keep]
+
+    model = MiniBatchKMeans(n_clusters=n_clusters, random_state=42, batch_size=batch_size, n_init=3)
+    for _ in range(n_epochs):
+        for chunk in chunk_source():
+            scaled = scaler.transform(chunk[numeric_cols].to_numpy(dtype=np.float64))
+            for start in range(0, len(scaled), batch_size):
+                batch = scaled[start : start + batch_size]
+                if len(batch) >= n_clusters or hasattr(model, "cluster_centers_"):
+                    model.partial_fit(batch)
+
+    return scaler, model, numeric_cols, scaler.transform(sample), n_rows
+
+
+def iter_assigned_chunks(
+    chunk_source: Callable[[], Iterable[pd.DataFrame]],
+    scaler: StandardScaler,
+    model,
+    numeric_cols: List[str],
+) -> Iterator[pd.DataFrame]:
+    """Label pass of the streaming mode: yield each chunk with a cluster_id column."""
+    for chunk in chunk_source():
+        labels = model.predict(scaler.transform(chunk[numeric_cols].to_numpy(dtype=np.float64)))
+        yield chunk.assign(cluster_id=labels.astype(np.int64))
+
+
+class ClusterSummary:
+    """Running per-cluster counts and feature sums, rendered as cluster_summary rows."""
+
+    def __init__(self, n_clusters: int):
+        self.n_clusters = n_clusters
+        self.features: List[str] = []
+        self.counts = np.zeros(n_clusters, dtype=np.int64)
+        self.sums = None
+
+    def update(self, clustered_chunk: pd.DataFrame, labels: Optional[np.ndarray] = None):
+        """Fold in a chunk's rows under labels (default: its cluster_id column)."""
+        if self.sums is None:
+            self.features = [f for f in NUMERIC_FEATURES if f in clustered_chunk.columns]
+            self.sums = np.zeros((self.n_clusters, len(self.features)))
+        if labels is None:
+            labels = clustered_chunk["cluster_id"].to_numpy()
+        self.counts += np.bincount(labels, minlength=self.n_clusters)
+        for j, feat in enumerate(self.features):
+            # bincount with weights is far faster than np.add.at over whole rows
+            self.sums[:, j] += np.bincount(labels, weights=clustered_chunk[feat].to_numpy(dtype=np.float64),
+                                           minlength=self.n_clusters)
 
-    results = []
-    for k in k_range:
+    def to_frame(self) -> pd.DataFrame:
+        rows = []
+        for cid in range(self.n_clusters):
+            row = {"cluster_id": cid, "record_count": int(self.counts[cid])}
+            for j, feat in enumerate(self.features):
+                mean = self.sums[cid, j] / self.counts[cid] if self.counts[cid] else float("nan")
+                row[f"{feat}_mean"] = round(float(mean), 4)
+            rows.append(row)
+        return pd.DataFrame(rows)
+
+
+def histogram_edges(lo: float, hi: float, bins: int) -> np.ndarray:
+    """bins equal-width bins over [lo, hi]; a constant column gets a unit-wide range like np.histogram."""
+    if not (np.isfinite(lo) and np.isfinite(hi)):
+        lo, hi = 0.0, 1.0
+    if hi <= lo:
+        lo, hi = lo - 0.5, hi + 0.5
+    return np.linspace(lo, hi, bins + 1)
+
+
+def _bin_index(values: np.ndarray, edges: np.ndarray) -> np.ndarray:
+    """Bin of each value, with np.histogram's closed last bin; out-of-range values are clipped."""
+    return np.clip(np.searchsorted(edges, values, side="right") - 1, 0, len(edges) - 2)
+
+
+class FeatureHistograms:
+    """
+    Per-cluster 1D histograms of each feature and 2D count grids of feature pairs,
+    over fixed edges so chunks (or worker results) simply add up. Counts over all
+    rows are the sum over clusters. Rendered as histogram_data rows.
+    """
+
+    def __init__(self, ranges: Dict[str, Tuple[float, float]], n_clusters: int,
+                 pairs: Iterable[Tuple[str, str]] = (), bins: int = 40, grid: int = 30):
+        self.n_clusters = n_clusters
+        self.pairs = list(pairs)
+        self.edges = {col: histogram_edges(lo, hi, bins) for col, (lo, hi) in ranges.items()}
+        self.grid_edges = {col: histogram_edges(*ranges[col], grid) for pair in self.pairs for col in pair}
+        self.hist = {col: np.zeros((n_clusters, bins), dtype=np.int64) for col in self.edges}
+        self.density = {pair: np.zeros((n_clusters, grid, grid), dtype=np.int64) for pair in self.pairs}
+
+    def update(self, clustered_chunk: pd.DataFrame):
+        labels = clustered_chunk["cluster_id"].to_numpy()
+        k = self.n_clusters
+        for col, edges in self.edges.items():
+            nb = len(edges) - 1
+            idx = _bin_index(clustered_chunk[col].to_numpy(dtype=np.float64), edges)
+            self.hist[col] += np.bincount(labels * nb + idx, minlength=k * nb).reshape(k, nb)
+        cells = {col: _bin_index(clustered_chunk[col].to_numpy(dtype=np.float64), edges)
+                 for col, edges in self.grid_edges.items()}
+        for (a, b), counts in self.density.items():
+            g = counts.shape[1]
+            flat = (labels * g + cells[a]) * g + cells[b]
+            counts += np.bincount(flat, minlength=k * g * g).reshape(k, g, g)
+
+    def merge(self, other: "FeatureHistograms") -> "FeatureHistograms":
+        for col in self.hist:
+            self.hist[col] += other.hist[col]
+        for pair in self.density:
+            self.density[pair] += other.density[pair]
+        return self
+
+    def to_records(self) -> List[Dict]:
+        """
+        One row per (feature or pair, cluster); counts as lists (rows of x bins for
+        grids). 1D rows have an empty feature_y, so (kind, feature_x, feature_y,
+        cluster_id) keys every row.
+        """
+        records = []
+        for col, counts in self.hist.items():
+            edges = self.edges[col]
+            for cid in range(self.n_clusters):
+                records.append({
+                    "kind": "hist", "feature_x": col, "feature_y": "", "cluster_id": cid,
+                    "x_min": float(edges[0]), "x_max": float(edges[-1]), "y_min": None, "y_max": None,
+                    "counts": counts[cid].tolist(),
+                })
+        for (a, b), counts in self.density.items():
+            ex, ey = self.grid_edges[a], self.grid_edges[b]
+            for cid in range(self.n_clusters):
+                records.append({
+                    "kind": "density", "feature_x": a, "feature_y": b, "cluster_id": cid,
+                    "x_min": float(ex[0]), "x_max": float(ex[-1]), "y_min": float(ey[0]), "y_max": float(ey[-1]),
+                    # Plotly heatmap layout: counts[y][x]
+                    "counts": counts[cid].T.tolist(),
+                })
+        return records
+
+
+def histogram_pairs(columns: Iterable[str]) -> List[Tuple[str, str]]:
+    """Feature pairs that get 2D density grids: every pair of NUMERIC_FEATURES present."""
+    present = [f for f in NUMERIC_FEATURES if f in set(columns)]
+    return [(a, b) for i, a in enumerate(present) for b in present[i + 1:]]
+
+
+def compute_histograms(clustered_df: pd.DataFrame, n_clusters: int, bins: int = 40, grid: int = 30) -> FeatureHistograms:
+    """Histograms and density grids of a clustered frame, binned over each column's own range."""
+    cols = [c for c in clustered_df.select_dtypes(include=[np.number]).columns if c != "cluster_id"]
+    values = clustered_df[cols]
+    ranges = {c: (float(lo), float(hi)) for c, lo, hi in zip(cols, values.min(), values.max())}
+    hist = FeatureHistograms(ranges, n_clusters, histogram_pairs(cols), bins, grid)
+    hist.update(clustered_df)
+    return hist
+
+
+def _thread_limit(limit: Optional[int], user_api: Optional[str] = None):
+    """threadpool_limits(limit, user_api) as a context manager; a no-op without a limit or threadpoolctl."""
+    if limit is None:
+        return contextlib.nullcontext()
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        return contextlib.nullcontext()
+    return threadpool_limits(limits=limit, user_api=user_api)
+
+
+def _thread_budget() -> int:
+    """
+    Threads this process should keep busy: its OpenMP/BLAS pool size, which the
+    scheduler caps per pool worker, else the CPU count.
+    """
+    import sklearn.cluster  # noqa: F401  (loads the OpenMP runtime KMeans uses)
+
+    try:
+        from threadpoolctl import threadpool_info
+        sizes = [p["num_threads"] for p in threadpool_info()]
+    except ImportError:
+        sizes = []
+    return max(sizes, default=os.cpu_count() or 1)
+
+
+def _fit_k(scaled: np.ndarray, k: int, minibatch: bool, sample_idx: Optional[np.ndarray],
+           single_thread: bool = False):
+    """
+    Fit one k of the elbow sweep; returns (k, inertia on the full data, model).
+    single_thread keeps the fit's OpenMP loops on the calling thread (the limit is per thread).
+    """
+    from sklearn.cluster import KMeans, MiniBatchKMeans
+
+    fit_data = scaled if sample_idx is None else scaled[sample_idx]
+    if minibatch:
+        km = MiniBatchKMeans(n_clusters=k, random_state=42, n_init=3, batch_size=4096)
+    else:
         km = KMeans(n_clusters=k, random_state=42, n_init=10)
-        km.fit(scaled)
-        results.append({"k": k, "inertia": round(float(km.inertia_), 2)})
-    return results
+    with _thread_limit(1 if single_thread else None, "openmp"):
+        km.fit(fit_data)
+        inertia = km.inertia_ if sample_idx is None else -km.score(scaled)
+    return k, float(inertia), km
+
 
+def elbow_sweep(
+    scaled: np.ndarray,
+    k_range: range = range(1, 11),
+    keep_k: Optional[int] = None,
+    keep_all: bool = False,
+    n_jobs: Optional[int] = None,
+    minibatch_rows: Optional[int] = None,
+    sample_rows: Optional[int] = None,
+    flat_tol: float = 0.0,
+) -> Tuple[List[Dict], Union[KMeans, Dict[int, KMeans], None]]:
+    """
+    Inertia for each k on an already scaled matrix.
+    - k values are fitted concurrently on n_jobs threads (KMeans releases the GIL):
+      by default as many as the process's thread budget allows (see
+      _thread_budget), -1 for one per k. With several threads each fit runs its
+      BLAS and OpenMP loops single-threaded, so the sweep never oversubscribes
+    - above minibatch_rows rows, MiniBatchKMeans is used instead of KMeans
+    - above sample_rows rows, models are fitted on a fixed random sample and
+      inertia is still measured on the full data
+    - with flat_tol > 0, the sweep stops once inertia improves by less than
+      that fraction from one k to the next
+    Returns (elbow rows, fitted model for keep_k or None). With keep_all the second
+    item is instead {k: model} for every k fitted. With default options these
+    models are identical to run_kmeans' own fit and can be passed to it.
+    """
+    n_rows = len(scaled)
+    minibatch = minibatch_rows is not None and n_rows > minibatch_rows
+    sample_idx = None
+    if sample_rows is not None and n_rows > sample_rows:
+        sample_idx = np.sort(np.random.default_rng(42).choice(n_rows, sample_rows, replace=False))
 
-def compute_tsne(scaled_data: np.ndarray, labels: np.ndarray, perplexity: int = 30) -> List[Dict]:
-    """Run t-SNE and return 2D coordinates with cluster labels."""
-    tsne = TSNE(n_components=2, perplexity=perplexity, random_state=42)
-    coords = tsne.fit_transform(scaled_data)
-    results = []
-    for i in range(len(coords)):
-        results.append({
-            "x": round(float(coords[i, 0]), 4),
-            "y": round(float(coords[i, 1]), 4),
-            "cluster_id": int(labels[i]),
-        })
+    ks = list(k_range)
+    if n_jobs is None:
+        n_workers = max(1, min(len(ks), _thread_budget()))
+    else:
+        n_workers = len(ks) if n_jobs < 0 else max(1, n_jobs)
+    threaded = n_workers > 1
+    # Without early stopping every k is needed, so fit them all at once
+    wave = n_workers if flat_tol > 0 else len(ks)
+
+    inertias: Dict[int, float] = {}
+    models: Dict[int, KMeans] = {}
+    # The BLAS limit is process-wide, so it is set once here; OpenMP's is set per fit thread
+    with _thread_limit(1 if threaded else None, "blas"), Parallel(n_jobs=n_workers, prefer="threads") as parallel:
+        for i in range(0, len(ks), wave):
+            batch = ks[i : i + wave]
+            fits = parallel(delayed(_fit_k)(scaled, k, minibatch, sample_idx, threaded) for k in batch)
+            for k, inertia, km in fits:
+                inertias[k] = inertia
+                if keep_all or k == keep_k:
+                    models[k] = km
+            if flat_tol > 0 and _is_flat(inertias, flat_tol):
+                break
+    if keep_k is not None and keep_k not in models:
+        models[keep_k] = _fit_k(scaled, keep_k, minibatch, sample_idx)[2]
+
+    results = [{"k": k, "inertia": round(inertias[k], 2)} for k in sorted(inertias)]
+    return results, (models if keep_all else models.get(keep_k))
+
+
+def _is_flat(inertias: Dict[int, float], tol: float) -> bool:
+    ks = sorted(inertias)
+    for prev, cur in zip(ks, ks[1:]):
+        if inertias[prev] > 0 and (inertias[prev] - inertias[cur]) / inertias[prev] < tol:
+            return True
+    return False
+
+
+def compute_elbow(data, k_range: range = range(1, 11), **sweep_options) -> List[Dict]:
+    """Compute inertia for a range of k values. data is a dataframe or a pre-scaled matrix."""
+    scaled = data if isinstance(data, np.ndarray) else scale_features(data)[0]
+    results, _ = elbow_sweep(scaled, k_range, **sweep_options)
     return results
 
 
+def label_by_k(scaled: np.ndarray, models: Dict[int, KMeans]) -> np.ndarray:
+    """(rows, models) uint8 matrix of each model's cluster labels, in ascending k."""
+    out = np.empty((len(scaled), len(models)), dtype=np.uint8)
+    for j, k in enumerate(sorted(models)):
+        out[:, j] = models[k].predict(scaled)
+    return out
+
+
+def pack_labels(labels: np.ndarray) -> np.ndarray:
+    """
+    One string per row of a (rows, clusterings) label matrix: character j is the
+    row's cluster under clustering j, as a base-36 digit. Ten clusterings cost
+    ten bytes per row instead of ten integer columns.
+    """
+    labels = np.asarray(labels)
+    if labels.size and labels.max() >= len(LABEL_DIGITS):
+        raise ValueError(f"Packed labels hold at most {len(LABEL_DIGITS)} clusters per clustering")
+    width = labels.shape[1]
+    if width == 0:
+        return np.full(len(labels), "", dtype="U1")
+    codes = np.ascontiguousarray(_DIGIT_CODES[labels])
+    return codes.view(f"S{width}").ravel().astype(f"U{width}")
+
+
+def unpack_labels(packed, position: int) -> np.ndarray:
+    """Cluster ids of clustering `position` from packed label strings (see pack_labels)."""
+    codes = np.asarray(packed, dtype="S")
+    if codes.size == 0:
+        return np.empty(0, dtype=np.int64)
+    return _DIGIT_VALUES[codes.view(np.uint8).reshape(len(codes), -1)[:, position]]
+
+
+def label_pattern(position: int, clusters: Iterable[int]) -> str:
+    """Regular expression matching packed label strings whose clustering `position` is one of clusters."""
+    return f"^.{{{position}}}[{''.join(LABEL_DIGITS[c] for c in clusters)}]"
+
+
+def stratified_sample(labels: np.ndarray, n: int, seed: int = 42) -> np.ndarray:
+    """
+    Sorted indices of about n rows, with each cluster keeping its share of rows
+    (at least one row per cluster).
+    """
+    labels = np.asarray(labels)
+    if n >= len(labels):
+        return np.arange(len(labels))
+    rng = np.random.default_rng(seed)
+    clusters, sizes = np.unique(labels, return_counts=True)
+    quotas = np.maximum(1, np.floor(sizes * n / len(labels)).astype(int))
+    picked = []
+    for cid, quota in zip(clusters, quotas):
+        members = np.flatnonzero(labels == cid)
+        picked.append(rng.choice(members, min(quota, len(members)), replace=False))
+    return np.sort(np.concatenate(picked))
+
+
+def compute_tsne(
+    scaled_data: np.ndarray,
+    labels: np.ndarray,
+    perplexity: int = 30,
+    fit_points: Optional[int] = None,
+    max_rows: Optional[int] = None,
+    angle: float = 0.5,
+    n_iter: int = 1000,
+    n_neighbors: int = 5,
+    packed_labels: Optional[np.ndarray] = None,
+) -> List[Dict]:
+    """
+    Run t-SNE and return 2D coordinates with cluster labels (plus each row's
+    packed_labels string as cluster_ids, if given).
+    - at most max_rows points are returned (stratified per cluster)
+    - Barnes-Hut t-SNE (PCA init, tunable angle / iterations) is fitted on at most
+      fit_points of them; the rest are placed at the distance-weighted mean of
+      their n_neighbors nearest fitted points from the same cluster
+    With both limits unset (or above the row count) this is plain t-SNE on all rows.
+    """
+    from sklearn.manifold import TSNE
+
+    labels = np.asarray(labels)
+    if max_rows is not None and max_rows < len(labels):
+        keep = stratified_sample(labels, max_rows)
+        scaled_data, labels = scaled_data[keep], labels[keep]
+        if packed_labels is not None:
+            packed_labels = np.asarray(packed_labels)[keep]
+
+    fit_idx = stratified_sample(labels, fit_points) if fit_points else np.arange(len(labels))
+    iter_kw = "max_iter" if "max_iter" in inspect.signature(TSNE).parameters else "n_iter"
+    tsne = TSNE(
+        n_components=2,
+        perplexity=min(perplexity, max(1, len(fit_idx) - 1)),
+        init="pca",
+        angle=angle,
+        random_state=42,
+        **{iter_kw: n_iter},
+    )
+    coords = np.empty((len(labels), 2))
+    coords[fit_idx] = tsne.fit_transform(scaled_data[fit_idx])
+
+    if len(fit_idx) < len(labels):
+        _place_by_neighbors(scaled_data, labels, coords, fit_idx, n_neighbors)
+
+    xs = [round(v, 4) for v in coords[:, 0].tolist()]
+    ys = [round(v, 4) for v in coords[:, 1].tolist()]
+    points = [{"x": x, "y": y, "cluster_id": c} for x, y, c in zip(xs, ys, labels.astype(np.int64).tolist())]
+    if packed_labels is not None:
+        for point, packed in zip(points, np.asarray(packed_labels).tolist()):
+            point["cluster_ids"] = packed
+    return points
+
+
+def _place_by_neighbors(data: np.ndarray, labels: np.ndarray, coords: np.ndarray,
+                        fit_idx: np.ndarray, n_neighbors: int):
+    """Fill coords for rows outside fit_idx by inverse-distance kNN interpolation, per cluster."""
+    from sklearn.neighbors import NearestNeighbors
+
+    is_fit = np.zeros(len(labels), dtype=bool)
+    is_fit[fit_idx] = True
+    for cid in np.unique(labels):
+        in_cluster = labels == cid
+        anchors = np.flatnonzero(in_cluster & is_fit)
+        targets = np.flatnonzero(in_cluster & ~is_fit)
+        if len(targets) == 0:
+            continue
+        if len(anchors) == 0:
+            anchors = fit_idx
+        nn = NearestNeighbors(n_neighbors=min(n_neighbors, len(anchors))).fit(data[anchors])
+        dist, ind = nn.kneighbors(data[targets])
+        weights = 1.0 / (dist + 1e-9)
+        neighbor_coords = coords[anchors][ind]
+        coords[targets] = (weights[..., None] * neighbor_coords).sum(axis=1) / weights.sum(axis=1, keepdims=True)
+
+
 def compute_correlation(df: pd.DataFrame) -> Dict:
     """Compute correlation matrix for numeric columns."""
     numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
@@ -0,0 +1,285 @@
+"""
+predict.py -- Assign workload records to the published run's clusters.
+Loads the run's clustering state (preprocessing schema, scaler, centroids; see
+cluster_state.py) once, compiles it into one affine map plus a nearest-centroid
+lookup, and answers single records or batches without pandas or scikit-learn
+on the request path. Records use the CSV's column names; missing values get the
+run's fill values, exactly like the pipeline's preprocessing.
+
+Usage:
+    python predict.py new_allocation_logs.csv                 # print assignments
+    python predict.py records.json --out assignments.csv
+    python predict.py serve --port 8765                       # HTTP service
+    python predict.py serve --model models/<run_id>.joblib    # a saved artifact, offline
+
+HTTP:
+    POST /predict   a JSON record -> {"cluster_id": 1, "distance": 0.93}
+                    a JSON list (or {"records": [...]}) -> {"cluster_id": [...], "distance": [...]}
+    GET  /health    run id, K and feature columns of the loaded model
+    GET  /stats     calls, records and p50/p99 latency of /predict
+"""
+
+import argparse
+import json
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from operator import itemgetter
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from cluster_state import ClusterState
+from config import PREDICT_HOST, PREDICT_PORT
+from metrics import LatencyWindow
+from ml_pipeline import DROPPED_COLUMNS, PreprocessSchema
+
+
+class _Column(NamedTuple):
+    """How one model feature is built from a raw record."""
+    source: str  # CSV column it is read from
+    kind: str  # "numeric", "flag" (bool passthrough) or "onehot"
+    fill: object = None
+    integer: bool = False
+    category: Optional[str] = None
+
+
+def _compile_columns(schema: PreprocessSchema) -> List[_Column]:
+    """preprocess_chunk's output columns, in its order, as per-column recipes."""
+    columns = []
+    for col in schema.input_columns:
+        if col in DROPPED_COLUMNS or col in schema.categories:
+            continue
+        if col in schema.numeric_fill:
+            columns.append(_Column(col, "numeric", schema.numeric_fill[col],
+                                   integer=schema.numeric_dtypes[col].startswith("int")))
+        else:
+            columns.append(_Column(col, "flag"))
+    for col, cats in schema.categories.items():
+        columns += [_Column(col, "onehot", schema.categorical_fill[col], category=cat) for cat in cats[1:]]
+    return columns
+
+
+class Predictor:
+    """
+    Nearest-centroid assignment compiled from a ClusterState. A batch becomes one
+    float64 matrix, is standardized in place and scored against every centroid
+    with a single matrix product: argmin_c ||z - c||^2 = argmin_c (||c||^2 - 2 z.c).
+    """
+
+    def __init__(self, state: ClusterState):
+        self.run_id = state.run_id
+        self.features = list(state.numeric_cols)
+        self.columns = _compile_columns(state.schema)
+        if len(self.columns) != len(self.features):
+            raise ValueError(f"Schema yields {len(self.columns)} features but the model has {len(self.features)}")
+        self.n_clusters = state.n_clusters
+        self._sources = list(dict.fromkeys(col.source for col in self.columns))
+        self._getter = itemgetter(*self._sources)
+        self._mean = np.asarray(state.scaler.mean_, dtype=np.float64)
+        self._scale = np.asarray(state.scaler.scale_, dtype=np.float64)
+        centers = np.asarray(state.model.cluster_centers_, dtype=np.float64)
+        self._weights = np.ascontiguousarray(-2.0 * centers.T)
+        self._bias = (centers * centers).sum(axis=1)
+
+    def matrix(self, records) -> np.ndarray:
+        """Feature matrix of a list of dict records or a raw DataFrame, preprocessed like the run."""
+        n = len(records)
+        x = np.empty((n, len(self.columns)), dtype=np.float64)
+        if isinstance(records, (list, tuple)):
+            table = self._record_table(records)
+            sources = {name: table[:, i] for i, name in enumerate(self._sources)}
+        else:
+            sources = {name: records[name].to_numpy() if name in records else np.full(n, None)
+                       for name in self._sources}
+        for j, col in enumerate(self.columns):
+            values = sources[col.source]
+            if col.kind == "onehot":
+                x[:, j] = values == col.category
+                if col.fill == col.category:
+                    # None, or NaN (the only value not equal to itself), takes the fill category
+                    x[:, j] += (values == None) | (values != values)  # noqa: E711
+                continue
+            try:
+                column = values.astype(np.float64)
+            except (TypeError, ValueError):
+                raise ValueError(f"Column {col.source!r} has non-numeric values") from None
+            if col.kind == "numeric":
+                column[np.isnan(column)] = col.fill
+                if col.integer:
+                    np.trunc(column, out=column)
+            x[:, j] = column
+        return x
+
+    def _record_table(self, records: Sequence[dict]) -> np.ndarray:
+        """(records, source columns) object array; missing keys become None."""
+        names = self._sources
+        table = np.empty((len(records), len(names)), dtype=object)
+        if not records:
+            return table
+        if len(names) == 1:
+            table[:, 0] = [r.get(names[0]) for r in records]
+            return table
+        try:
+            table[:] = list(map(self._getter, records))
+        except KeyError:
+            table[:] = [tuple(r.get(name) for name in names) for r in records]
+        return table
+
+    def assign(self, x: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(cluster ids, Euclidean distance to the centroid in scaled space) of a feature matrix."""
+        x -= self._mean
+        x /= self._scale
+        scores = x @ self._weights
+        scores += self._bias
+        labels = scores.argmin(axis=1)
+        nearest = scores[np.arange(len(labels)), labels]
+        distances = np.sqrt(np.maximum(np.einsum("ij,ij->i", x, x) + nearest, 0.0))
+        return labels, distances
+
+    def predict(self, records) -> Tuple[np.ndarray, np.ndarray]:
+        return self.assign(self.matrix(records))
+
+    def predict_one(self, record: dict) -> Tuple[int, float]:
+        labels, distances = self.predict([record])
+        return int(labels[0]), float(distances[0])
+
+    @classmethod
+    def load(cls, run_id: Optional[str] = None, model_path: Optional[str] = None) -> "Predictor":
+        """The predictor of a saved artifact, of run_id, or of the published run."""
+        if model_path:
+            return cls(ClusterState.load(model_path))
+        from process import current_run_id, fetch_state
+
+        run_id = run_id or current_run_id()
+        if run_id is None:
+            raise RuntimeError("Nothing is published yet; run process.py first.")
+        state = fetch_state(run_id)
+        if state is None:
+            raise RuntimeError(f"No clustering state for run {run_id}; rerun process.py to save one.")
+        return cls(state)
+
+
+# -- HTTP service --------------------------------------------------------------
+
+class _Handler(BaseHTTPRequestHandler):
+    predictor: Predictor
+    latency: LatencyWindow
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out as separate writes; without this, Nagle's algorithm
+    # holds the body back until the client's delayed ACK (~40 ms per request)
+    disable_nagle_algorithm = True
+
+    def _send(self, code: int, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            p = self.predictor
+            self._send(200, {"run_id": p.run_id, "n_clusters": p.n_clusters, "features": p.features})
+        elif self.path == "/stats":
+            self._send(200, self.latency.summary())
+        else:
+            self._send(404, {"message": "not found"})
+
+    def do_POST(self):
+        if self.path != "/predict":
+            return self._send(404, {"message": "not found"})
+        start = time.perf_counter()
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            if isinstance(body, dict) and "records" not in body:
+                cid, distance = self.predictor.predict_one(body)
+                payload, n = {"cluster_id": cid, "distance": round(distance, 6)}, 1
+            else:
+                records = body["records"] if isinstance(body, dict) else body
+                labels, distances = self.predictor.predict(records)
+                payload, n = {"cluster_id": labels.tolist(), "distance": np.round(distances, 6).tolist()}, len(labels)
+        except (ValueError, TypeError, KeyError, AttributeError) as e:
+            return self._send(400, {"message": str(e)})
+        self.latency.record(time.perf_counter() - start, n)
+        self._send(200, payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(predictor: Predictor, host: str = PREDICT_HOST, port: int = PREDICT_PORT) -> ThreadingHTTPServer:
+    """An HTTP server answering /predict with predictor (call serve_forever() on it)."""
+    handler = type("PredictHandler", (_Handler,), {"predictor": predictor, "latency": LatencyWindow()})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+# -- CLI -----------------------------------------------------------------------
+
+def read_records(path: str):
+    """A raw DataFrame from a CSV file, or a list of records from a JSON / NDJSON file ('-' is stdin)."""
+    if path.endswith(".csv"):
+        import pandas as pd
+
+        return pd.read_csv(path)
+    text = sys.stdin.read() if path == "-" else open(path).read()
+    text = text.strip()
+    if text.startswith("[") or text.startswith("{"):
+        try:
+            data = json.loads(text)
+            return [data] if isinstance(data, dict) else data
+        except json.JSONDecodeError:
+            pass
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def write_assignments(path: Optional[str], labels: Sequence[int], distances: Sequence[float]):
+    out = open(path, "w") if path else sys.stdout
+    try:
+        out.write("row,cluster_id,distance\n")
+        for i, (cid, distance) in enumerate(zip(labels, distances)):
+            out.write(f"{i},{cid},{distance:.6f}\n")
+    finally:
+        if path:
+            out.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="'serve', or a CSV / JSON / NDJSON file of records ('-' for stdin)")
+    parser.add_argument("--run", help="run id to load (default: the published run)")
+    parser.add_argument("--model", help="path of a saved clustering state instead of a run")
+    parser.add_argument("--out", help="write assignments as CSV here instead of stdout")
+    parser.add_argument("--host", default=PREDICT_HOST)
+    parser.add_argument("--port", type=int, default=PREDICT_PORT)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    predictor = Predictor.load(args.run, args.model)
+    print(f"Loaded run {predictor.run_id} (K={predictor.n_clusters}, {len(predictor.features)} features) "
+          f"in {(time.perf_counter() - start) * 1000:.0f} ms", file=sys.stderr)
+
+    if args.input == "serve":
+        server = serve(predictor, args.host, args.port)
+        print(f"Serving on http://{args.host}:{server.server_address[1]}/predict", file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            print(f"\n{json.dumps(server.RequestHandlerClass.latency.summary())}", file=sys.stderr)
+        return
+
+    records = read_records(args.input)
+    start = time.perf_counter()
+    labels, distances = predictor.predict(records)
+    seconds = time.perf_counter() - start
+    write_assignments(args.out, labels, distances)
+    print(f"{len(labels)} records assigned in {seconds * 1000:.1f} ms "
+          f"({len(labels) / max(seconds, 1e-9):,.0f} records/s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,58 +5,860 @@ Run this once with your CSV, and the static frontend will display everything.
 Usage:
     python process.py cloud_resource_allocation_dataset.csv
     python process.py cloud_resource_allocation_dataset.csv --clusters 3
+    python process.py cloud_resource_allocation_dataset.csv --workers 8
+    python process.py cloud_resource_allocation_dataset.csv --streaming --chunk-rows 100000
+    python process.py allocation_logs.csv --streaming --memory-mb 512
+    python process.py cloud_resource_allocation_dataset.csv --no-cache
+    python process.py cloud_resource_allocation_dataset.csv --no-snapshot
+    python process.py large_export.csv --compact
+    python process.py new_allocation_logs.csv --incremental --update-centroids
 """
 
+import os
 import sys
 import time
 import json
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from importlib import metadata
+from itertools import chain
+from typing import Optional
 import numpy as np
 import pandas as pd
 
 from ml_pipeline import (
-    load_and_preprocess,
-    compute_outliers,
+    scan_csv,
+    preprocess_chunk,
+    iter_preprocessed_chunks,
+    read_preprocessed,
+    chunk_rows_for_memory,
+    summarize_frame,
+    StreamingStats,
+    count_outliers,
+    scale_features,
     run_kmeans,
-    compute_elbow,
+    elbow_sweep,
+    label_by_k,
+    pack_labels,
+    fit_streaming_kmeans,
+    iter_frame_chunks,
+    iter_assigned_chunks,
+    ClusterSummary,
+    FeatureHistograms,
+    histogram_pairs,
+    compute_histograms,
     compute_tsne,
     compute_correlation,
-    NUMERIC_FEATURES,
 )
+from config import (
+    PIPELINE_WORKERS,
+    ELBOW_JOBS,
+    ELBOW_MINIBATCH_ROWS,
+    ELBOW_SAMPLE_ROWS,
+    ELBOW_FLAT_TOL,
+    STREAM_CHUNK_ROWS,
+    STREAM_SAMPLE_ROWS,
+    COMPACT_DTYPES,
+    QUANTILE_SKETCH_K,
+    HIST_BINS,
+    DENSITY_GRID,
+    INGEST_MEMORY_MB,
+    TSNE_FIT_POINTS,
+    TSNE_MAX_ROWS,
+    TSNE_ANGLE,
+    TSNE_ITER,
+    PIPELINE_CACHE_DIR,
+    PIPELINE_CACHE_MB,
+    SNAPSHOT_ENABLED,
+    SNAPSHOT_BUCKET,
+    RUN_REPORT_DIR,
+    UPLOAD_CSV_MIN_ROWS,
+    PROMETHEUS_TEXTFILE,
+    MODEL_DIR,
+    MODEL_BUCKET,
+)
+from metrics import REQUESTS, lifetime_peak_rss_mb, write_report
+from scheduler import Stage, run_stages, format_report, critical_path
+from stage_cache import StageCache, code_fingerprint, file_digest
 from supabase_client import get_service_client
 
 
-def batch_insert(table: str, records: list, chunk_size: int = 1000):
-    client = get_service_client()
-    for i in range(0, len(records), chunk_size):
-        client.table(table).insert(records[i : i + chunk_size]).execute()
+# Every table written by a run. Rows carry the run_id they were produced by, and
+# readers only see the run that "pipeline_version" points at.
+RESULT_TABLES = [
+    "raw_data", "data_stats", "outlier_counts", "correlation_data",
+    "elbow_data", "clustered_data", "cluster_summary", "cluster_summary_by_k", "tsne_data", "histogram_data",
+]
+VERSION_TABLE = "pipeline_version"
+
+
+def new_run_id() -> str:
+    """Sortable, unique id for one pipeline run."""
+    return time.strftime("%Y%m%dT%H%M%S") + "-" + uuid.uuid4().hex[:8]
+
+
+def batch_insert(table: str, records, run_id: str | None = None) -> int:
+    """Upload rows with concurrent, retried, byte-sized chunks."""
+    if run_id is not None:
+        records = ({**r, "run_id": run_id} for r in records)
+    return get_service_client().bulk_insert(table, records)
+
+
+def current_run_id() -> str | None:
+    """The run the dashboard is currently reading, or None if nothing is published."""
+    rows = get_service_client().table(VERSION_TABLE).select("run_id").eq("id", 1).execute().data
+    return rows[0]["run_id"] if rows else None
 
 
-def clear_table(table: str):
+def publish_run(run_id: str, has_snapshot: bool = True):
+    """
+    Atomically point readers at run_id (single-row upsert). has_snapshot tells
+    readers whether the run's snapshot matches its tables.
+    """
+    get_service_client().table(VERSION_TABLE).upsert(
+        {"id": 1, "run_id": run_id, "published_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+         "snapshot": has_snapshot},
+        on_conflict="id",
+    ).execute(retries=3)
+
+
+def delete_run(run_id: str):
+    """Drop every row written by run_id (indexed delete, never on the read path)."""
     client = get_service_client()
-    client.table(table).delete().gte("id", 0).execute()
+    for table in RESULT_TABLES:
+        client.table(table).delete().eq("run_id", run_id).execute(retries=3)
+    delete_staged(run_id)
 
 
 INT_COLUMNS = {"task_priority", "workload_type_low", "workload_type_medium", "cluster_id"}
 
 
-def to_record(row, columns):
-    record = {}
-    for col in columns:
-        val = row[col]
-        if pd.isna(val):
-            record[col] = None
-        elif col in INT_COLUMNS or isinstance(val, (np.integer,)):
-            record[col] = int(val)
-        elif isinstance(val, (np.floating,)):
-            record[col] = float(val)
+def _column_values(col: str, series: pd.Series) -> list:
+    """Convert one column to JSON-ready Python values using its dtype, NaN -> None."""
+    values = series.to_numpy()
+    missing = pd.isna(values)
+    has_missing = bool(missing.any())
+
+    if col in INT_COLUMNS or values.dtype.kind in "iu":
+        if has_missing:
+            values = np.where(missing, 0, values)
+        out = values.astype(np.int64).tolist()
+    elif values.dtype.kind == "f":
+        out = values.astype(np.float64).tolist()
+    else:
+        # The Series, not the array: datetime64[ns] arrays list as integer nanoseconds
+        out = series.tolist()
+
+    if has_missing:
+        for i in np.flatnonzero(missing):
+            out[i] = None
+    return out
+
+
+def frame_columns(df: pd.DataFrame, run_id: str | None = None) -> list:
+    """Uploaded column names of a frame: its own, then run_id when tagged."""
+    return list(df.columns) + (["run_id"] if run_id is not None else [])
+
+
+def iter_column_batches(df: pd.DataFrame, chunk_size: int = 1000, run_id: str | None = None):
+    """Yield each chunk as JSON-ready value lists, one per column of frame_columns()."""
+    for start in range(0, len(df), chunk_size):
+        part = df.iloc[start : start + chunk_size]
+        col_values = [_column_values(col, part[col]) for col in df.columns]
+        if run_id is not None:
+            col_values.append([run_id] * len(part))
+        yield col_values
+
+
+def iter_record_batches(df: pd.DataFrame, chunk_size: int = 1000, run_id: str | None = None):
+    """Yield lists of JSON-ready row dicts, converting each chunk column by column."""
+    columns = frame_columns(df, run_id)
+    for col_values in iter_column_batches(df, chunk_size, run_id):
+        yield [dict(zip(columns, row)) for row in zip(*col_values)]
+
+
+def frame_to_records(df: pd.DataFrame) -> list:
+    """Serialize a whole frame to a list of JSON-ready row dicts."""
+    records = []
+    for batch in iter_record_batches(df, chunk_size=max(len(df), 1)):
+        records.extend(batch)
+    return records
+
+
+def insert_frame(table: str, df: pd.DataFrame, run_id: str | None = None, chunk_size: int = 1000) -> int:
+    """
+    Serialize and upload a frame chunk by chunk. Returns the number of rows sent.
+    Frames of UPLOAD_CSV_MIN_ROWS rows or more are bulk loaded as column-ordered
+    CSV (no per-row dicts or repeated keys), smaller ones as JSON.
+    """
+    client = get_service_client()
+    if UPLOAD_CSV_MIN_ROWS and len(df) >= UPLOAD_CSV_MIN_ROWS:
+        return client.bulk_insert_columns(table, frame_columns(df, run_id), iter_column_batches(df, chunk_size, run_id))
+    batches = iter_record_batches(df, chunk_size, run_id=run_id)
+    return client.bulk_insert(table, chain.from_iterable(batches))
+
+
+def load_csv(csv_path: str, chunk_rows: int, compact: bool = False):
+    """(preprocessed frame, schema); the schema is kept for incremental appends."""
+    return read_preprocessed(csv_path, chunk_rows, compact=compact)
+
+
+def scan_stage(csv_path: str, chunk_rows: int, compact: bool = False):
+    """Ingest pass one: schema for every later chunk, plus a preprocessed sample."""
+    schema, raw_sample = scan_csv(csv_path, chunk_rows, sample_rows=STREAM_SAMPLE_ROWS, compact=compact)
+    return schema, preprocess_chunk(raw_sample, schema)
+
+
+def streaming_summary_stage(scan_out, csv_path: str, chunk_rows: int):
+    """
+    Stats and outliers over every row in two chunked passes: running moments plus
+    quantile sketches, then outlier counts against the sketched IQR fences.
+    The correlation matrix comes from the sample.
+    """
+    schema, sample = scan_out
+    chunks = partial(iter_preprocessed_chunks, csv_path, schema, chunk_rows)
+    stats = StreamingStats(sample.select_dtypes(include=[np.number]).columns.tolist(), QUANTILE_SKETCH_K)
+    for chunk in chunks():
+        stats.update(chunk)
+    outliers = count_outliers(chunks(), stats.bounds())
+    return stats.stats_records(), outliers, compute_correlation(sample), stats
+
+
+def summary_stage(preprocess_out):
+    return summarize_frame(preprocess_out[0])
+
+
+def scale_stage(preprocess_out):
+    """(scaled matrix, fitted scaler)."""
+    return scale_features(preprocess_out[0])
+
+
+def elbow_stage(scale_out):
+    """
+    Elbow sweep over K=1..10 that keeps every fitted model. It does not depend on
+    the chosen K, so a cached sweep serves any --clusters value.
+    """
+    return elbow_sweep(
+        scale_out[0],
+        k_range=range(1, 11),
+        keep_all=True,
+        n_jobs=ELBOW_JOBS,
+        minibatch_rows=ELBOW_MINIBATCH_ROWS,
+        sample_rows=ELBOW_SAMPLE_ROWS,
+        flat_tol=ELBOW_FLAT_TOL,
+    )
+
+
+def alternative_models(elbow_models: dict) -> dict:
+    """The elbow sweep's models worth switching to in the dashboard (K >= 2)."""
+    return {k: m for k, m in elbow_models.items() if k >= 2}
+
+
+def kmeans_stage(preprocess_out, scale_out, elbow_out, n_clusters: int):
+    """
+    Label rows with the model the elbow sweep already fitted for K=n_clusters, or a
+    new fit. Every other K of the sweep labels the rows too: clustered_df gets
+    their labels packed into a cluster_ids string, and each K a ClusterSummary.
+    Returns run_kmeans' (clustered_df, summary_df, scaled) plus the model and
+    {k: ClusterSummary}.
+    """
+    scaled = scale_out[0]
+    model = elbow_out[1].get(n_clusters)
+    if model is None:
+        from sklearn.cluster import KMeans
+
+        model = KMeans(n_clusters=n_clusters, random_state=42, n_init=10).fit(scaled)
+    clustered_df, summary_df, scaled = run_kmeans(preprocess_out[0], n_clusters=n_clusters, scaled_data=scaled,
+                                                  model=model)
+    alternatives = alternative_models(elbow_out[1])
+    summaries = {k: ClusterSummary(k) for k in sorted(alternatives)}
+    if alternatives:
+        labels = label_by_k(scaled, alternatives)
+        clustered_df["cluster_ids"] = pack_labels(labels)
+        for j, summary in enumerate(summaries.values()):
+            summary.update(clustered_df, labels[:, j])
+    return clustered_df, summary_df, scaled, model, summaries
+
+
+def alternatives_frame(summaries: dict) -> pd.DataFrame:
+    """cluster_summary rows of every precomputed K, with a k column (cluster_summary_by_k)."""
+    return pd.concat([s.to_frame().assign(k=k) for k, s in sorted(summaries.items())], ignore_index=True)
+
+
+def tsne_stage(scaled: np.ndarray, labels: np.ndarray, packed_labels: Optional[np.ndarray] = None) -> list:
+    return compute_tsne(
+        scaled, labels, perplexity=30,
+        fit_points=TSNE_FIT_POINTS, max_rows=TSNE_MAX_ROWS,
+        angle=TSNE_ANGLE, n_iter=TSNE_ITER, packed_labels=packed_labels,
+    )
+
+
+def histograms_stage(kmeans_out, n_clusters: int):
+    """Pre-binned distributions so the dashboards never download clustered_data to plot them."""
+    return compute_histograms(kmeans_out[0], n_clusters, bins=HIST_BINS, grid=DENSITY_GRID)
+
+
+def tsne_from_kmeans(kmeans_out) -> list:
+    clustered_df, _, scaled_data, *_ = kmeans_out
+    packed = clustered_df["cluster_ids"].to_numpy() if "cluster_ids" in clustered_df else None
+    return tsne_stage(scaled_data, clustered_df["cluster_id"].values, packed)
+
+
+def streaming_fit_stage(scan_out, csv_path: str, n_clusters: int, chunk_rows: int):
+    """Out-of-core scaler + MiniBatchKMeans fit; labels the bounded sample for t-SNE/elbow."""
+    schema, _ = scan_out
+    scaler, model, numeric_cols, sample, n_rows = fit_streaming_kmeans(
+        partial(iter_preprocessed_chunks, csv_path, schema, chunk_rows),
+        n_clusters=n_clusters,
+        sample_rows=STREAM_SAMPLE_ROWS,
+    )
+    return scaler, model, numeric_cols, sample, model.predict(sample), n_rows
+
+
+def streaming_elbow_stage(fit_out) -> list:
+    """Elbow sweep on the streaming sample, inertia rescaled to the full row count."""
+    *_, sample, _, n_rows = fit_out
+    results, _ = elbow_sweep(sample, k_range=range(1, 11), n_jobs=ELBOW_JOBS, flat_tol=ELBOW_FLAT_TOL)
+    factor = n_rows / max(len(sample), 1)
+    return [{"k": r["k"], "inertia": round(r["inertia"] * factor, 2)} for r in results], None
+
+
+def tsne_from_sample(fit_out) -> list:
+    *_, sample, labels, _ = fit_out
+    return tsne_stage(sample, labels)
+
+
+def build_stages(csv_path: str, n_clusters: int, streaming: bool, chunk_rows: int,
+                 csv_digest: str = "", compact: bool = False) -> list:
+    """
+    The pipeline as a dependency graph. Features are scaled once; the elbow sweep
+    fits K=1..10 along the way and KMeans reuses the model for K=n_clusters (and
+    labels the rows with every other K for the dashboard). t-SNE only needs the
+    KMeans labels.
+    In streaming mode the full frame is never built: one scan yields the schema and
+    a sample, stats and outliers come from chunked passes with quantile sketches
+    (correlation uses the sample), KMeans is fitted chunk by chunk, and raw rows and
+    labels are uploaded from a second chunked read.
+    compact makes the preprocessing emit float32/int8 columns, which every later
+    stage inherits (see PreprocessSchema.compact).
+    Stage params name everything besides dependencies that a result depends on
+    (csv_digest stands in for the file), which is what the stage cache keys on.
+    """
+    tsne_params = {"fit_points": TSNE_FIT_POINTS, "max_rows": TSNE_MAX_ROWS,
+                   "angle": TSNE_ANGLE, "n_iter": TSNE_ITER}
+    if streaming:
+        return [
+            Stage("scan", scan_stage, kwargs={"csv_path": csv_path, "chunk_rows": chunk_rows, "compact": compact},
+                  params={"csv": csv_digest, "chunk_rows": chunk_rows, "sample_rows": STREAM_SAMPLE_ROWS,
+                          "compact": compact}),
+            Stage("summary", streaming_summary_stage, deps=("scan",),
+                  kwargs={"csv_path": csv_path, "chunk_rows": chunk_rows},
+                  params={"chunk_rows": chunk_rows, "sketch_k": QUANTILE_SKETCH_K}),
+            Stage("kmeans_stream", streaming_fit_stage, deps=("scan",),
+                  kwargs={"csv_path": csv_path, "n_clusters": n_clusters, "chunk_rows": chunk_rows},
+                  params={"n_clusters": n_clusters, "chunk_rows": chunk_rows}),
+            Stage("elbow", streaming_elbow_stage, deps=("kmeans_stream",),
+                  params={"flat_tol": ELBOW_FLAT_TOL}),
+            Stage("tsne", tsne_from_sample, deps=("kmeans_stream",), params=tsne_params),
+        ]
+    return [
+        Stage("preprocess", load_csv, kwargs={"csv_path": csv_path, "chunk_rows": chunk_rows, "compact": compact},
+              local=True, params={"csv": csv_digest, "chunk_rows": chunk_rows, "compact": compact}),
+        Stage("summary", summary_stage, deps=("preprocess",)),
+        Stage("scale", scale_stage, deps=("preprocess",)),
+        Stage("elbow", elbow_stage, deps=("scale",),
+              params={"minibatch_rows": ELBOW_MINIBATCH_ROWS, "sample_rows": ELBOW_SAMPLE_ROWS,
+                      "flat_tol": ELBOW_FLAT_TOL}),
+        Stage("kmeans", kmeans_stage, deps=("preprocess", "scale", "elbow"), kwargs={"n_clusters": n_clusters}),
+        Stage("tsne", tsne_from_kmeans, deps=("kmeans",), params=tsne_params),
+        Stage("histograms", histograms_stage, deps=("kmeans",),
+              kwargs={"n_clusters": n_clusters}, params={"bins": HIST_BINS, "grid": DENSITY_GRID}),
+    ]
+
+
+def open_stage_cache() -> Optional[StageCache]:
+    """The on-disk stage cache, or None when PIPELINE_CACHE_MB is 0."""
+    if PIPELINE_CACHE_MB <= 0:
+        return None
+    here = os.path.dirname(os.path.abspath(__file__))
+    # Results are only reusable by the same pipeline code and library versions
+    code = code_fingerprint([os.path.join(here, name) for name in ("ml_pipeline.py", "process.py")])
+    # (scikit-learn's version is read from its metadata, so this does not import it)
+    version = f"{code}-{np.__version__}-{pd.__version__}-{metadata.version('scikit-learn')}"
+    return StageCache(PIPELINE_CACHE_DIR, int(PIPELINE_CACHE_MB * 2**20), code_version=version)
+
+
+def upload_clusters_streaming(fit_out, chunk_source, run_id: str, ranges, snapshot=None) -> tuple:
+    """Label pass: assign, upload, summarize and bin one chunk at a time. Returns (ClusterSummary, histograms)."""
+    scaler, model, numeric_cols = fit_out[:3]
+    summary = ClusterSummary(model.n_clusters)
+    ranges = {c: ranges[c] for c in numeric_cols}
+    hist = FeatureHistograms(ranges, model.n_clusters, histogram_pairs(numeric_cols), HIST_BINS, DENSITY_GRID)
+    for chunk in iter_assigned_chunks(chunk_source, scaler, model, numeric_cols):
+        insert_frame("clustered_data", chunk, run_id)
+        if snapshot is not None:
+            snapshot.write_frame("clustered_data", chunk)
+        summary.update(chunk)
+        hist.update(chunk)
+    return summary, hist
+
+
+# Key of a histogram_data row within a run; appends upsert on it
+HISTOGRAM_KEY = "run_id,kind,feature_x,feature_y,cluster_id"
+
+
+def histogram_records(hist) -> list:
+    return [{**r, "counts": json.dumps(r["counts"], separators=(",", ":"))} for r in hist.to_records()]
+
+
+def upload_histograms(hist, run_id: str):
+    batch_insert("histogram_data", histogram_records(hist), run_id)
+
+
+def snapshot_stage(snapshot, name: str, result):
+    """Add one finished stage's result tables to the run snapshot (raw_data is left out)."""
+    if name == "summary":
+        stats, outliers, correlation = result[:3]
+        snapshot.write_records("data_stats", stats)
+        snapshot.write_records("outlier_counts", [{"feature_name": k, "outlier_count": v} for k, v in outliers.items()])
+        snapshot.write_correlation(correlation)
+    elif name == "elbow":
+        snapshot.write_records("elbow_data", result[0])
+    elif name == "kmeans":
+        snapshot.write_frame("clustered_data", result[0])
+        snapshot.write_frame("cluster_summary", result[1])
+        if result[4]:
+            snapshot.write_frame("cluster_summary_by_k", alternatives_frame(result[4]))
+    elif name == "tsne":
+        snapshot.write_records("tsne_data", result)
+    elif name == "histograms":
+        snapshot.write_histograms(result.to_records())
+
+
+def upload_stage(name: str, result, run_id: str, chunk_source=None, ranges=None, snapshot=None):
+    """
+    Push one finished stage to Supabase under run_id (and into the snapshot, if any).
+    The streaming label pass returns its running (ClusterSummary, histograms).
+    """
+    streamed = None
+    if name == "preprocess":
+        df = result[0]
+        print(f"       {len(df)} rows, {len(df.columns)} columns after preprocessing "
+              f"({df.memory_usage(index=False).sum() / 2**20:.1f} MB)")
+        uploaded = insert_frame("raw_data", df, run_id)
+        print(f"       raw_data: {uploaded} rows uploaded")
+    elif name == "scan":
+        schema, _ = result
+        print(f"       {schema.n_rows} rows, {len(schema.output_columns)} columns after preprocessing")
+        uploaded = sum(insert_frame("raw_data", chunk, run_id) for chunk in chunk_source())
+        print(f"       raw_data: {uploaded} rows uploaded")
+    elif name == "summary":
+        stats, outliers, correlation = result[:3]
+        batch_insert("data_stats", stats, run_id)
+        batch_insert("outlier_counts", [{"feature_name": k, "outlier_count": v} for k, v in outliers.items()], run_id)
+        print(f"       {sum(outliers.values())} total outliers across {len(outliers)} features")
+        batch_insert("correlation_data", [{
+            "columns_list": json.dumps(correlation["columns"]),
+            "matrix_data": json.dumps(correlation["matrix"]),
+        }], run_id)
+    elif name == "elbow":
+        batch_insert("elbow_data", result[0], run_id)
+    elif name == "kmeans":
+        clustered_df, summary_df, *_, summaries = result
+        insert_frame("clustered_data", clustered_df, run_id)
+        batch_insert("cluster_summary", summary_df.to_dict(orient="records"), run_id)
+        if summaries:
+            insert_frame("cluster_summary_by_k", alternatives_frame(summaries), run_id)
+            print(f"       K={', '.join(map(str, summaries))} precomputed for the dashboard")
+        counts = clustered_df["cluster_id"].value_counts().sort_index()
+        for cid, cnt in counts.items():
+            print(f"       Cluster {cid}: {cnt} records")
+    elif name == "kmeans_stream":
+        streamed = upload_clusters_streaming(result, chunk_source, run_id, ranges(), snapshot)
+        summary_df, hist = streamed[0].to_frame(), streamed[1]
+        batch_insert("cluster_summary", summary_df.to_dict(orient="records"), run_id)
+        upload_histograms(hist, run_id)
+        if snapshot is not None:
+            snapshot.write_frame("cluster_summary", summary_df)
+            snapshot.write_histograms(hist.to_records())
+        for _, row in summary_df.iterrows():
+            print(f"       Cluster {int(row['cluster_id'])}: {int(row['record_count'])} records")
+    elif name == "tsne":
+        batch_insert("tsne_data", result, run_id)
+    elif name == "histograms":
+        upload_histograms(result, run_id)
+    if snapshot is not None:
+        snapshot_stage(snapshot, name, result)
+    return streamed
+
+
+def publish_snapshot(snapshot) -> bool:
+    """
+    Finish the snapshot and upload it to Storage. The tables stay the source of
+    truth, so a failed upload only costs the dashboard its fast path.
+    Returns whether the snapshot is in Storage.
+    """
+    path = snapshot.close()
+    print(f"       snapshot: {os.path.getsize(path) / 2**20:.1f} MB -> {path}")
+    try:
+        get_service_client().upload_file(SNAPSHOT_BUCKET, os.path.basename(path), path)
+    except Exception as e:
+        print(f"       snapshot upload to bucket '{SNAPSHOT_BUCKET}' failed: {e}")
+        return False
+    return True
+
+
+def delete_snapshot(run_id: str):
+    """Remove a run's snapshot locally and from Storage (best effort)."""
+    from snapshot import snapshot_name, snapshot_path
+
+    if os.path.exists(snapshot_path(run_id)):
+        os.remove(snapshot_path(run_id))
+    try:
+        get_service_client().remove_files(SNAPSHOT_BUCKET, [snapshot_name(run_id)])
+    except Exception:
+        pass
+
+
+def build_cluster_state(run_id: str, results: dict, streamed=None):
+    """
+    The ClusterState of a finished run. Streaming runs already hold every running
+    aggregate; in-memory runs fold the whole frame into them once.
+    streamed is the future of the streaming label pass, if any.
+    """
+    from cluster_state import ClusterState
+
+    if "kmeans_stream" in results:
+        schema = results["scan"][0]
+        scaler, model, numeric_cols, *_, n_rows = results["kmeans_stream"]
+        summary, hist = streamed.result()
+        stats = results["summary"][3]
+        alternatives = summaries = None
+    else:
+        df, schema = results["preprocess"]
+        scaler = results["scale"][1]
+        clustered_df, _, _, model, summaries = results["kmeans"]
+        numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
+        summary = ClusterSummary(model.n_clusters)
+        summary.update(clustered_df)
+        stats = StreamingStats(numeric_cols, QUANTILE_SKETCH_K)
+        stats.update(df)
+        hist, n_rows = results["histograms"], len(df)
+        # The chosen K shares the state's model, so --update-centroids moves both
+        alternatives = {k: model if k == model.n_clusters else m
+                        for k, m in alternative_models(results["elbow"][1]).items()} or None
+        summaries = summaries or None
+    return ClusterState(run_id, schema, numeric_cols, scaler, model, summary, stats, hist, n_rows,
+                        alternatives=alternatives, alternative_summaries=summaries)
+
+
+def publish_state(state):
+    """Save the clustering state locally and upload it to the private model bucket (best effort)."""
+    path = state.save()
+    try:
+        get_service_client().upload_file(MODEL_BUCKET, os.path.basename(path), path)
+    except Exception as e:
+        print(f"       state upload to bucket '{MODEL_BUCKET}' failed: {e}")
+
+
+def fetch_state(run_id: str):
+    """The run's ClusterState from MODEL_DIR, downloaded from the model bucket if needed; None if missing."""
+    from cluster_state import ClusterState, state_name, state_path
+
+    path = state_path(run_id)
+    if not os.path.exists(path):
+        try:
+            os.makedirs(MODEL_DIR, exist_ok=True)
+            get_service_client().download_file(MODEL_BUCKET, state_name(run_id), path, public=False)
+        except Exception:
+            return None
+    return ClusterState.load(path)
+
+
+def delete_state(run_id: str):
+    """Remove a run's clustering state locally and from Storage (best effort)."""
+    from cluster_state import state_name, state_path
+
+    if os.path.exists(state_path(run_id)):
+        os.remove(state_path(run_id))
+    try:
+        get_service_client().remove_files(MODEL_BUCKET, [state_name(run_id)])
+    except Exception:
+        pass
+
+
+def stage_rows(name: str, results: dict) -> int:
+    """Rows a finished stage worked through: the whole input unless it used a sample."""
+    if name == "tsne":
+        return len(results["tsne"])
+    if "kmeans_stream" in results:
+        fit_out = results["kmeans_stream"]
+        return len(fit_out[3]) if name == "elbow" else fit_out[5]
+    if "scan" in results:
+        return results["scan"][0].n_rows
+    return len(results["preprocess"][0])
+
+
+def stage_records(stages: list, results: dict, timings: dict, upload_seconds: dict) -> list:
+    """Per-stage rows of the run report."""
+    t0 = min(t.start for t in timings.values())
+    records = []
+    for s in stages:
+        t = timings[s.name]
+        rows = stage_rows(s.name, results)
+        records.append({
+            "name": s.name,
+            "start": round(t.start - t0, 3),
+            "seconds": round(t.duration, 3),
+            "cpu_seconds": round(t.cpu_seconds, 3),
+            "rows": rows,
+            "rows_per_second": round(rows / t.duration, 1) if t.duration > 0 and not t.cached else None,
+            "peak_rss_mb": None if t.peak_rss_mb is None else round(t.peak_rss_mb, 1),
+            "upload_seconds": round(upload_seconds.get(s.name, 0.0), 3),
+            "cached": t.cached,
+        })
+    return records
+
+
+def publish_results(csv_path: str, n_clusters: int, run_id: str, workers: int = PIPELINE_WORKERS,
+                    streaming: bool = False, chunk_rows: int = 0, use_cache: bool = True,
+                    write_snapshot: bool = SNAPSHOT_ENABLED, report: Optional[dict] = None,
+                    compact: bool = COMPACT_DTYPES):
+    """
+    Compute every stage and upload it tagged with run_id. Nothing is visible until published.
+    Stages run in a process pool; each result is uploaded on a background thread as
+    soon as it is ready, so uploads overlap with the stages still computing.
+    Unchanged stages are read back from the stage cache (uploads always happen).
+    With write_snapshot, the result tables are also written to one columnar file
+    (see snapshot.py) and uploaded once every table is in.
+    compact selects float32/int8 dtypes for the in-memory data (see build_stages).
+    The run's clustering state is saved for later --incremental appends.
+    Per-stage timings, rows and peak memory are added to report, if given.
+    Returns whether the run has a snapshot in Storage.
+    """
+    chunk_rows = chunk_rows or chunk_rows_for_memory(csv_path, INGEST_MEMORY_MB)
+    cache = open_stage_cache() if use_cache else None
+    csv_digest = file_digest(csv_path) if cache is not None else ""
+    stages = build_stages(csv_path, n_clusters, streaming, chunk_rows, csv_digest, compact)
+    mode = "streaming" if streaming else "in-memory"
+    print(f"Running {len(stages)} stages on {workers} worker(s), K={n_clusters}, "
+          f"{mode} mode{', compact dtypes' if compact else ''}, {chunk_rows} rows per chunk ...")
+
+    frames = {}
+
+    def chunk_source():
+        if "scan" in frames:
+            return iter_preprocessed_chunks(csv_path, frames["scan"][0], chunk_rows)
+        return iter_frame_chunks(frames["preprocess"][0], chunk_rows)
+
+    def ranges():
+        return frames["scan"][0].value_ranges()
+
+    snapshot = None
+    if write_snapshot:
+        from snapshot import SnapshotWriter, snapshot_path
+        snapshot = SnapshotWriter(snapshot_path(run_id), run_id)
+
+    uploads = {}
+    upload_seconds = {}
+
+    def timed_upload(name, result):
+        start = time.time()
+        streamed = upload_stage(name, result, run_id, chunk_source, ranges, snapshot)
+        upload_seconds[name] = time.time() - start
+        return streamed
+
+    try:
+        with ThreadPoolExecutor(max_workers=2) as uploader:
+            def on_result(name, result):
+                print(f"  done {name}")
+                if name in ("preprocess", "scan"):
+                    frames[name] = result
+                uploads[name] = uploader.submit(timed_upload, name, result)
+
+            results, timings = run_stages(stages, workers, on_result, cache)
+            for f in uploads.values():
+                f.result()
+        publish_state(build_cluster_state(run_id, results, uploads.get("kmeans_stream")))
+    except BaseException:
+        if snapshot is not None:
+            snapshot.discard()
+        raise
+
+    has_snapshot = snapshot is not None and publish_snapshot(snapshot)
+    print(format_report(stages, timings))
+    if report is not None:
+        path, total = critical_path(stages, timings)
+        report.update({
+            "rows": stage_rows(stages[0].name, results),
+            "chunk_rows": chunk_rows,
+            "stages": stage_records(stages, results, timings, upload_seconds),
+            "critical_path": {"stages": path, "seconds": round(total, 3)},
+        })
+    return has_snapshot
+
+
+# Appended rows are staged under "<run_id>~append" until they move into the run;
+# readers filter on the exact run_id, so they never see a staged row
+APPEND_TABLES = ("raw_data", "clustered_data")
+
+
+def staging_run_id(run_id: str) -> str:
+    return f"{run_id}~append"
+
+
+def delete_staged(run_id: str):
+    """Drop rows staged for run_id by an append that did not finish."""
+    client = get_service_client()
+    for table in APPEND_TABLES:
+        client.table(table).delete().eq("run_id", staging_run_id(run_id)).execute(retries=3)
+
+
+def append_results(csv_path: str, run_id: str, chunk_rows: int = 0, update_centroids: bool = False,
+                   report: Optional[dict] = None):
+    """
+    Incremental mode: label the rows of csv_path with the published run's scaler
+    and centroids and append them to raw_data / clustered_data of run_id.
+    The rows are uploaded chunk by chunk under staging_run_id(run_id), then moved
+    into the run with one update per table, so readers never see part of an append
+    and a failed one is removed with delete_staged.
+    cluster_summary, data_stats and histogram_data are then upserted from the
+    running aggregates, so the cost follows the new rows, not the history.
+    outlier_counts, correlation_data, elbow_data and tsne_data keep the values of
+    the last full run. With update_centroids, each chunk also moves the centroids
+    towards the rows assigned to them (earlier rows keep their labels).
+    Runs with precomputed alternative K label the new rows under each of them as
+    well and rewrite cluster_summary_by_k; only the chosen K's centroids move.
+    """
+    state = fetch_state(run_id)
+    if state is None:
+        raise RuntimeError(f"No clustering state for run {run_id}; run a full build first.")
+    chunk_rows = chunk_rows or chunk_rows_for_memory(csv_path, INGEST_MEMORY_MB)
+    staged = staging_run_id(run_id)
+    print(f"Appending {csv_path} to run {run_id} ({state.n_rows} rows, K={state.n_clusters}), "
+          f"{chunk_rows} rows per chunk{', updating centroids' if update_centroids else ''} ...")
+    # Rows left staged by an append that was killed before it could clean up
+    delete_staged(run_id)
+    if report is not None:
+        report["staged"] = True
+
+    before = state.summary.counts.copy()
+    added = 0
+    for raw in pd.read_csv(csv_path, chunksize=chunk_rows):
+        chunk = state.preprocess(raw)
+        labels = state.assign(chunk)
+        alternative_labels = state.alternative_labels(chunk)
+        if update_centroids:
+            state.partial_fit(chunk, labels)
+        clustered = chunk.assign(cluster_id=labels)
+        if alternative_labels is not None:
+            clustered["cluster_ids"] = pack_labels(alternative_labels)
+        insert_frame("raw_data", chunk, staged)
+        insert_frame("clustered_data", clustered, staged)
+        state.update(clustered, alternative_labels)
+        added += len(chunk)
+
+    client = get_service_client()
+    if report is not None:
+        report["staged"] = False
+    for table in APPEND_TABLES:
+        client.table(table).update({"run_id": run_id}).eq("run_id", staged).execute(retries=3)
+    print(f"       raw_data, clustered_data: {added} rows appended")
+    for cid, (old, new) in enumerate(zip(before, state.summary.counts)):
+        print(f"       Cluster {cid}: {new} records (+{new - old})")
+
+    client.table("cluster_summary").upsert(
+        [{**r, "run_id": run_id} for r in frame_to_records(state.summary.to_frame())], on_conflict="run_id,cluster_id",
+    ).execute(retries=3)
+    if state.alternative_summaries:
+        client.table("cluster_summary_by_k").upsert(
+            [{**r, "run_id": run_id} for r in frame_to_records(alternatives_frame(state.alternative_summaries))],
+            on_conflict="run_id,k,cluster_id",
+        ).execute(retries=3)
+    client.table("data_stats").upsert(
+        [{**r, "run_id": run_id} for r in state.stats.stats_records()], on_conflict="run_id,feature_name",
+    ).execute(retries=3)
+    if state.histograms is not None:
+        client.table("histogram_data").upsert(
+            [{**r, "run_id": run_id} for r in histogram_records(state.histograms)], on_conflict=HISTOGRAM_KEY,
+        ).execute(retries=3)
+    publish_state(state)
+    if report is not None:
+        report.update({"rows": added, "chunk_rows": chunk_rows, "total_rows": state.n_rows})
+
+
+def finish_report(report: dict, start: float):
+    """Complete the run report with totals and REST request metrics, then write it out."""
+    stage_peaks = [s["peak_rss_mb"] for s in report.get("stages", []) if s["peak_rss_mb"] is not None]
+    requests = REQUESTS.to_records()
+    report.update({
+        "seconds": round(time.time() - start, 3),
+        "finished_at": round(time.time(), 3),
+        # Highest peak of the driver over the whole run, or of any worker while it ran a stage
+        "peak_rss_mb": round(max([lifetime_peak_rss_mb(), *stage_peaks]), 1),
+        "requests": requests,
+    })
+    print(f"       peak RSS {report['peak_rss_mb']:.0f} MB")
+    name = report.get("report_id", report["run_id"])
+    json_path = os.path.join(RUN_REPORT_DIR, f"{name}.json") if RUN_REPORT_DIR else None
+    try:
+        write_report(report, json_path, PROMETHEUS_TEXTFILE or None)
+    except OSError as e:
+        print(f"       could not write the run report: {e}")
+        return
+    n_requests = sum(r["requests"] for r in requests)
+    failed = sum(n for r in requests for status, n in r["status"].items() if not status.startswith("2"))
+    sent = sum(r["sent_bytes"]["sum"] for r in requests)
+    busy = sum(r["latency_seconds"]["sum"] for r in requests)
+    print(f"       {n_requests} REST requests ({failed} failed), {sent / 2**20:.1f} MB sent, "
+          f"{busy / max(n_requests, 1) * 1000:.0f} ms mean latency")
+    for path in (json_path, PROMETHEUS_TEXTFILE):
+        if path:
+            print(f"       run report: {path}")
+
+
+def append_main(csv_path: str, chunk_rows: int, update_centroids: bool, start: float):
+    """process.py --incremental: append csv_path to the published run in place."""
+    run_id = current_run_id()
+    if run_id is None:
+        print("Nothing is published yet; run a full build first.")
+        sys.exit(1)
+    report = {
+        "run_id": run_id, "report_id": f"{run_id}-append-{time.strftime('%Y%m%dT%H%M%S')}", "status": "failed",
+        "csv": os.path.abspath(csv_path), "mode": "incremental", "update_centroids": update_centroids,
+        "started_at": round(start, 3),
+    }
+    try:
+        append_results(csv_path, run_id, chunk_rows, update_centroids, report)
+    except BaseException:
+        if report.get("staged"):
+            print(f"\nAppend to run {run_id} failed; removing its staged rows. The run is unchanged.")
+            try:
+                delete_staged(run_id)
+            except Exception as e:
+                print(f"       could not remove them ({e}); the next append to this run will")
+        elif "staged" in report:
+            print(f"\nAppend to run {run_id} failed after its rows were moved into the run; its summary "
+                  "tables and state were not updated. Rebuild with a full run before appending again.")
         else:
-            record[col] = val
-    return record
+            print(f"\nAppend to run {run_id} failed; the run is unchanged.")
+        finish_report(report, start)
+        raise
+
+    # Readers stop using the run's snapshot before it is removed: it lacks the new rows
+    publish_run(run_id, has_snapshot=False)
+    delete_snapshot(run_id)
+    report["status"] = "published"
+    finish_report(report, start)
+    print(f"\nDone in {round(time.time() - start, 1)}s. Run {run_id} now includes {report['rows']} more rows.")
 
 
 def main():
     if len(sys.argv) < 2:
-        print("Usage: python process.py <csv_file> [--clusters N]")
+        print("Usage: python process.py <csv_file> [--clusters N] [--workers N] [--streaming] "
+              "[--chunk-rows N | --memory-mb MB] [--no-cache] [--no-snapshot] [--compact]")
+        print("       python process.py <new_rows.csv> --incremental [--update-centroids] [--chunk-rows N]")
         sys.exit(1)
 
     csv_path = sys.argv[1]
@@ -64,87 +866,57 @@ def main():
     if "--clusters" in sys.argv:
         idx = sys.argv.index("--clusters")
         n_clusters = int(sys.argv[idx + 1])
+    workers = PIPELINE_WORKERS
+    if "--workers" in sys.argv:
+        idx = sys.argv.index("--workers")
+        workers = int(sys.argv[idx + 1])
+    streaming = "--streaming" in sys.argv
+    use_cache = "--no-cache" not in sys.argv
+    write_snapshot = SNAPSHOT_ENABLED and "--no-snapshot" not in sys.argv
+    compact = COMPACT_DTYPES or "--compact" in sys.argv
+    chunk_rows = STREAM_CHUNK_ROWS
+    if "--memory-mb" in sys.argv:
+        idx = sys.argv.index("--memory-mb")
+        chunk_rows = chunk_rows_for_memory(csv_path, float(sys.argv[idx + 1]))
+    if "--chunk-rows" in sys.argv:
+        idx = sys.argv.index("--chunk-rows")
+        chunk_rows = int(sys.argv[idx + 1])
 
     start = time.time()
+    if "--incremental" in sys.argv:
+        append_main(csv_path, chunk_rows, "--update-centroids" in sys.argv, start)
+        return
+    run_id = new_run_id()
+    previous_run = current_run_id()
+    print(f"Run {run_id} (currently published: {previous_run or 'none'})")
+    report = {
+        "run_id": run_id, "status": "failed", "csv": os.path.abspath(csv_path),
+        "mode": "streaming" if streaming else "in-memory", "clusters": n_clusters, "workers": workers,
+        "compact": compact, "started_at": round(start, 3),
+    }
+
+    try:
+        has_snapshot = publish_results(csv_path, n_clusters, run_id, workers, streaming, chunk_rows, use_cache,
+                                       write_snapshot, report, compact)
+    except BaseException:
+        print(f"\nRun {run_id} failed; discarding its partial rows. Published data is unchanged.")
+        delete_run(run_id)
+        delete_snapshot(run_id)
+        delete_state(run_id)
+        finish_report(report, start)
+        raise
 
-    # -- 1. Load and preprocess ------------------------------------------------
-    print(f"[1/7] Loading {csv_path} ...")
-    df_raw = pd.read_csv(csv_path)
-    df = load_and_preprocess(df_raw)
-    print(f"       {len(df)} rows, {len(df.columns)} columns after preprocessing")
-
-    # -- 2. Push preprocessed data ---------------------------------------------
-    print("[2/7] Uploading preprocessed data to Supabase ...")
-    clear_table("raw_data")
-    records = [to_record(row, df.columns) for _, row in df.iterrows()]
-    batch_insert("raw_data", records)
-    print(f"       {len(records)} rows uploaded")
-
-    # -- 3. Compute and push statistics ----------------------------------------
-    print("[3/7] Computing feature statistics ...")
-    clear_table("data_stats")
-    stats_records = []
-    for col in NUMERIC_FEATURES:
-        if col in df.columns:
-            stats_records.append({
-                "feature_name": col,
-                "mean_val": round(float(df[col].mean()), 4),
-                "std_val": round(float(df[col].std()), 4),
-                "min_val": round(float(df[col].min()), 4),
-                "max_val": round(float(df[col].max()), 4),
-                "median_val": round(float(df[col].median()), 4),
-                "row_count": len(df),
-            })
-    batch_insert("data_stats", stats_records)
-
-    # -- 4. Compute and push outliers ------------------------------------------
-    print("[4/7] Computing outliers (IQR method) ...")
-    clear_table("outlier_counts")
-    outliers = compute_outliers(df)
-    outlier_records = [{"feature_name": k, "outlier_count": v} for k, v in outliers.items()]
-    batch_insert("outlier_counts", outlier_records)
-    print(f"       {sum(outliers.values())} total outliers across {len(outliers)} features")
-
-    # -- 5. Compute and push correlation + elbow -------------------------------
-    print("[5/7] Computing correlation matrix and elbow data ...")
-
-    clear_table("correlation_data")
-    corr = compute_correlation(df)
-    batch_insert("correlation_data", [{
-        "columns_list": json.dumps(corr["columns"]),
-        "matrix_data": json.dumps(corr["matrix"]),
-    }])
-
-    clear_table("elbow_data")
-    elbow = compute_elbow(df, k_range=range(1, 11))
-    batch_insert("elbow_data", elbow)
-
-    # -- 6. Run KMeans and push ------------------------------------------------
-    print(f"[6/7] Running KMeans (K={n_clusters}) ...")
-    clustered_df, summary_df, scaled_data = run_kmeans(df, n_clusters=n_clusters)
-
-    clear_table("clustered_data")
-    cluster_records = [to_record(row, clustered_df.columns) for _, row in clustered_df.iterrows()]
-    batch_insert("clustered_data", cluster_records)
-
-    clear_table("cluster_summary")
-    summary_records = summary_df.to_dict(orient="records")
-    batch_insert("cluster_summary", summary_records)
-
-    counts = clustered_df["cluster_id"].value_counts().sort_index()
-    for cid, cnt in counts.items():
-        print(f"       Cluster {cid}: {cnt} records")
-
-    # -- 7. Run t-SNE and push -------------------------------------------------
-    print("[7/7] Running t-SNE (this may take a moment) ...")
-    labels = clustered_df["cluster_id"].values
-    tsne_results = compute_tsne(scaled_data, labels, perplexity=30)
-
-    clear_table("tsne_data")
-    batch_insert("tsne_data", tsne_results)
+    # -- Flip the version pointer, then drop the superseded run ----------------
+    publish_run(run_id, has_snapshot)
+    if previous_run and previous_run != run_id:
+        delete_run(previous_run)
+        delete_snapshot(previous_run)
+        delete_state(previous_run)
 
+    report["status"] = "published"
+    finish_report(report, start)
     elapsed = round(time.time() - start, 1)
-    print(f"\nDone in {elapsed}s. All results are now in Supabase.")
+    print(f"\nDone in {elapsed}s. Run {run_id} is now live in Supabase.")
     print("Your static dashboard will read directly from these tables.")
 
 
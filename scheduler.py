@@ -0,0 +1,195 @@
+"""
+Dependency-graph stage runner for the ML pipeline.
+Independent stages run concurrently in a process pool, and each finished
+result is handed to a callback (the uploader) while other stages keep computing.
+With a StageCache, stages whose inputs and parameters are unchanged are loaded
+from disk instead of recomputed.
+"""
+
+from __future__ import annotations
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from metrics import peak_rss_mb, reset_peak_rss
+from stage_cache import StageCache
+
+
+@dataclass
+class Stage:
+    """One node of the pipeline graph. func is called as func(*dep_results, **kwargs)."""
+    name: str
+    func: Callable
+    deps: tuple = ()
+    kwargs: dict = field(default_factory=dict)
+    local: bool = False  # run in the parent process (cheap or unpicklable work)
+    # Values that determine the result besides the dependencies (the cache key);
+    # defaults to kwargs
+    params: Optional[dict] = None
+    cacheable: bool = True
+
+
+@dataclass
+class StageTiming:
+    name: str
+    start: float
+    end: float
+    cpu_seconds: float = 0.0
+    # Peak RSS of the process that ran the stage while it ran (None when cached)
+    peak_rss_mb: Optional[float] = None
+    cached: bool = False
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+
+# Read by OpenMP and BLAS libraries when they load, which in a worker is after the initializer
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "BLIS_NUM_THREADS")
+
+
+def _limit_threads(n_threads: int):
+    """Worker initializer: stop every worker from grabbing all cores for BLAS/OpenMP."""
+    for name in THREAD_ENV_VARS:
+        os.environ[name] = str(n_threads)
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(n_threads)
+    except ImportError:
+        pass
+
+
+def _timed_call(func: Callable, args: tuple, kwargs: dict):
+    """func's result with its wall-clock span, CPU seconds and peak RSS."""
+    reset_peak_rss()
+    start, cpu = time.time(), time.process_time()
+    result = func(*args, **kwargs)
+    return result, start, time.time(), time.process_time() - cpu, peak_rss_mb()
+
+
+def _check_graph(stages: List[Stage]):
+    names = {s.name for s in stages}
+    if len(names) != len(stages):
+        raise ValueError("Duplicate stage names")
+    for s in stages:
+        missing = [d for d in s.deps if d not in names]
+        if missing:
+            raise ValueError(f"Stage {s.name} depends on unknown stages: {missing}")
+
+
+def run_stages(
+    stages: List[Stage],
+    workers: int,
+    on_result: Optional[Callable[[str, Any], None]] = None,
+    cache: Optional[StageCache] = None,
+) -> tuple[Dict[str, Any], Dict[str, StageTiming]]:
+    """
+    Run stages as soon as their dependencies finish.
+    on_result(name, result) is called in the parent as each stage completes.
+    With workers <= 1 everything runs in-process, in graph order.
+    A stage's cache key chains the keys of its dependencies, so changing one
+    parameter only recomputes the stages downstream of it.
+    Returns (results, timings).
+    """
+    _check_graph(stages)
+    results: Dict[str, Any] = {}
+    timings: Dict[str, StageTiming] = {}
+    keys: Dict[str, str] = {}
+    remaining = list(stages)
+
+    def ready():
+        out = [s for s in remaining if all(d in results for d in s.deps)]
+        for s in out:
+            remaining.remove(s)
+        return out
+
+    def finish(name, result, start, end, cpu=0.0, rss=None, cached=False):
+        results[name] = result
+        timings[name] = StageTiming(name, start, end, cpu, rss, cached)
+        if on_result is not None:
+            on_result(name, result)
+        if name in keys and not cached:
+            cache.put(keys[name], result)
+
+    def from_cache(s: Stage) -> bool:
+        """Compute s's cache key; on a hit, finish it with the stored result."""
+        if cache is None or not s.cacheable or any(d not in keys for d in s.deps):
+            return False
+        params = s.kwargs if s.params is None else s.params
+        keys[s.name] = cache.key(s.name, params, [keys[d] for d in s.deps])
+        start = time.time()
+        hit, result = cache.get(keys[s.name])
+        if hit:
+            finish(s.name, result, start, time.time(), cached=True)
+        return hit
+
+    if workers <= 1:
+        while remaining:
+            batch = ready()
+            if not batch:
+                raise ValueError(f"Dependency cycle among: {[s.name for s in remaining]}")
+            for s in batch:
+                if from_cache(s):
+                    continue
+                args = tuple(results[d] for d in s.deps)
+                finish(s.name, *_timed_call(s.func, args, s.kwargs))
+        return results, timings
+
+    n_threads = max(1, (os.cpu_count() or 1) // workers)
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                             initializer=_limit_threads, initargs=(n_threads,)) as pool:
+        running = {}
+        while remaining or running:
+            for s in ready():
+                if from_cache(s):
+                    continue
+                args = tuple(results[d] for d in s.deps)
+                if s.local:
+                    finish(s.name, *_timed_call(s.func, args, s.kwargs))
+                    continue
+                running[pool.submit(_timed_call, s.func, args, s.kwargs)] = s.name
+            if not running:
+                if remaining:
+                    # Local or cached stages may have unlocked more work; loop again before giving up
+                    if not any(all(d in results for d in s.deps) for s in remaining):
+                        raise ValueError(f"Dependency cycle among: {[s.name for s in remaining]}")
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                name = running.pop(fut)
+                finish(name, *fut.result())
+    return results, timings
+
+
+def critical_path(stages: List[Stage], timings: Dict[str, StageTiming]) -> tuple[List[str], float]:
+    """Longest chain of dependent stages by measured duration: the floor on run time."""
+    by_name = {s.name: s for s in stages}
+    best: Dict[str, tuple[float, List[str]]] = {}
+
+    def longest(name):
+        if name not in best:
+            prev = [longest(d) for d in by_name[name].deps]
+            base = max(prev, key=lambda p: p[0]) if prev else (0.0, [])
+            best[name] = (base[0] + timings[name].duration, base[1] + [name])
+        return best[name]
+
+    total, path = max((longest(s.name) for s in stages), key=lambda p: p[0])
+    return path, total
+
+
+def format_report(stages: List[Stage], timings: Dict[str, StageTiming]) -> str:
+    """Human-readable per-stage timing table plus the critical path."""
+    t0 = min(t.start for t in timings.values())
+    lines = ["Stage timings (start -> end, seconds from run start):"]
+    for s in stages:
+        t = timings[s.name]
+        note = ", cached" if t.cached else f", cpu {t.cpu_seconds:.2f}s, peak {t.peak_rss_mb:.0f} MB"
+        lines.append(f"       {s.name:<14} {t.start - t0:7.2f} -> {t.end - t0:7.2f}  ({t.duration:.2f}s{note})")
+    path, total = critical_path(stages, timings)
+    serial = sum(t.duration for t in timings.values())
+    lines.append(f"       critical path: {' -> '.join(path)} ({total:.2f}s; serial sum {serial:.2f}s)")
+    return "\n".join(lines)
@@ -4,6 +4,7 @@ Verifies tables exist, or prints the SQL to create them.
 Usage:
     python setup_supabase.py          # check if tables exist
     python setup_supabase.py --sql    # print the CREATE TABLE SQL
+    python setup_supabase.py --migrate-sql  # print SQL to upgrade an existing project (includes --sql)
 """
 
 import requests
@@ -16,13 +17,14 @@ HEADERS = {
 
 REST_URL = f"{SUPABASE_URL}/rest/v1"
 
-TABLES = ["raw_data", "clustered_data", "cluster_summary", "outlier_counts", "data_stats", "correlation_data", "elbow_data", "tsne_data"]
+TABLES = ["raw_data", "clustered_data", "cluster_summary", "cluster_summary_by_k", "outlier_counts", "data_stats", "correlation_data", "elbow_data", "tsne_data", "histogram_data", "pipeline_version"]
 
-SQL = """
+CREATE_SQL = """
 -- Run this in Supabase SQL Editor (https://supabase.com/dashboard)
 
 CREATE TABLE IF NOT EXISTS raw_data (
     id BIGSERIAL PRIMARY KEY,
+    run_id TEXT,
     cpu_usage FLOAT,
     memory_usage FLOAT,
     network_usage FLOAT,
@@ -37,6 +39,7 @@ CREATE TABLE IF NOT EXISTS raw_data (
 
 CREATE TABLE IF NOT EXISTS clustered_data (
     id BIGSERIAL PRIMARY KEY,
+    run_id TEXT,
     cpu_usage FLOAT,
     memory_usage FLOAT,
     network_usage FLOAT,
@@ -47,12 +50,32 @@ CREATE TABLE IF NOT EXISTS clustered_data (
     workload_type_low INT,
     workload_type_medium INT,
     cluster_id INT,
+    cluster_ids TEXT,
     created_at TIMESTAMPTZ DEFAULT NOW()
 );
 
 CREATE TABLE IF NOT EXISTS cluster_summary (
     id BIGSERIAL PRIMARY KEY,
-    cluster_id INT UNIQUE,
+    run_id TEXT,
+    cluster_id INT,
+    cpu_usage_mean FLOAT,
+    memory_usage_mean FLOAT,
+    network_usage_mean FLOAT,
+    disk_io_mean FLOAT,
+    energy_consumption_mean FLOAT,
+    service_latency_mean FLOAT,
+    record_count INT,
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- cluster_summary of every K the elbow sweep fitted (in-memory runs). Character i
+-- of clustered_data.cluster_ids / tsne_data.cluster_ids is the row's cluster
+-- (base 36) under the i-th smallest k here, so the dashboard switches K locally.
+CREATE TABLE IF NOT EXISTS cluster_summary_by_k (
+    id BIGSERIAL PRIMARY KEY,
+    run_id TEXT,
+    k INT,
+    cluster_id INT,
     cpu_usage_mean FLOAT,
     memory_usage_mean FLOAT,
     network_usage_mean FLOAT,
@@ -65,14 +88,16 @@ CREATE TABLE IF NOT EXISTS cluster_summary (
 
 CREATE TABLE IF NOT EXISTS outlier_counts (
     id BIGSERIAL PRIMARY KEY,
-    feature_name TEXT UNIQUE,
+    run_id TEXT,
+    feature_name TEXT,
     outlier_count INT,
     created_at TIMESTAMPTZ DEFAULT NOW()
 );
 
 CREATE TABLE IF NOT EXISTS data_stats (
     id BIGSERIAL PRIMARY KEY,
-    feature_name TEXT UNIQUE,
+    run_id TEXT,
+    feature_name TEXT,
     mean_val FLOAT,
     std_val FLOAT,
     min_val FLOAT,
@@ -84,6 +109,7 @@ CREATE TABLE IF NOT EXISTS data_stats (
 
 CREATE TABLE IF NOT EXISTS correlation_data (
     id BIGSERIAL PRIMARY KEY,
+    run_id TEXT,
     columns_list TEXT,
     matrix_data TEXT,
     created_at TIMESTAMPTZ DEFAULT NOW()
@@ -91,6 +117,7 @@ CREATE TABLE IF NOT EXISTS correlation_data (
 
 CREATE TABLE IF NOT EXISTS elbow_data (
     id BIGSERIAL PRIMARY KEY,
+    run_id TEXT,
     k INT,
     inertia FLOAT,
     created_at TIMESTAMPTZ DEFAULT NOW()
@@ -98,43 +125,111 @@ CREATE TABLE IF NOT EXISTS elbow_data (
 
 CREATE TABLE IF NOT EXISTS tsne_data (
     id BIGSERIAL PRIMARY KEY,
+    run_id TEXT,
     x FLOAT,
     y FLOAT,
     cluster_id INT,
+    cluster_ids TEXT,
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- Pre-binned distributions, one row per (feature or feature pair, cluster).
+-- kind 'hist': counts is a JSON list of equal-width bins over [x_min, x_max]
+-- (feature_y is empty).
+-- kind 'density': counts is a JSON grid counts[y][x] over the x and y ranges.
+CREATE TABLE IF NOT EXISTS histogram_data (
+    id BIGSERIAL PRIMARY KEY,
+    run_id TEXT,
+    kind TEXT,
+    feature_x TEXT,
+    feature_y TEXT,
+    cluster_id INT,
+    x_min FLOAT,
+    x_max FLOAT,
+    y_min FLOAT,
+    y_max FLOAT,
+    counts TEXT,
     created_at TIMESTAMPTZ DEFAULT NOW()
 );
 
--- Enable RLS on all tables
-ALTER TABLE raw_data ENABLE ROW LEVEL SECURITY;
-ALTER TABLE clustered_data ENABLE ROW LEVEL SECURITY;
-ALTER TABLE cluster_summary ENABLE ROW LEVEL SECURITY;
-ALTER TABLE outlier_counts ENABLE ROW LEVEL SECURITY;
-ALTER TABLE data_stats ENABLE ROW LEVEL SECURITY;
-ALTER TABLE correlation_data ENABLE ROW LEVEL SECURITY;
-ALTER TABLE elbow_data ENABLE ROW LEVEL SECURITY;
-ALTER TABLE tsne_data ENABLE ROW LEVEL SECURITY;
-
--- Anon read policies (frontend reads with anon key)
-CREATE POLICY anon_read_raw_data ON raw_data FOR SELECT TO anon USING (true);
-CREATE POLICY anon_read_clustered_data ON clustered_data FOR SELECT TO anon USING (true);
-CREATE POLICY anon_read_cluster_summary ON cluster_summary FOR SELECT TO anon USING (true);
-CREATE POLICY anon_read_outlier_counts ON outlier_counts FOR SELECT TO anon USING (true);
-CREATE POLICY anon_read_data_stats ON data_stats FOR SELECT TO anon USING (true);
-CREATE POLICY anon_read_correlation_data ON correlation_data FOR SELECT TO anon USING (true);
-CREATE POLICY anon_read_elbow_data ON elbow_data FOR SELECT TO anon USING (true);
-CREATE POLICY anon_read_tsne_data ON tsne_data FOR SELECT TO anon USING (true);
-
--- Service role full access (process.py writes with service key)
-CREATE POLICY service_all_raw_data ON raw_data FOR ALL TO service_role USING (true);
-CREATE POLICY service_all_clustered_data ON clustered_data FOR ALL TO service_role USING (true);
-CREATE POLICY service_all_cluster_summary ON cluster_summary FOR ALL TO service_role USING (true);
-CREATE POLICY service_all_outlier_counts ON outlier_counts FOR ALL TO service_role USING (true);
-CREATE POLICY service_all_data_stats ON data_stats FOR ALL TO service_role USING (true);
-CREATE POLICY service_all_correlation_data ON correlation_data FOR ALL TO service_role USING (true);
-CREATE POLICY service_all_elbow_data ON elbow_data FOR ALL TO service_role USING (true);
-CREATE POLICY service_all_tsne_data ON tsne_data FOR ALL TO service_role USING (true);
+-- Pointer to the published run. process.py uploads a whole run under a new
+-- run_id, then flips this single row; readers filter every table on it.
+-- snapshot is false once incremental appends have outdated the run's snapshot.
+CREATE TABLE IF NOT EXISTS pipeline_version (
+    id INT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    run_id TEXT NOT NULL,
+    snapshot BOOLEAN,
+    published_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- Per-run uniqueness and run_id indexes for filtered reads / run deletes
+CREATE UNIQUE INDEX IF NOT EXISTS cluster_summary_run_cluster ON cluster_summary (run_id, cluster_id);
+CREATE UNIQUE INDEX IF NOT EXISTS cluster_summary_by_k_run_k_cluster ON cluster_summary_by_k (run_id, k, cluster_id);
+CREATE UNIQUE INDEX IF NOT EXISTS outlier_counts_run_feature ON outlier_counts (run_id, feature_name);
+CREATE UNIQUE INDEX IF NOT EXISTS data_stats_run_feature ON data_stats (run_id, feature_name);
+CREATE INDEX IF NOT EXISTS raw_data_run_id ON raw_data (run_id);
+CREATE INDEX IF NOT EXISTS clustered_data_run_id ON clustered_data (run_id);
+CREATE INDEX IF NOT EXISTS correlation_data_run_id ON correlation_data (run_id);
+CREATE INDEX IF NOT EXISTS elbow_data_run_id ON elbow_data (run_id);
+CREATE INDEX IF NOT EXISTS tsne_data_run_id ON tsne_data (run_id);
+CREATE UNIQUE INDEX IF NOT EXISTS histogram_data_run_feature_cluster
+    ON histogram_data (run_id, kind, feature_x, feature_y, cluster_id);
+
+"""
+
+
+def access_sql(tables) -> str:
+    """
+    RLS plus the anon read and service_role policies of each table. Every policy
+    is dropped first, so the script can be re-run on a project that has some.
+    """
+    lines = ["-- Enable RLS on all tables"]
+    lines += [f"ALTER TABLE {t} ENABLE ROW LEVEL SECURITY;" for t in tables]
+    lines += ["", "-- Anon read policies (frontend reads with anon key)"]
+    for t in tables:
+        lines += [f"DROP POLICY IF EXISTS anon_read_{t} ON {t};",
+                  f"CREATE POLICY anon_read_{t} ON {t} FOR SELECT TO anon USING (true);"]
+    lines += ["", "-- Service role full access (process.py writes with service key)"]
+    for t in tables:
+        lines += [f"DROP POLICY IF EXISTS service_all_{t} ON {t};",
+                  f"CREATE POLICY service_all_{t} ON {t} FOR ALL TO service_role USING (true);"]
+    return "\n".join(lines) + "\n"
+
+
+STORAGE_SQL = """
+-- Public Storage bucket for run snapshots (process.py uploads with the service key)
+INSERT INTO storage.buckets (id, name, public) VALUES ('snapshots', 'snapshots', true)
+ON CONFLICT (id) DO NOTHING;
+
+-- Private Storage bucket for clustering state (scaler, centroids, aggregates) used by --incremental
+INSERT INTO storage.buckets (id, name, public) VALUES ('models', 'models', false)
+ON CONFLICT (id) DO NOTHING;
 """
 
+SQL = CREATE_SQL + "\n" + access_sql(TABLES) + "\n" + STORAGE_SQL
+
+# Columns added to the original eight tables; the tables added since are created by CREATE_SQL
+_UPGRADE_BASE_SQL = """
+-- Upgrade a project created with the original eight tables.
+-- Safe to re-run: columns and tables are only added if missing and policies are replaced.
+ALTER TABLE raw_data ADD COLUMN IF NOT EXISTS run_id TEXT;
+ALTER TABLE clustered_data ADD COLUMN IF NOT EXISTS run_id TEXT;
+ALTER TABLE cluster_summary ADD COLUMN IF NOT EXISTS run_id TEXT;
+ALTER TABLE outlier_counts ADD COLUMN IF NOT EXISTS run_id TEXT;
+ALTER TABLE data_stats ADD COLUMN IF NOT EXISTS run_id TEXT;
+ALTER TABLE correlation_data ADD COLUMN IF NOT EXISTS run_id TEXT;
+ALTER TABLE elbow_data ADD COLUMN IF NOT EXISTS run_id TEXT;
+ALTER TABLE tsne_data ADD COLUMN IF NOT EXISTS run_id TEXT;
+ALTER TABLE cluster_summary DROP CONSTRAINT IF EXISTS cluster_summary_cluster_id_key;
+ALTER TABLE outlier_counts DROP CONSTRAINT IF EXISTS outlier_counts_feature_name_key;
+ALTER TABLE data_stats DROP CONSTRAINT IF EXISTS data_stats_feature_name_key;
+ALTER TABLE clustered_data ADD COLUMN IF NOT EXISTS cluster_ids TEXT;
+ALTER TABLE tsne_data ADD COLUMN IF NOT EXISTS cluster_ids TEXT;
+"""
+
+# Column upgrades, then the full idempotent setup: new tables, indexes, RLS and policies
+MIGRATION_SQL = _UPGRADE_BASE_SQL + CREATE_SQL + "\n" + access_sql(TABLES) + "\n" + STORAGE_SQL
+
 
 def table_exists(name: str) -> bool:
     resp = requests.get(f"{REST_URL}/{name}?limit=0", headers=HEADERS)
@@ -158,7 +253,9 @@ def verify():
 
 if __name__ == "__main__":
     import sys
-    if "--sql" in sys.argv:
+    if "--migrate-sql" in sys.argv:
+        print(MIGRATION_SQL)
+    elif "--sql" in sys.argv:
         print(SQL)
     else:
         verify()
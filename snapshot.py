@@ -0,0 +1,217 @@
+"""
+Columnar snapshot of one pipeline run.
+Every result table is an Arrow IPC file with zstd-compressed buffers, and the
+tables plus a manifest are stored uncompressed in a single zip. Each member is
+then a contiguous byte range, so a reader memory-maps the file once and opens
+the tables in place instead of paging JSON out of PostgREST.
+"""
+
+from __future__ import annotations
+import json
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+import threading
+import time
+import zipfile
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.ipc as ipc
+
+from config import SNAPSHOT_DIR
+
+# Bump when the layout changes; readers refuse other versions
+SNAPSHOT_FORMAT = 1
+MANIFEST = "manifest.json"
+
+
+class Match(NamedTuple):
+    """Filter value matching a text column against a regular expression (instead of equality)."""
+    pattern: str
+
+
+def snapshot_name(run_id: str) -> str:
+    return f"{run_id}.arrow.zip"
+
+
+def snapshot_path(run_id: str, root: str = SNAPSHOT_DIR) -> str:
+    return os.path.join(root, snapshot_name(run_id))
+
+
+class SnapshotWriter:
+    """
+    Collects result tables for one run and writes the snapshot on close().
+    Tables can be written in several parts (e.g. one chunk at a time) and from
+    several threads.
+    """
+
+    def __init__(self, path: str, run_id: str, compression: str = "zstd"):
+        self.path = path
+        self.run_id = run_id
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._dir = tempfile.mkdtemp(prefix=".snapshot-", dir=os.path.dirname(os.path.abspath(path)))
+        self._options = ipc.IpcWriteOptions(compression=compression)
+        self._writers: Dict[str, tuple] = {}
+        self._rows: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def write_table(self, name: str, table: pa.Table):
+        with self._lock:
+            if name not in self._writers:
+                sink = pa.OSFile(os.path.join(self._dir, f"{name}.arrow"), "wb")
+                self._writers[name] = (ipc.new_file(sink, table.schema, options=self._options), sink, table.schema)
+                self._rows[name] = 0
+            writer, _, schema = self._writers[name]
+            writer.write_table(table.cast(schema))
+            self._rows[name] += table.num_rows
+
+    def write_frame(self, name: str, df: pd.DataFrame):
+        self.write_table(name, pa.Table.from_pandas(df, preserve_index=False))
+
+    def write_records(self, name: str, records: List[Dict]):
+        if records:
+            self.write_table(name, pa.Table.from_pylist(records))
+
+    def write_correlation(self, correlation: Dict):
+        """The matrix as float64 columns (one per feature) instead of JSON text."""
+        columns = correlation["columns"]
+        matrix = np.asarray(correlation["matrix"], dtype=np.float64)
+        self.write_table("correlation_data", pa.table(
+            {"feature": columns, **{c: matrix[:, i] for i, c in enumerate(columns)}}
+        ))
+
+    def write_histograms(self, records: List[Dict]):
+        """
+        histogram_data rows with counts as flat int64 lists plus their shape, since
+        1D histograms and 2D density grids share the column.
+        """
+        self.write_records("histogram_data", [
+            {**r, "counts": np.ravel(r["counts"]).tolist(), "counts_shape": list(np.shape(r["counts"]))}
+            for r in records
+        ])
+
+    def close(self) -> str:
+        """Write the snapshot atomically to self.path and return it."""
+        with self._lock:
+            for writer, sink, _ in self._writers.values():
+                writer.close()
+                sink.close()
+            manifest = {
+                "format": SNAPSHOT_FORMAT,
+                "run_id": self.run_id,
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "tables": self._rows,
+            }
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            # ZIP_STORED: members stay contiguous and uncompressed (their buffers already are)
+            with zipfile.ZipFile(tmp, "w", compression=zipfile.ZIP_STORED) as zf:
+                zf.writestr(MANIFEST, json.dumps(manifest))
+                for name in self._rows:
+                    zf.write(os.path.join(self._dir, f"{name}.arrow"), f"{name}.arrow")
+            os.replace(tmp, self.path)
+            shutil.rmtree(self._dir, ignore_errors=True)
+            self._writers = {}
+        return self.path
+
+    def discard(self):
+        with self._lock:
+            for writer, sink, _ in self._writers.values():
+                try:
+                    writer.close()
+                finally:
+                    sink.close()
+            self._writers = {}
+            shutil.rmtree(self._dir, ignore_errors=True)
+
+
+class Snapshot:
+    """Read-only, memory-mapped view of a snapshot file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as fh:
+            self._mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        with zipfile.ZipFile(path) as zf:
+            self._members = {info.filename: self._member_range(info) for info in zf.infolist()}
+        self.manifest = json.loads(bytes(self._buffer(MANIFEST)))
+        if self.manifest.get("format") != SNAPSHOT_FORMAT:
+            raise ValueError(f"Unsupported snapshot format {self.manifest.get('format')} in {path}")
+        self._tables: Dict[str, pa.Table] = {}
+
+    def _member_range(self, info: zipfile.ZipInfo) -> tuple:
+        if info.compress_type != zipfile.ZIP_STORED:
+            raise ValueError(f"Snapshot member {info.filename} is compressed; cannot map it")
+        # Local file header: 30 fixed bytes, then the name and extra field
+        name_len, extra_len = struct.unpack("<HH", self._mm[info.header_offset + 26:info.header_offset + 30])
+        start = info.header_offset + 30 + name_len + extra_len
+        return start, start + info.file_size
+
+    def _buffer(self, member: str) -> memoryview:
+        start, end = self._members[member]
+        return memoryview(self._mm)[start:end]
+
+    @property
+    def run_id(self) -> str:
+        return self.manifest["run_id"]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.manifest["tables"]
+
+    def table(self, name: str) -> pa.Table:
+        """One result table, read in place from the mapped file."""
+        if name not in self._tables:
+            self._tables[name] = ipc.open_file(pa.py_buffer(self._buffer(f"{name}.arrow"))).read_all()
+        return self._tables[name]
+
+    def correlation(self) -> tuple:
+        """(columns, matrix as a 2D float array)."""
+        table = self.table("correlation_data")
+        columns = table.column("feature").to_pylist()
+        return columns, np.column_stack([table.column(c).to_numpy() for c in columns])
+
+    def rows(self, name: str, columns="*", filters: Iterable[tuple] = (), limit: Optional[int] = None,
+             indices: Optional[np.ndarray] = None) -> List[Dict]:
+        """
+        Rows shaped like the REST table's, with the same column projection and
+        (column, value) filters as dashboard.fetch_table; a list/tuple value
+        matches any of its items and a Match value is a regular expression. Columns stored as JSON text in Supabase
+        (histogram counts, the correlation matrix) come back decoded.
+        indices picks rows by position after filtering.
+        """
+        if name == "correlation_data":
+            cols, matrix = self.correlation()
+            return [{"columns_list": cols, "matrix_data": matrix.tolist()}]
+        table = self.table(name)
+        for column, value in filters:
+            if isinstance(value, Match):
+                mask = pc.match_substring_regex(table.column(column), value.pattern)
+            elif isinstance(value, (list, tuple)):
+                mask = pc.is_in(table.column(column), value_set=pa.array(value, table.schema.field(column).type))
+            else:
+                mask = pc.equal(table.column(column), pa.scalar(value, table.schema.field(column).type))
+            table = table.filter(mask)
+        if indices is not None:
+            table = table.take(pa.array(indices))
+        if limit is not None:
+            table = table.slice(0, limit)
+        shaped = "counts_shape" in table.column_names
+        if columns != "*":
+            if isinstance(columns, str):
+                columns = columns.split(",")
+            keep = [c for c in columns if c in table.column_names]
+            if shaped and "counts" in keep:
+                keep.append("counts_shape")
+            table = table.select(keep)
+        rows = table.to_pylist()
+        if shaped:
+            for row in rows:
+                shape = row.pop("counts_shape", None)
+                if "counts" in row:
+                    row["counts"] = np.reshape(row["counts"], shape).tolist()
+        return rows
@@ -0,0 +1,341 @@
+"""
+Embedded SQLite backend with the same surface as supabase_client.
+Lets the pipeline and the dashboard run entirely on local disk (offline nodes,
+tests, benchmarks): select with filters, ordering, ranges and exact counts;
+insert, upsert, update, delete and bulk_insert; Storage calls map to a local directory.
+Selected with DATA_BACKEND=sqlite (see config.py); get_service_client() and
+get_anon_client() then return a SQLiteClient.
+"""
+
+from __future__ import annotations
+import gzip
+import json
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+from itertools import islice
+from typing import Iterable, Sequence
+
+from metrics import REQUESTS
+from supabase_client import SupabaseError, _QueryResponse
+
+# Rows per executemany() transaction in bulk_insert
+SQLITE_BATCH_ROWS = 10_000
+
+
+def _quote(name: str) -> str:
+    # Not double quotes: SQLite reads a "name" that matches no column as a string
+    # literal, so a select or filter on a missing column would silently succeed.
+    # A backquoted name is always an identifier, and a missing one is an error.
+    return "`" + name.replace("`", "``") + "`"
+
+
+def _sql_type(value) -> str:
+    if isinstance(value, bool) or isinstance(value, int):
+        return "INTEGER"
+    if isinstance(value, float):
+        return "REAL"
+    return "TEXT"
+
+
+def _sql_value(value):
+    # PostgREST would store these as json/jsonb; keep them as JSON text
+    return json.dumps(value) if isinstance(value, (list, dict)) else value
+
+
+def _regexp(pattern: str, value) -> bool:
+    return value is not None and re.search(pattern, str(value)) is not None
+
+
+class _SQLiteQuery:
+    """Fluent builder mirroring supabase_client._TableQuery on one SQLite table."""
+
+    def __init__(self, table: str, client: SQLiteClient):
+        self._table = table
+        self._client = client
+        self._columns = "*"
+        self._count = False
+        self._where: list[tuple[str, str, object]] = []
+        self._order: tuple[str, bool] | None = None
+        self._limit: int | None = None
+        self._offset = 0
+        self._method = "GET"
+        self._rows: list[dict] = []
+        self._on_conflict: str | None = None
+        self._values: dict = {}
+
+    # --- SELECT / filters ---------------------------------------------------
+    def select(self, columns: str | Iterable[str] = "*", count: str | None = None):
+        if isinstance(columns, str):
+            columns = [c.strip() for c in columns.split(",")]
+        self._columns = "*" if list(columns) == ["*"] else list(columns)
+        self._count = count is not None
+        return self
+
+    def limit(self, n: int):
+        self._limit = n
+        return self
+
+    def offset(self, n: int):
+        self._offset = n
+        return self
+
+    def range(self, start: int, end: int):
+        """Rows start..end inclusive (0-based), like supabase-js .range()."""
+        return self.offset(start).limit(end - start + 1)
+
+    def order(self, column: str, desc: bool = False):
+        self._order = (column, desc)
+        return self
+
+    def eq(self, column: str, value):
+        self._where.append((column, "=", value))
+        return self
+
+    def gte(self, column: str, value):
+        self._where.append((column, ">=", value))
+        return self
+
+    def neq(self, column: str, value):
+        self._where.append((column, "!=", value))
+        return self
+
+    def in_(self, column: str, values: Iterable):
+        self._where.append((column, "IN", tuple(values)))
+        return self
+
+    def match(self, column: str, pattern: str):
+        self._where.append((column, "REGEXP", pattern))
+        return self
+
+    # --- INSERT / DELETE ----------------------------------------------------
+    def insert(self, rows: list[dict]):
+        self._method = "POST"
+        self._rows = rows
+        return self
+
+    def upsert(self, rows: list[dict] | dict, on_conflict: str):
+        self._method = "POST"
+        self._rows = [rows] if isinstance(rows, dict) else rows
+        self._on_conflict = on_conflict
+        return self
+
+    def insert_encoded(self, content: bytes, content_type: str = "application/json",
+                       content_encoding: str | None = None):
+        """Insert a request body that has already been serialized as a JSON array (and gzipped, with content_encoding)."""
+        if not content_type.startswith("application/json"):
+            raise ValueError(f"Unsupported content type {content_type}")
+        if content_encoding == "gzip":
+            content = gzip.decompress(content)
+        elif content_encoding:
+            raise ValueError(f"Unsupported content encoding {content_encoding}")
+        return self.insert(json.loads(content))
+
+    def update(self, values: dict):
+        self._method = "PATCH"
+        self._values = values
+        return self
+
+    def delete(self):
+        self._method = "DELETE"
+        return self
+
+    # --- BULK INSERT --------------------------------------------------------
+    def bulk_insert(self, rows: Iterable[dict], batch_rows: int = SQLITE_BATCH_ROWS, **_) -> int:
+        """
+        Insert an iterable of rows in executemany() transactions of batch_rows.
+        The HTTP chunking options of the Supabase client are accepted and ignored.
+        """
+        rows = iter(rows)
+        sent = 0
+        while True:
+            batch = list(islice(rows, batch_rows))
+            if not batch:
+                return sent
+            start = time.perf_counter()
+            sent += self._client._insert(self._table, batch)
+            REQUESTS.record(self._table, "POST", 200, time.perf_counter() - start)
+
+    def bulk_insert_columns(self, columns: Sequence[str], batches: Iterable[Sequence[list]], **kwargs) -> int:
+        """Column-ordered batches inserted through bulk_insert; there is no wire format to shrink."""
+        rows = (dict(zip(columns, row)) for batch in batches for row in zip(*batch))
+        return self.bulk_insert(rows, **kwargs)
+
+    # --- EXECUTE ------------------------------------------------------------
+    def execute(self, retries: int = 0, backoff: float = 0.5) -> _QueryResponse:
+        """Run the statement; recorded in metrics.REQUESTS like a REST request (no payload bytes)."""
+        start, status = time.perf_counter(), 200
+        try:
+            if self._method == "POST":
+                self._client._insert(self._table, self._rows, self._on_conflict)
+                return _QueryResponse([])
+            if self._method == "DELETE":
+                self._client._delete(self._table, *self._where_sql())
+                return _QueryResponse([])
+            if self._method == "PATCH":
+                self._client._update(self._table, self._values, *self._where_sql())
+                return _QueryResponse([])
+            return self._select()
+        except sqlite3.Error as e:
+            status = 400
+            raise SupabaseError(400, f"{type(e).__name__}: {e}") from e
+        finally:
+            REQUESTS.record(self._table, self._method, status, time.perf_counter() - start)
+
+    def _where_sql(self) -> tuple[str, list]:
+        clauses, params = [], []
+        for column, op, value in self._where:
+            if op == "IN":
+                clauses.append(f"{_quote(column)} IN ({','.join('?' * len(value))})" if value else "0")
+                params.extend(value)
+            else:
+                clauses.append(f"{_quote(column)} {op} ?")
+                params.append(value)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def _select(self) -> _QueryResponse:
+        conn = self._client._connection()
+        if not self._client._has_table(conn, self._table):
+            return _QueryResponse([], 0 if self._count else None)
+        where, params = self._where_sql()
+        columns = "*" if self._columns == "*" else ", ".join(_quote(c) for c in self._columns)
+        sql = f"SELECT {columns} FROM {_quote(self._table)}{where}"
+        if self._order is not None:
+            sql += f" ORDER BY {_quote(self._order[0])} {'DESC' if self._order[1] else 'ASC'}"
+        if self._limit is not None or self._offset:
+            sql += f" LIMIT {-1 if self._limit is None else int(self._limit)} OFFSET {int(self._offset)}"
+        cursor = conn.execute(sql, params)
+        names = [d[0] for d in cursor.description]
+        data = [dict(zip(names, row)) for row in cursor.fetchall()]
+        count = None
+        if self._count:
+            count = conn.execute(f"SELECT COUNT(*) FROM {_quote(self._table)}{where}", params).fetchone()[0]
+        return _QueryResponse(data, count)
+
+
+class SQLiteClient:
+    """
+    Local stand-in for SupabaseClient. Tables are created on first insert with an
+    id primary key and created_at, and gain a typed column for every new key.
+    read_only clients (the anon client) cannot write, like RLS read policies.
+    """
+
+    def __init__(self, path: str, storage_dir: str | None = None, read_only: bool = False):
+        self.path = path
+        self.storage_dir = storage_dir or os.path.join(os.path.dirname(os.path.abspath(path)), "storage")
+        self.read_only = read_only
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._columns: dict[str, set] = {}
+
+    def _connection(self) -> sqlite3.Connection:
+        """One connection per thread; WAL lets readers run alongside the writer."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=60, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            if self.read_only:
+                conn.execute("PRAGMA query_only=ON")
+            # SQLite parses REGEXP but leaves its implementation to the application
+            conn.create_function("regexp", 2, _regexp, deterministic=True)
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _has_table(conn: sqlite3.Connection, table: str) -> bool:
+        return conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table,)).fetchone() is not None
+
+    def _ensure_columns(self, conn: sqlite3.Connection, table: str, rows: list[dict]):
+        known = self._columns.get(table)
+        if known is None:
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {_quote(table)} "
+                "(id INTEGER PRIMARY KEY AUTOINCREMENT, created_at TEXT DEFAULT CURRENT_TIMESTAMP)"
+            )
+            known = {r[1] for r in conn.execute(f"PRAGMA table_info({_quote(table)})")}
+            self._columns[table] = known
+        for row in rows:
+            for key, value in row.items():
+                if key not in known and value is not None:
+                    conn.execute(f"ALTER TABLE {_quote(table)} ADD COLUMN {_quote(key)} {_sql_type(value)}")
+                    known.add(key)
+        missing = {k for row in rows for k in row} - known
+        for key in missing:  # only ever None so far
+            conn.execute(f"ALTER TABLE {_quote(table)} ADD COLUMN {_quote(key)}")
+            known.add(key)
+
+    def _insert(self, table: str, rows: list[dict], on_conflict: str | None = None) -> int:
+        if not rows:
+            return 0
+        conn = self._connection()
+        keys = list(dict.fromkeys(k for row in rows for k in row))
+        sql = (f"INSERT INTO {_quote(table)} ({', '.join(map(_quote, keys))}) "
+               f"VALUES ({', '.join('?' * len(keys))})")
+        # PostgREST style: on_conflict may name several comma-separated columns
+        conflict = [c.strip() for c in on_conflict.split(",")] if on_conflict is not None else []
+        if conflict:
+            target = ", ".join(map(_quote, conflict))
+            updates = ", ".join(f"{_quote(k)}=excluded.{_quote(k)}" for k in keys if k not in conflict)
+            sql += f" ON CONFLICT({target}) DO UPDATE SET {updates}"
+        with self._write_lock, conn:
+            self._ensure_columns(conn, table, rows)
+            if conflict and conflict != ["id"]:
+                conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {_quote(f'{table}_' + '_'.join(conflict) + '_key')} "
+                             f"ON {_quote(table)} ({target})")
+            conn.executemany(sql, ([_sql_value(row.get(k)) for k in keys] for row in rows))
+        return len(rows)
+
+    def _update(self, table: str, values: dict, where: str, params: list):
+        conn = self._connection()
+        with self._write_lock, conn:
+            if self._has_table(conn, table):
+                assignments = ", ".join(f"{_quote(k)} = ?" for k in values)
+                conn.execute(f"UPDATE {_quote(table)} SET {assignments}{where}",
+                             [*(_sql_value(v) for v in values.values()), *params])
+
+    def _delete(self, table: str, where: str, params: list):
+        conn = self._connection()
+        with self._write_lock, conn:
+            if self._has_table(conn, table):
+                conn.execute(f"DELETE FROM {_quote(table)}{where}", params)
+
+    def table(self, name: str) -> _SQLiteQuery:
+        return _SQLiteQuery(name, self)
+
+    def bulk_insert(self, table: str, rows: Iterable[dict], **kwargs) -> int:
+        """Batched insert of many rows. See _SQLiteQuery.bulk_insert."""
+        return self.table(table).bulk_insert(rows, **kwargs)
+
+    def bulk_insert_columns(self, table: str, columns: Sequence[str], batches: Iterable[Sequence[list]],
+                            **kwargs) -> int:
+        """Batched insert of column-ordered batches. See _SQLiteQuery.bulk_insert_columns."""
+        return self.table(table).bulk_insert_columns(columns, batches, **kwargs)
+
+    # --- Storage (a local directory per bucket) -------------------------------
+    def _object_path(self, bucket: str, name: str) -> str:
+        return os.path.join(self.storage_dir, bucket, name)
+
+    def upload_file(self, bucket: str, name: str, path: str, content_type: str = "application/octet-stream"):
+        target = self._object_path(bucket, name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp = f"{target}.{os.getpid()}.tmp"
+        shutil.copyfile(path, tmp)
+        os.replace(tmp, target)
+
+    def download_file(self, bucket: str, name: str, path: str, public: bool = True):
+        source = self._object_path(bucket, name)
+        if not os.path.exists(source):
+            raise SupabaseError(404, f"Object not found: {bucket}/{name}")
+        tmp = f"{path}.{os.getpid()}.tmp"
+        shutil.copyfile(source, tmp)
+        os.replace(tmp, path)
+
+    def remove_files(self, bucket: str, names: list[str]):
+        for name in names:
+            if os.path.exists(self._object_path(bucket, name)):
+                os.remove(self._object_path(bucket, name))
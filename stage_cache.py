@@ -0,0 +1,94 @@
+"""
+Content-addressed on-disk cache for pipeline stage results.
+A stage's key is a hash of its parameters, the keys of the stages it depends on
+(ultimately the CSV bytes) and the pipeline source code, so a key only matches
+when the result would be recomputed identically. Entries are compressed joblib
+files; the directory is kept under a size limit by evicting least recently used.
+"""
+
+from __future__ import annotations
+import hashlib
+import json
+import os
+import time
+from typing import Any, Iterable, Tuple
+
+import joblib
+
+
+def file_digest(path: str, block_size: int = 1 << 20) -> str:
+    """BLAKE2b digest of a file's bytes."""
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def code_fingerprint(paths: Iterable[str]) -> str:
+    """Digest of the source files whose logic produces cached results."""
+    h = hashlib.blake2b(digest_size=16)
+    for path in sorted(paths):
+        h.update(file_digest(path).encode())
+    return h.hexdigest()
+
+
+class StageCache:
+    """Size-bounded LRU store of stage results, keyed by content hash."""
+
+    def __init__(self, root: str, max_bytes: int, code_version: str = ""):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.code_version = code_version
+        os.makedirs(root, exist_ok=True)
+
+    def key(self, stage: str, params: dict, dep_keys: Iterable[str]) -> str:
+        payload = json.dumps(
+            {"stage": stage, "params": params, "deps": list(dep_keys), "code": self.code_version},
+            sort_keys=True,
+            default=repr,
+        )
+        return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, f"{key}.joblib")
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        path = self._path(key)
+        if not os.path.exists(path):
+            return False, None
+        try:
+            value = joblib.load(path)
+        except Exception:
+            # Truncated or unreadable entry: treat as a miss and drop it
+            os.remove(path)
+            return False, None
+        now = time.time()
+        os.utime(path, (now, now))  # mark as recently used
+        return True, value
+
+    def put(self, key: str, value: Any):
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        joblib.dump(value, tmp, compress=("zlib", 3))
+        os.replace(tmp, path)
+        self.evict()
+
+    def evict(self):
+        """
+        Delete least recently used entries until the cache fits in max_bytes.
+        An entry larger than the whole budget is dropped straight away.
+        """
+        entries = []
+        for name in os.listdir(self.root):
+            if not name.endswith(".joblib"):
+                continue
+            path = os.path.join(self.root, name)
+            st = os.stat(path)
+            entries.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
@@ -4,38 +4,115 @@ Avoids the heavy 'supabase' SDK and its native-compilation dependencies.
 """
 
 from __future__ import annotations
+import csv
+import gzip
+import io
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from functools import partial
+from typing import Callable, Iterable, Iterator, Sequence
+
 import httpx
-from config import SUPABASE_URL, SUPABASE_SERVICE_KEY, SUPABASE_ANON_KEY
+from config import (
+    SUPABASE_URL,
+    SUPABASE_SERVICE_KEY,
+    SUPABASE_ANON_KEY,
+    UPLOAD_WORKERS,
+    UPLOAD_MAX_RETRIES,
+    UPLOAD_MAX_RETRY_AFTER,
+    UPLOAD_CHUNK_BYTES,
+    UPLOAD_CHUNK_ROWS,
+    UPLOAD_GZIP,
+    HTTP_MAX_CONNECTIONS,
+    HTTP2_ENABLED,
+    DATA_BACKEND,
+    SQLITE_PATH,
+)
+from metrics import REQUESTS
 
 REST_BASE = f"{SUPABASE_URL}/rest/v1"
+STORAGE_BASE = f"{SUPABASE_URL}/storage/v1"
+
+# Status codes worth retrying: timeouts, rate limiting and transient server errors
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+# A plain insert (no merge-duplicates) may already be committed after a timeout or
+# a 5xx, and retrying it would duplicate its rows. It is only retried when it
+# cannot have run: the connection was never made, or the server refused it
+# (rate limited or unavailable).
+UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+REFUSED_STATUS = {429, 503}
+
+# CSV bulk loads (bulk_insert_columns). PostgREST reads an empty field as an
+# empty string and the NULL token as SQL null. Level 1 gzip is several times
+# faster than the default level and still shrinks numeric CSV about 3x.
+CSV_CONTENT_TYPE = "text/csv"
+CSV_NULL = "NULL"
+CSV_GZIP_LEVEL = 1
+# Answers to a gzip body from a server that does not decompress requests (plain
+# PostgREST without a decompressing proxy in front); set once seen, for the process
+GZIP_REJECTED_STATUS = {400, 415}
+_gzip_rejected = threading.Event()
+
+
+class SupabaseError(RuntimeError):
+    """Raised when PostgREST answers with an error status."""
+    def __init__(self, status_code: int, text: str, retry_after: float | None = None):
+        super().__init__(f"Supabase error {status_code}: {text[:300]}")
+        self.status_code = status_code
+        self.retry_after = retry_after  # seconds, from a Retry-After header
 
 
 class _QueryResponse:
     """Minimal response wrapper matching the pattern used by the rest of the app."""
-    def __init__(self, data: list):
+    def __init__(self, data: list, count: int | None = None):
         self.data = data
+        self.count = count  # total matching rows, when requested with count="exact"
 
 
 class _TableQuery:
     """Fluent builder for PostgREST queries."""
 
     def __init__(self, table: str, headers: dict, http: httpx.Client):
+        self._table = table
         self._url = f"{REST_BASE}/{table}"
         self._headers = {**headers}
         self._params: dict[str, str] = {}
         self._method = "GET"
         self._body: list | dict | None = None
+        self._content: bytes | None = None
         self._http = http
 
     # --- SELECT / filters ---------------------------------------------------
-    def select(self, columns: str = "*"):
+    def select(self, columns: str | Iterable[str] = "*", count: str | None = None):
+        """
+        Choose the returned columns (a comma-separated string or a list).
+        count="exact" also asks for the total number of matching rows, which is
+        returned as the response's count regardless of limit/range.
+        """
+        if not isinstance(columns, str):
+            columns = ",".join(columns)
         self._params["select"] = columns
+        if count is not None:
+            self._headers["Prefer"] = f"count={count}"
         return self
 
     def limit(self, n: int):
         self._params["limit"] = str(n)
         return self
 
+    def offset(self, n: int):
+        self._params["offset"] = str(n)
+        return self
+
+    def range(self, start: int, end: int):
+        """Rows start..end inclusive (0-based), like supabase-js .range()."""
+        return self.offset(start).limit(end - start + 1)
+
     def order(self, column: str, desc: bool = False):
         direction = "desc" if desc else "asc"
         self._params["order"] = f"{column}.{direction}"
@@ -49,6 +126,19 @@ class _TableQuery:
         self._params[column] = f"gte.{value}"
         return self
 
+    def neq(self, column: str, value):
+        self._params[column] = f"neq.{value}"
+        return self
+
+    def in_(self, column: str, values: Iterable):
+        self._params[column] = f"in.({','.join(str(v) for v in values)})"
+        return self
+
+    def match(self, column: str, pattern: str):
+        """Rows whose text column matches a POSIX regular expression (PostgREST's ~ operator)."""
+        self._params[column] = f"match.{pattern}"
+        return self
+
     # --- INSERT / DELETE ----------------------------------------------------
     def insert(self, rows: list[dict]):
         self._method = "POST"
@@ -56,16 +146,145 @@ class _TableQuery:
         self._headers["Prefer"] = "return=minimal"
         return self
 
+    def upsert(self, rows: list[dict] | dict, on_conflict: str):
+        """Insert rows, updating existing ones that collide on the on_conflict column."""
+        self._method = "POST"
+        self._body = rows
+        self._params["on_conflict"] = on_conflict
+        self._headers["Prefer"] = "resolution=merge-duplicates,return=minimal"
+        return self
+
+    def update(self, values: dict):
+        """Set columns on every row matching the filters, in one statement."""
+        self._method = "PATCH"
+        self._body = values
+        self._headers["Prefer"] = "return=minimal"
+        return self
+
+    def insert_encoded(self, content: bytes, content_type: str = "application/json",
+                       content_encoding: str | None = None):
+        """Insert a request body that has already been serialized (and compressed, with content_encoding)."""
+        self._method = "POST"
+        self._content = content
+        self._headers["Prefer"] = "return=minimal"
+        self._headers["Content-Type"] = content_type
+        if content_encoding:
+            self._headers["Content-Encoding"] = content_encoding
+        else:
+            self._headers.pop("Content-Encoding", None)
+        return self
+
     def delete(self):
         self._method = "DELETE"
         self._headers["Prefer"] = "return=minimal"
         return self
 
+    # --- BULK INSERT --------------------------------------------------------
+    def bulk_insert(
+        self,
+        rows: Iterable[dict],
+        workers: int = UPLOAD_WORKERS,
+        max_chunk_bytes: int = UPLOAD_CHUNK_BYTES,
+        max_chunk_rows: int = UPLOAD_CHUNK_ROWS,
+        retries: int = UPLOAD_MAX_RETRIES,
+    ) -> int:
+        """
+        Insert an iterable of rows as concurrent, retried chunks.
+        Chunks are sized so each request body stays under max_chunk_bytes, and at
+        most 2 * workers chunks are held in memory at once. Returns rows inserted.
+        """
+        chunks = _encode_chunks(rows, max_chunk_bytes, max_chunk_rows)
+        return self._send_chunks(chunks, partial(_execute_chunk, retries=retries), workers)
+
+    def bulk_insert_columns(
+        self,
+        columns: Sequence[str],
+        batches: Iterable[Sequence[list]],
+        workers: int = UPLOAD_WORKERS,
+        max_chunk_bytes: int = UPLOAD_CHUNK_BYTES,
+        max_chunk_rows: int = UPLOAD_CHUNK_ROWS,
+        retries: int = UPLOAD_MAX_RETRIES,
+        compress: bool = UPLOAD_GZIP,
+    ) -> int:
+        """
+        Bulk load column-ordered batches (each one value list per column, in
+        `columns` order; None is NULL) as CSV request bodies: column names once
+        per request instead of once per row, gzip-compressed when compress is
+        set and the server accepts it. Chunking, concurrency and retries are
+        those of bulk_insert, with max_chunk_bytes applying before compression.
+        Returns rows inserted.
+        """
+        chunks = _encode_csv_chunks(columns, batches, max_chunk_bytes, max_chunk_rows)
+        return self._send_chunks(chunks, partial(_execute_csv, retries=retries, compress=compress), workers)
+
+    def _send_chunks(self, chunks: Iterator[tuple[bytes, int]], send: Callable, workers: int) -> int:
+        """
+        Run send(query, payload, n_rows) for every encoded chunk on a thread
+        pool, holding at most 2 * workers chunks in memory at once.
+        """
+        sent = 0
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            pending = set()
+            for payload, n_rows in chunks:
+                if len(pending) >= 2 * max(1, workers):
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    sent += sum(f.result() for f in done)
+                query = _TableQuery(self._table, self._headers, self._http)
+                pending.add(pool.submit(send, query, payload, n_rows))
+            for f in pending:
+                sent += f.result()
+        return sent
+
     # --- EXECUTE ------------------------------------------------------------
-    def execute(self) -> _QueryResponse:
+    def execute(self, retries: int = 0, backoff: float = 0.5) -> _QueryResponse:
+        """
+        Send the request, retrying transient failures with exponential backoff (or
+        the server's Retry-After, up to UPLOAD_MAX_RETRY_AFTER seconds). Plain inserts are only retried when they cannot
+        have been applied (see UNSENT_ERRORS / REFUSED_STATUS); reads, upserts,
+        updates and deletes are safe to repeat. Every attempt is recorded in
+        metrics.REQUESTS (latency, status, bytes).
+        """
+        idempotent = self._method != "POST" or "merge-duplicates" in self._headers.get("Prefer", "")
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                resp = self._send()
+            except httpx.TransportError as e:
+                REQUESTS.record(self._table, self._method, None, time.perf_counter() - start,
+                                len(self._content or b""))
+                error = e
+            else:
+                REQUESTS.record(self._table, self._method, resp.status_code, resp.elapsed.total_seconds(),
+                                len(resp.request.content), len(resp.content))
+                try:
+                    return self._parse(resp)
+                except SupabaseError as e:
+                    error = e
+            status = getattr(error, "status_code", None)
+            if status is None:
+                retryable = idempotent or isinstance(error, UNSENT_ERRORS)
+            else:
+                retryable = status in (RETRYABLE_STATUS if idempotent else REFUSED_STATUS)
+            if attempt >= retries or not retryable:
+                raise error
+            delay = getattr(error, "retry_after", None)
+            if delay is None:
+                delay = backoff * (2 ** attempt) * (0.5 + random.random())
+            time.sleep(min(delay, UPLOAD_MAX_RETRY_AFTER))
+            attempt += 1
+
+    def _send(self) -> httpx.Response:
         client = self._http
         if self._method == "GET":
             resp = client.get(self._url, headers=self._headers, params=self._params)
+        elif self._method == "POST" and self._content is not None:
+            resp = client.post(
+                self._url,
+                headers=self._headers,
+                params=self._params,
+                content=self._content,
+            )
         elif self._method == "POST":
             resp = client.post(
                 self._url,
@@ -73,39 +292,209 @@ class _TableQuery:
                 params=self._params,
                 json=self._body,
             )
+        elif self._method == "PATCH":
+            resp = client.patch(
+                self._url,
+                headers={**self._headers, "Content-Type": "application/json"},
+                params=self._params,
+                json=self._body,
+            )
         elif self._method == "DELETE":
             resp = client.delete(self._url, headers=self._headers, params=self._params)
         else:
             raise ValueError(f"Unsupported method {self._method}")
+        return resp
 
+    @staticmethod
+    def _parse(resp: httpx.Response) -> _QueryResponse:
         if resp.status_code >= 400:
-            raise RuntimeError(f"Supabase error {resp.status_code}: {resp.text[:300]}")
+            retry_after = resp.headers.get("Retry-After", "")
+            raise SupabaseError(resp.status_code, resp.text, float(retry_after) if retry_after.isdigit() else None)
 
         try:
             data = resp.json()
         except Exception:
             data = []
 
-        return _QueryResponse(data if isinstance(data, list) else [])
+        return _QueryResponse(data if isinstance(data, list) else [], _total_count(resp))
+
+
+def _total_count(resp: httpx.Response) -> int | None:
+    """Total from a Content-Range header such as '0-999/123456' ('*' if not counted)."""
+    total = resp.headers.get("Content-Range", "").rpartition("/")[2]
+    return int(total) if total.isdigit() else None
+
+
+def _execute_chunk(query: _TableQuery, payload: bytes, n_rows: int, retries: int) -> int:
+    query.insert_encoded(payload).execute(retries=retries)
+    return n_rows
+
+
+def _execute_csv(query: _TableQuery, body: bytes, n_rows: int, retries: int, compress: bool) -> int:
+    """
+    Send one CSV chunk, gzip-compressed (in the worker thread; zlib releases the
+    GIL) unless disabled or already rejected. A rejected compressed body is sent
+    again plain, and once that succeeds later chunks are no longer compressed.
+    """
+    if compress and not _gzip_rejected.is_set():
+        query.insert_encoded(gzip.compress(body, CSV_GZIP_LEVEL), CSV_CONTENT_TYPE, "gzip")
+        try:
+            query.execute(retries=retries)
+            return n_rows
+        except SupabaseError as e:
+            if e.status_code not in GZIP_REJECTED_STATUS:
+                raise
+        query.insert_encoded(body, CSV_CONTENT_TYPE).execute(retries=retries)
+        if not _gzip_rejected.is_set():
+            _gzip_rejected.set()
+            print("Server rejected gzip request bodies; sending CSV uncompressed", file=sys.stderr)
+        return n_rows
+    query.insert_encoded(body, CSV_CONTENT_TYPE).execute(retries=retries)
+    return n_rows
+
+
+def _json_body(rows: list[dict]) -> bytes:
+    return json.dumps(rows, separators=(",", ":")).encode()
+
+
+def _csv_header(columns: Sequence[str]) -> str:
+    buf = io.StringIO()
+    csv.writer(buf, lineterminator="\n").writerow(columns)
+    return buf.getvalue()
+
+
+def _csv_body(header: str, rows: list[tuple]) -> bytes:
+    buf = io.StringIO()
+    buf.write(header)
+    csv.writer(buf, lineterminator="\n").writerows(rows)
+    return buf.getvalue().encode()
+
+
+def _csv_nulls(values: list) -> list:
+    """A column's values with None replaced by the NULL token (only copied when it has any)."""
+    if None not in values:
+        return values
+    return [CSV_NULL if v is None else v for v in values]
+
+
+def _encode_csv_chunks(columns: Sequence[str], batches: Iterable[Sequence[list]], max_bytes: int,
+                       max_rows: int) -> Iterator[tuple[bytes, int]]:
+    """Group column-ordered batches into CSV bodies (a header line, then one line per row) of at most max_bytes."""
+    rows = (row for batch in batches for row in zip(*map(_csv_nulls, batch)))
+    return _encode_chunks(rows, max_bytes, max_rows, encode=partial(_csv_body, _csv_header(columns)))
+
+
+def _encode_chunks(rows: Iterable, max_bytes: int, max_rows: int,
+                   encode: Callable[[list], bytes] = _json_body) -> Iterator[tuple[bytes, int]]:
+    """
+    Group rows into request bodies of at most max_bytes (JSON arrays by default).
+    The row count per chunk adapts to the observed bytes per row, so wide
+    tables get smaller chunks and narrow ones larger chunks.
+    """
+    target = min(1000, max_rows)
+    buffer: list = []
+    for row in rows:
+        buffer.append(row)
+        if len(buffer) >= target:
+            for payload, n in _split_to_fit(buffer, max_bytes, encode):
+                yield payload, n
+                target = max(1, min(max_rows, int(n * max_bytes / max(len(payload), 1) * 0.9)))
+            buffer = []
+    if buffer:
+        yield from _split_to_fit(buffer, max_bytes, encode)
+
+
+def _split_to_fit(rows: list, max_bytes: int, encode: Callable[[list], bytes]) -> Iterator[tuple[bytes, int]]:
+    payload = encode(rows)
+    if len(payload) <= max_bytes or len(rows) == 1:
+        yield payload, len(rows)
+        return
+    mid = len(rows) // 2
+    yield from _split_to_fit(rows[:mid], max_bytes, encode)
+    yield from _split_to_fit(rows[mid:], max_bytes, encode)
 
 
 class SupabaseClient:
     """Minimal Supabase REST client."""
 
-    def __init__(self, url: str, key: str):
+    def __init__(
+        self,
+        url: str,
+        key: str,
+        max_connections: int = HTTP_MAX_CONNECTIONS,
+        http2: bool = HTTP2_ENABLED,
+    ):
         self._url = url
         self._headers = {
             "apikey": key,
             "Authorization": f"Bearer {key}",
         }
-        self._http = httpx.Client(timeout=120)
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+        )
+        try:
+            self._http = httpx.Client(timeout=120, limits=limits, http2=http2)
+        except ImportError:
+            # http2=True needs the optional 'h2' package (pip install httpx[http2])
+            self._http = httpx.Client(timeout=120, limits=limits)
 
     def table(self, name: str) -> _TableQuery:
         return _TableQuery(name, self._headers, self._http)
 
+    def bulk_insert(self, table: str, rows: Iterable[dict], **kwargs) -> int:
+        """Concurrent, retried insert of many rows. See _TableQuery.bulk_insert."""
+        return self.table(table).bulk_insert(rows, **kwargs)
+
+    def bulk_insert_columns(self, table: str, columns: Sequence[str], batches: Iterable[Sequence[list]],
+                            **kwargs) -> int:
+        """Bulk load of column-ordered batches as CSV. See _TableQuery.bulk_insert_columns."""
+        return self.table(table).bulk_insert_columns(columns, batches, **kwargs)
+
+    # --- Storage ------------------------------------------------------------
+    def upload_file(self, bucket: str, name: str, path: str, content_type: str = "application/octet-stream"):
+        """
+        Upload a local file to a Storage bucket, replacing any existing object.
+        The body is streamed from the open file, so large snapshots are never
+        held in memory.
+        """
+        with open(path, "rb") as fh:
+            resp = self._http.post(
+                f"{STORAGE_BASE}/object/{bucket}/{name}",
+                headers={**self._headers, "Content-Type": content_type, "x-upsert": "true",
+                         "Content-Length": str(os.fstat(fh.fileno()).st_size)},
+                content=fh,
+            )
+        if resp.status_code >= 400:
+            raise SupabaseError(resp.status_code, resp.text)
+
+    def download_file(self, bucket: str, name: str, path: str, public: bool = True):
+        """Stream a Storage object to a local file (written atomically)."""
+        url = f"{STORAGE_BASE}/object/{'public/' if public else ''}{bucket}/{name}"
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with self._http.stream("GET", url, headers=self._headers) as resp:
+            if resp.status_code >= 400:
+                raise SupabaseError(resp.status_code, resp.read().decode(errors="replace"))
+            with open(tmp, "wb") as fh:
+                for block in resp.iter_bytes():
+                    fh.write(block)
+        os.replace(tmp, path)
+
+    def remove_files(self, bucket: str, names: list[str]):
+        resp = self._http.request(
+            "DELETE", f"{STORAGE_BASE}/object/{bucket}",
+            headers={**self._headers, "Content-Type": "application/json"},
+            json={"prefixes": names},
+        )
+        if resp.status_code >= 400:
+            raise SupabaseError(resp.status_code, resp.text)
+
 
 # ---------- Convenience singletons -----------------------------------------
 
+# With DATA_BACKEND=sqlite these return sqlite_client.SQLiteClient instances,
+# which have the same interface.
+
 _service_client: SupabaseClient | None = None
 _anon_client: SupabaseClient | None = None
 
@@ -114,7 +503,11 @@ def get_service_client() -> SupabaseClient:
     """Get a Supabase client with service role privileges (full access)."""
     global _service_client
     if _service_client is None:
-        _service_client = SupabaseClient(SUPABASE_URL, SUPABASE_SERVICE_KEY)
+        if DATA_BACKEND == "sqlite":
+            from sqlite_client import SQLiteClient
+            _service_client = SQLiteClient(SQLITE_PATH)
+        else:
+            _service_client = SupabaseClient(SUPABASE_URL, SUPABASE_SERVICE_KEY)
     return _service_client
 
 
@@ -122,5 +515,9 @@ def get_anon_client() -> SupabaseClient:
     """Get a Supabase client with anon privileges (read-only via RLS)."""
     global _anon_client
     if _anon_client is None:
-        _anon_client = SupabaseClient(SUPABASE_URL, SUPABASE_ANON_KEY)
-    return _anon_client
\ No newline at end of file
+        if DATA_BACKEND == "sqlite":
+            from sqlite_client import SQLiteClient
+            _anon_client = SQLiteClient(SQLITE_PATH, read_only=True)
+        else:
+            _anon_client = SupabaseClient(SUPABASE_URL, SUPABASE_ANON_KEY)
+    return _anon_client
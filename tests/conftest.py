@@ -0,0 +1,70 @@
+"""
+Shared fixtures. Tests run offline: local artifacts go to a temporary directory
+and anything that talks to the backend gets a SQLiteClient (see sqlite_client.py).
+"""
+
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# config refuses to load without these; no test sends a request to them
+for _name, _value in (("SUPABASE_URL", "http://localhost"), ("SUPABASE_ANON_KEY", "anon"),
+                      ("SUPABASE_SERVICE_KEY", "service")):
+    os.environ.setdefault(_name, _value)
+# Read by config at import time, so set before any project module is imported
+_ARTIFACTS = tempfile.mkdtemp(prefix="pipeline-tests-")
+for _name in ("MODEL_DIR", "SNAPSHOT_DIR", "RUN_REPORT_DIR", "PIPELINE_CACHE_DIR"):
+    os.environ[_name] = os.path.join(_ARTIFACTS, _name.lower())
+
+import pandas as pd  # noqa: E402
+import pytest  # noqa: E402
+
+import supabase_client  # noqa: E402
+from ml_pipeline import read_preprocessed  # noqa: E402
+from sqlite_client import SQLiteClient  # noqa: E402
+
+SOURCE_CSV = os.path.join(ROOT, "cloud_resource_allocation_dataset.csv")
+
+
+@pytest.fixture(scope="session")
+def raw_frame() -> pd.DataFrame:
+    """The shipped dataset, as read from the CSV."""
+    return pd.read_csv(SOURCE_CSV)
+
+
+@pytest.fixture(scope="session")
+def preprocessed(tmp_path_factory):
+    """(frame, schema) of the first 4000 rows; the rest is left for append tests."""
+    path = tmp_path_factory.mktemp("csv") / "base.csv"
+    pd.read_csv(SOURCE_CSV, nrows=4000).to_csv(path, index=False)
+    return read_preprocessed(str(path))
+
+
+@pytest.fixture
+def sqlite_backend(tmp_path, monkeypatch) -> SQLiteClient:
+    """A fresh SQLite database served by get_service_client() and get_anon_client()."""
+    client = SQLiteClient(str(tmp_path / "pipeline.db"))
+    monkeypatch.setattr(supabase_client, "_service_client", client)
+    monkeypatch.setattr(supabase_client, "_anon_client", SQLiteClient(client.path, read_only=True))
+    return client
+
+
+@pytest.fixture(scope="session")
+def cluster_results(preprocessed) -> dict:
+    """
+    The stage results build_cluster_state reads from an in-memory run at K=3,
+    with an elbow sweep reduced to K=2..4 to keep the fits quick.
+    """
+    from sklearn.cluster import KMeans
+
+    import process
+    from ml_pipeline import scale_features
+
+    scale_out = scale_features(preprocessed[0])
+    models = {k: KMeans(n_clusters=k, random_state=42, n_init=3).fit(scale_out[0]) for k in (2, 3, 4)}
+    results = {"preprocess": preprocessed, "scale": scale_out, "elbow": ([], models)}
+    results["kmeans"] = process.kmeans_stage(preprocessed, scale_out, results["elbow"], 3)
+    results["histograms"] = process.histograms_stage(results["kmeans"], 3)
+    return results
@@ -0,0 +1,101 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import process
+from conftest import SOURCE_CSV
+from ml_pipeline import summarize_frame, unpack_labels
+
+
+@pytest.fixture
+def published_run(sqlite_backend, cluster_results) -> str:
+    """A full in-memory run of the first 4000 rows, uploaded to SQLite with its state saved."""
+    run_id = process.new_run_id()
+    process.upload_stage("preprocess", cluster_results["preprocess"], run_id)
+    process.upload_stage("summary", summarize_frame(cluster_results["preprocess"][0]), run_id)
+    process.upload_stage("kmeans", cluster_results["kmeans"], run_id)
+    process.upload_stage("histograms", cluster_results["histograms"], run_id)
+    process.publish_state(process.build_cluster_state(run_id, cluster_results))
+    process.publish_run(run_id)
+    return run_id
+
+
+@pytest.fixture
+def new_rows(tmp_path) -> str:
+    path = tmp_path / "new_rows.csv"
+    pd.read_csv(SOURCE_CSV, skiprows=range(1, 4001)).to_csv(path, index=False)
+    return str(path)
+
+
+def _rows(client, table: str, run_id: str, columns: str = "*") -> list:
+    return client.table(table).select(columns).eq("run_id", run_id).order("id").execute().data
+
+
+def test_append_totals(sqlite_backend, published_run, new_rows):
+    client = sqlite_backend
+    n_new = len(pd.read_csv(new_rows))
+    histogram_rows = len(_rows(client, "histogram_data", published_run))
+    report = {}
+    process.append_results(new_rows, published_run, chunk_rows=1000, report=report)
+
+    total = 4000 + n_new
+    assert report["rows"] == n_new and report["total_rows"] == total and report["staged"] is False
+    for table in process.APPEND_TABLES:
+        assert len(_rows(client, table, published_run, "id")) == total
+        assert _rows(client, table, process.staging_run_id(published_run), "id") == []
+
+    clustered = pd.DataFrame(_rows(client, "clustered_data", published_run, "cluster_id,cluster_ids"))
+    summary = pd.DataFrame(_rows(client, "cluster_summary", published_run)).sort_values("cluster_id")
+    assert summary["record_count"].tolist() == np.bincount(clustered["cluster_id"], minlength=3).tolist()
+
+    by_k = pd.DataFrame(_rows(client, "cluster_summary_by_k", published_run))
+    assert sorted(by_k["k"].unique()) == [2, 3, 4]
+    for j, (k, group) in enumerate(by_k.groupby("k")):
+        labels = unpack_labels(clustered["cluster_ids"].to_numpy(), j)
+        assert group.sort_values("cluster_id")["record_count"].tolist() == np.bincount(labels, minlength=k).tolist()
+
+    stats = _rows(client, "data_stats", published_run)
+    assert len(stats) == 6 and {r["row_count"] for r in stats} == {total}
+
+    # Upserted in place: the same histogram rows, now counting every row
+    histograms = _rows(client, "histogram_data", published_run)
+    assert len(histograms) == histogram_rows
+    cpu = [r for r in histograms if r["kind"] == "hist" and r["feature_x"] == "cpu_usage"]
+    assert sum(sum(json.loads(r["counts"])) for r in cpu) == total
+
+    state = process.fetch_state(published_run)
+    assert state.n_rows == total and state.summary.counts.sum() == total
+    appended = clustered["cluster_id"].to_numpy()[4000:]
+    np.testing.assert_array_equal(appended, state.assign(state.preprocess(pd.read_csv(new_rows))))
+
+
+def test_failed_append_leaves_the_run_unchanged(sqlite_backend, published_run, new_rows, monkeypatch):
+    client = sqlite_backend
+    staged = process.staging_run_id(published_run)
+    insert_frame, calls = process.insert_frame, []
+
+    def failing_insert(table, df, run_id=None, chunk_size=1000):
+        calls.append(table)
+        if len(calls) == 3:
+            raise ConnectionError("connection reset")
+        return insert_frame(table, df, run_id, chunk_size)
+
+    monkeypatch.setattr(process, "insert_frame", failing_insert)
+    report = {}
+    with pytest.raises(ConnectionError):
+        process.append_results(new_rows, published_run, chunk_rows=1000, report=report)
+    assert report["staged"] is True
+    assert len(_rows(client, "raw_data", staged, "id")) == 1000
+    for table in process.APPEND_TABLES:
+        assert len(_rows(client, table, published_run, "id")) == 4000
+    assert process.fetch_state(published_run).n_rows == 4000
+
+    # The next append clears the leftovers before staging its own rows
+    monkeypatch.setattr(process, "insert_frame", insert_frame)
+    process.append_results(new_rows, published_run, chunk_rows=1000)
+    n_new = len(pd.read_csv(new_rows))
+    for table in process.APPEND_TABLES:
+        assert len(_rows(client, table, published_run, "id")) == 4000 + n_new
+        assert _rows(client, table, staged, "id") == []
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+import process
+from cluster_state import ARTIFACT_VERSION, ClusterState
+from ml_pipeline import run_kmeans, unpack_labels
+from predict import Predictor
+
+
+def test_save_load_round_trip(cluster_results, tmp_path):
+    state = process.build_cluster_state("run-state", cluster_results)
+    path = state.save(str(tmp_path / "run-state.joblib"))
+    loaded = ClusterState.load(path)
+
+    assert loaded.run_id == "run-state" and loaded.version == ARTIFACT_VERSION
+    assert loaded.n_rows == state.n_rows == len(cluster_results["preprocess"][0])
+    assert loaded.numeric_cols == state.numeric_cols
+    assert loaded.schema.to_dict() == state.schema.to_dict()
+    np.testing.assert_array_equal(loaded.model.cluster_centers_, state.model.cluster_centers_)
+    np.testing.assert_array_equal(loaded.summary.counts, state.summary.counts)
+    assert sorted(loaded.alternatives) == [2, 3, 4]
+    assert loaded.histograms.to_records() == state.histograms.to_records()
+    assert loaded.stats.stats_records() == state.stats.stats_records()
+
+
+def test_load_rejects_other_files(tmp_path):
+    import joblib
+
+    path = str(tmp_path / "other.joblib")
+    joblib.dump({"not": "a state"}, path)
+    with pytest.raises(ValueError):
+        ClusterState.load(path)
+
+
+def test_assign_matches_run_kmeans(cluster_results):
+    state = process.build_cluster_state("run-assign", cluster_results)
+    df = cluster_results["preprocess"][0]
+    clustered_df = cluster_results["kmeans"][0]
+    np.testing.assert_array_equal(state.assign(df), clustered_df["cluster_id"].to_numpy())
+    alternatives = state.alternative_labels(df)
+    for j in range(alternatives.shape[1]):
+        np.testing.assert_array_equal(alternatives[:, j], unpack_labels(clustered_df["cluster_ids"].to_numpy(), j))
+
+
+def test_predictor_matches_run_kmeans(cluster_results, raw_frame, tmp_path):
+    state = process.build_cluster_state("run-predict", cluster_results)
+    predictor = Predictor.load(model_path=state.save(str(tmp_path / "run-predict.joblib")))
+    df, _ = cluster_results["preprocess"]
+    scaled, _ = cluster_results["scale"]
+    clustered_df, _, _ = run_kmeans(df, 3, scaled_data=scaled, model=state.model)
+    expected = clustered_df["cluster_id"].to_numpy()
+
+    raw = raw_frame.iloc[: len(df)]
+    labels, distances = predictor.predict(raw)
+    np.testing.assert_array_equal(labels, expected)
+    centers = state.model.cluster_centers_[expected]
+    np.testing.assert_allclose(distances, np.linalg.norm(scaled - centers, axis=1), rtol=1e-6)
+
+    # Dict records take the same path as the service's JSON bodies
+    records = raw.head(200).to_dict("records")
+    np.testing.assert_array_equal(predictor.predict(records)[0], expected[:200])
+    assert predictor.predict_one(records[0])[0] == expected[0]
+
+
+def test_predictor_fills_missing_values_like_preprocessing(cluster_results, raw_frame):
+    state = process.build_cluster_state("run-missing", cluster_results)
+    predictor = Predictor(state)
+    raw = raw_frame.head(50).copy()
+    raw.loc[raw.index[::3], "CPU_Usage (%)"] = np.nan
+    raw.loc[raw.index[1::3], "Workload_Type"] = None
+    labels, _ = predictor.predict(raw)
+    np.testing.assert_array_equal(labels, state.assign(state.preprocess(raw)))
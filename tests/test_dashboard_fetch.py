@@ -0,0 +1,75 @@
+"""
+dashboard.fetch_table against a SQLite backend. dashboard.py is a Streamlit
+script, so importing it renders the (empty) app once in bare mode; the cached
+fetch functions then work as plain calls.
+"""
+
+import importlib
+
+import pytest
+
+import sqlite_client
+import supabase_client
+from snapshot import Match
+from sqlite_client import SQLiteClient
+
+N_ROWS = 2503  # not a multiple of any page size used below
+
+
+@pytest.fixture(scope="module")
+def dashboard(tmp_path_factory):
+    client = SQLiteClient(str(tmp_path_factory.mktemp("dashboard") / "pipeline.db"))
+    # Rows of two runs interleaved, so run_id filtering and id ordering both matter
+    client.bulk_insert("points", (
+        {"run_id": run_id, "cluster_id": i % 4, "cluster_ids": f"{i % 2}{i % 5}", "x": i * 0.5}
+        for i in range(N_ROWS) for run_id in (("r1", "r2") if i % 2 else ("r1",))
+    ))
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(supabase_client, "_service_client", client)
+        mp.setattr(supabase_client, "_anon_client", SQLiteClient(client.path, read_only=True))
+        module = importlib.import_module("dashboard")
+        yield module
+
+
+@pytest.fixture
+def expected(dashboard):
+    rows = supabase_client.get_anon_client().table("points").select("*").eq("run_id", "r1").order("id").execute().data
+    assert len(rows) == N_ROWS
+    return rows
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(dashboard):
+    dashboard.fetch_table.clear()
+
+
+@pytest.mark.parametrize("page_size", [100, 1000, 5000])
+def test_every_row_once_in_id_order(dashboard, expected, page_size, monkeypatch):
+    monkeypatch.setattr(dashboard, "FETCH_PAGE_SIZE", page_size)
+    rows = dashboard.fetch_table("points", "r1")
+    assert [r["id"] for r in rows] == [r["id"] for r in expected]
+    assert rows == expected
+
+
+def test_server_page_cap_below_ours(dashboard, expected, monkeypatch):
+    # PostgREST's max-rows silently truncates pages larger than the server allows
+    server_range = sqlite_client._SQLiteQuery.range
+    monkeypatch.setattr(sqlite_client._SQLiteQuery, "range", lambda self, start, end: server_range(
+        self, start, min(end, start + 63)))
+    monkeypatch.setattr(dashboard, "FETCH_PAGE_SIZE", 1000)
+    rows = dashboard.fetch_table("points", "r1")
+    assert [r["id"] for r in rows] == [r["id"] for r in expected]
+
+
+def test_limit_columns_and_filters(dashboard, expected, monkeypatch):
+    monkeypatch.setattr(dashboard, "FETCH_PAGE_SIZE", 100)
+    assert dashboard.fetch_table("points", "r1", limit=250) == expected[:250]
+    assert dashboard.fetch_table("points", "r1", limit=0) == []
+    assert dashboard.fetch_table("points", "r1", columns="id,x") == [{"id": r["id"], "x": r["x"]} for r in expected]
+
+    picked = dashboard.fetch_table("points", "r1", filters=(("cluster_id", (1, 2)),))
+    assert picked == [r for r in expected if r["cluster_id"] in (1, 2)]
+    matched = dashboard.fetch_table("points", "r1", filters=(("cluster_ids", Match("^.[34]")),))
+    assert matched == [r for r in expected if r["cluster_ids"][1] in "34"]
+    assert dashboard.fetch_table("points", "no-such-run") == []
+    assert dashboard.fetch_table("absent", "r1") == []
@@ -0,0 +1,34 @@
+"""Dashboard pages rendered with Streamlit's AppTest against a SQLite backend."""
+
+import pytest
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+import config
+import supabase_client
+from conftest import ROOT
+from sqlite_client import SQLiteClient
+
+
+@pytest.fixture
+def run_without_histograms(tmp_path, monkeypatch):
+    client = SQLiteClient(str(tmp_path / "pipeline.db"))
+    client.table("pipeline_version").upsert({"id": 1, "run_id": "r1"}, on_conflict="id").execute()
+    client.bulk_insert("clustered_data", (
+        {"run_id": "r1", "cluster_id": i % 2, "cpu_usage": i * 1.0, "memory_usage": i % 7 * 1.0} for i in range(50)
+    ))
+    client.bulk_insert("cluster_summary", [{"run_id": "r1", "cluster_id": k, "record_count": 25} for k in (0, 1)])
+    monkeypatch.setattr(supabase_client, "_service_client", client)
+    monkeypatch.setattr(supabase_client, "_anon_client", SQLiteClient(client.path, read_only=True))
+    monkeypatch.setattr(config, "DASHBOARD_PREFETCH", False)
+    st.cache_data.clear()  # other modules' fetches are cached under the same run id
+
+
+def test_explorer_plots_a_run_without_histograms(run_without_histograms):
+    at = AppTest.from_file(f"{ROOT}/dashboard.py", default_timeout=60)
+    at.run()
+    at.sidebar.radio[0].set_value("Cluster Explorer").run()
+    assert not at.exception
+    assert not at.warning
+    assert [s.options for s in at.selectbox] == [["cpu_usage", "memory_usage"]] * 2
+    assert "50 points (SVG)" in [c.value for c in at.caption]
@@ -0,0 +1,206 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import ml_pipeline
+from ml_pipeline import (
+    QuantileSketch,
+    StreamingStats,
+    compute_correlation,
+    compute_feature_stats,
+    compute_outliers,
+    elbow_sweep,
+    iter_frame_chunks,
+    label_pattern,
+    pack_labels,
+    read_preprocessed,
+    run_kmeans,
+    scale_features,
+    summarize_frame,
+    unpack_labels,
+)
+from conftest import SOURCE_CSV
+
+
+@pytest.fixture(scope="module")
+def scaled_sample(tmp_path_factory):
+    path = tmp_path_factory.mktemp("csv") / "sample.csv"
+    pd.read_csv(SOURCE_CSV, nrows=1500).to_csv(path, index=False)
+    df, _ = read_preprocessed(str(path))
+    return df, scale_features(df)[0]
+
+
+# -- Elbow sweep -------------------------------------------------------------
+
+@pytest.mark.parametrize("n_jobs", [None, 1, 3, -1])
+def test_elbow_models_match_run_kmeans(scaled_sample, n_jobs):
+    df, scaled = scaled_sample
+    rows, models = elbow_sweep(scaled, range(1, 6), keep_all=True, n_jobs=n_jobs)
+    assert [r["k"] for r in rows] == [1, 2, 3, 4, 5]
+    inertias = [r["inertia"] for r in rows]
+    assert inertias == sorted(inertias, reverse=True)
+    clustered_df, _, _ = run_kmeans(df, 3, scaled)
+    np.testing.assert_array_equal(models[3].labels_, clustered_df["cluster_id"].to_numpy())
+
+
+def test_threaded_fits_run_single_threaded(scaled_sample, monkeypatch):
+    from threadpoolctl import threadpool_info
+
+    seen = []
+    fit_k = ml_pipeline._fit_k
+
+    def spy(scaled, k, minibatch, sample_idx, single_thread=False):
+        with ml_pipeline._thread_limit(1 if single_thread else None, "openmp"):
+            seen.append({p["user_api"]: p["num_threads"] for p in threadpool_info()})
+        return fit_k(scaled, k, minibatch, sample_idx, single_thread)
+
+    monkeypatch.setattr(ml_pipeline, "_fit_k", spy)
+    blas_before = [p["num_threads"] for p in threadpool_info() if p["user_api"] == "blas"]
+    elbow_sweep(scaled_sample[1], range(1, 5), n_jobs=2)
+    assert seen and all(threads == {"blas": 1, "openmp": 1} for threads in seen)
+    # The process-wide BLAS limit is lifted once the sweep is done
+    assert [p["num_threads"] for p in threadpool_info() if p["user_api"] == "blas"] == blas_before
+
+
+def test_default_thread_count_follows_the_budget(scaled_sample, monkeypatch):
+    monkeypatch.setattr(ml_pipeline, "_thread_budget", lambda: 2)
+    used = []
+    parallel = ml_pipeline.Parallel
+
+    def spy(n_jobs, **kwargs):
+        used.append(n_jobs)
+        return parallel(n_jobs=n_jobs, **kwargs)
+
+    monkeypatch.setattr(ml_pipeline, "Parallel", spy)
+    elbow_sweep(scaled_sample[1], range(1, 11))
+    elbow_sweep(scaled_sample[1], range(1, 11), n_jobs=-1)
+    assert used == [2, 10]
+
+
+# -- summarize_frame -------------------------------------------------------
+
+def test_summarize_frame_matches_separate_functions(preprocessed):
+    df, _ = preprocessed
+    df = df.assign(cluster_id=np.arange(len(df)) % 3)
+    stats, outliers, correlation = summarize_frame(df)
+    assert stats == compute_feature_stats(df)
+    assert outliers == compute_outliers(df)
+    expected = compute_correlation(df)
+    assert correlation["columns"] == expected["columns"]
+    np.testing.assert_allclose(correlation["matrix"], expected["matrix"], rtol=1e-12, atol=1e-12)
+
+
+def test_summarize_frame_with_missing_values(preprocessed):
+    df, _ = preprocessed
+    df = df.copy()
+    df.loc[df.index[::50], df.columns[0]] = np.nan
+    stats, outliers, correlation = summarize_frame(df)
+    assert stats == compute_feature_stats(df)
+    assert outliers == compute_outliers(df)
+    np.testing.assert_allclose(correlation["matrix"], compute_correlation(df)["matrix"])
+
+
+def test_summarize_frame_odd_and_even_lengths():
+    rng = np.random.default_rng(4)
+    for n in (2, 3, 10, 11):
+        df = pd.DataFrame({"cpu_usage": rng.normal(size=n), "memory_usage": rng.integers(0, 100, n)})
+        stats, outliers, _ = summarize_frame(df)
+        assert stats == compute_feature_stats(df)
+        assert outliers == compute_outliers(df)
+
+
+# -- Streaming statistics --------------------------------------------------
+
+def _rank_error(values: np.ndarray, estimate: float, q: float) -> float:
+    """Distance between q and the rank of estimate in values, as a fraction of n."""
+    ordered = np.sort(values)
+    lo = np.searchsorted(ordered, estimate, side="left")
+    hi = np.searchsorted(ordered, estimate, side="right")
+    target = q * len(values)
+    return max(0.0, lo - target, target - hi) / len(values)
+
+
+def test_quantile_sketch_against_numpy():
+    values = np.random.default_rng(2).normal(size=200_000)
+    sketch = QuantileSketch(k=400)
+    for chunk in np.array_split(values, 40):
+        sketch.update(chunk)
+    assert sketch.n == len(values)
+    for q in (0.01, 0.25, 0.5, 0.75, 0.99):
+        assert _rank_error(values, sketch.quantile(q), q) < 0.01
+
+
+def test_quantile_sketch_merge_and_nan():
+    rng = np.random.default_rng(3)
+    values = rng.exponential(size=100_000)
+    left, right = QuantileSketch(k=400, seed=1), QuantileSketch(k=400, seed=2)
+    left.update(values[:30_000])
+    right.update(np.concatenate([values[30_000:], [np.nan] * 100]))
+    merged = left.merge(right)
+    assert merged.n == len(values)
+    estimates = merged.quantile([0.25, 0.5, 0.75])
+    for q, estimate in zip((0.25, 0.5, 0.75), estimates):
+        assert _rank_error(values, estimate, q) < 0.01
+    assert np.isnan(QuantileSketch().quantile(0.5))
+
+
+def test_streaming_stats_against_numpy(preprocessed):
+    df, _ = preprocessed
+    columns = df.select_dtypes(include=[np.number]).columns.tolist()
+    stats = StreamingStats(columns)
+    other = StreamingStats(columns)
+    for i, chunk in enumerate(iter_frame_chunks(df, 700)):
+        (stats if i % 2 else other).update(chunk)
+    stats.merge(other)
+
+    values = df[columns].to_numpy(dtype=np.float64)
+    assert stats.count == len(df)
+    np.testing.assert_allclose(stats.mean, values.mean(axis=0), rtol=1e-10)
+    np.testing.assert_allclose(np.sqrt(stats.m2 / (stats.count - 1)), values.std(axis=0, ddof=1), rtol=1e-10)
+    np.testing.assert_array_equal(stats.min, values.min(axis=0))
+    np.testing.assert_array_equal(stats.max, values.max(axis=0))
+
+    expected = {r["feature_name"]: r for r in compute_feature_stats(df)}
+    for record in stats.stats_records():
+        exact = expected[record["feature_name"]]
+        for key in ("mean_val", "std_val", "min_val", "max_val", "row_count"):
+            assert record[key] == pytest.approx(exact[key], abs=1e-3), key
+        column = df[record["feature_name"]].to_numpy()
+        assert _rank_error(column, record["median_val"], 0.5) < 0.01
+
+
+# -- Packed labels ---------------------------------------------------------
+
+def test_pack_unpack_round_trip():
+    rng = np.random.default_rng(0)
+    labels = np.stack([rng.integers(0, k, 500) for k in range(1, 11)], axis=1)
+    packed = pack_labels(labels)
+    assert packed.shape == (500,)
+    assert all(len(s) == 10 for s in packed)
+    for position in range(labels.shape[1]):
+        np.testing.assert_array_equal(unpack_labels(packed, position), labels[:, position])
+    # What the database hands back is a list of str
+    np.testing.assert_array_equal(unpack_labels(list(packed), 9), labels[:, 9])
+
+
+def test_pack_labels_uses_base36_digits():
+    packed = pack_labels(np.array([[0, 9, 10, 35]]))
+    assert packed[0] == "09az"
+    np.testing.assert_array_equal(unpack_labels(packed, 3), [35])
+
+
+def test_pack_labels_edge_cases():
+    with pytest.raises(ValueError):
+        pack_labels(np.array([[36]]))
+    assert list(pack_labels(np.empty((3, 0), dtype=int))) == ["", "", ""]
+    assert unpack_labels(np.array([], dtype="U1"), 0).size == 0
+
+
+def test_label_pattern_matches_unpacked_labels():
+    import re
+
+    labels = np.random.default_rng(1).integers(0, 6, (200, 4))
+    packed = pack_labels(labels)
+    pattern = re.compile(label_pattern(2, [1, 4]))
+    matched = np.array([pattern.search(s) is not None for s in packed])
+    np.testing.assert_array_equal(matched, np.isin(labels[:, 2], [1, 4]))
@@ -0,0 +1,87 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from process import INT_COLUMNS, frame_columns, frame_to_records, iter_column_batches, iter_record_batches
+
+
+def _iterrows_record(row, columns) -> dict:
+    """The serializer process.py used before the columnar one (one Series per row)."""
+    record = {}
+    for col in columns:
+        val = row[col]
+        if pd.isna(val):
+            record[col] = None
+        elif col in INT_COLUMNS or isinstance(val, (np.integer,)):
+            record[col] = int(val)
+        elif isinstance(val, (np.floating,)):
+            record[col] = float(val)
+        else:
+            record[col] = val
+    return record
+
+
+def _iterrows_records(df: pd.DataFrame, run_id=None) -> list:
+    records = [_iterrows_record(row, df.columns) for _, row in df.iterrows()]
+    return [{**r, "run_id": run_id} for r in records] if run_id is not None else records
+
+
+def _typed(records: list) -> list:
+    """Records with each value's type, so 1 == 1.0 == True cannot hide a change of type."""
+    def kind(value):
+        if isinstance(value, (bool, np.bool_)):
+            return "bool"
+        if isinstance(value, (int, np.integer)):
+            return "int"
+        if isinstance(value, float):
+            return "float"
+        return type(value).__name__
+    return [{k: (kind(v), v) for k, v in r.items()} for r in records]
+
+
+@pytest.fixture
+def mixed_frame() -> pd.DataFrame:
+    n = 2500
+    rng = np.random.default_rng(0)
+    floats = rng.normal(size=n)
+    floats[::7] = np.nan
+    stamps = pd.Series(pd.date_range("2024-01-01", periods=n, freq="min"))
+    stamps[::11] = pd.NaT
+    return pd.DataFrame({
+        "cpu_usage": floats,
+        "memory_usage": rng.normal(size=n).astype(np.float32),
+        "task_priority": rng.integers(0, 3, n),
+        "count": rng.integers(-5, 5, n).astype(np.int8),
+        # INT_COLUMNS stored as float with gaps, as after a join
+        "cluster_id": np.where(np.arange(n) % 13 == 0, np.nan, rng.integers(0, 4, n)).astype(float),
+        "workload_type_low": rng.random(n) < 0.5,
+        "flag": rng.random(n) < 0.1,
+        "name": pd.Series(rng.choice(["batch", "web", "ml"], n), dtype=object).where(np.arange(n) % 5 != 0, None),
+        "seen_at": stamps,
+        "seen_at_ns": stamps.astype("datetime64[ns]"),
+        "seen_at_utc": stamps.dt.tz_localize("UTC"),
+    })
+
+
+def test_records_match_iterrows(mixed_frame):
+    expected = _iterrows_records(mixed_frame)
+    assert _typed(frame_to_records(mixed_frame)) == _typed(expected)
+    batches = list(iter_record_batches(mixed_frame, chunk_size=1000, run_id="r1"))
+    assert [len(b) for b in batches] == [1000, 1000, 500]
+    assert _typed([r for b in batches for r in b]) == _typed(_iterrows_records(mixed_frame, "r1"))
+
+
+def test_column_batches_match_iterrows(mixed_frame):
+    columns = frame_columns(mixed_frame, "r1")
+    assert columns == list(mixed_frame.columns) + ["run_id"]
+    rows = [dict(zip(columns, row)) for batch in iter_column_batches(mixed_frame, 999, "r1") for row in zip(*batch)]
+    assert _typed(rows) == _typed(_iterrows_records(mixed_frame, "r1"))
+
+
+def test_numeric_records_are_plain_json(mixed_frame):
+    numeric = mixed_frame.select_dtypes(include=[np.number, bool])
+    records = frame_to_records(numeric)
+    assert json.loads(json.dumps(records)) == records
+    assert frame_to_records(numeric.iloc[:0]) == []
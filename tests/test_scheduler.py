@@ -0,0 +1,98 @@
+import os
+
+import pytest
+
+from scheduler import Stage, StageTiming, critical_path, format_report, run_stages
+
+
+# Stage functions live at module level so spawned pool workers can import them
+
+def source(n):
+    return list(range(n))
+
+
+def total(values):
+    return sum(values)
+
+
+def scaled(values, factor=1):
+    return [v * factor for v in values]
+
+
+def combine(a, b):
+    return a + sum(b)
+
+
+def pid():
+    return os.getpid()
+
+
+def fail(_):
+    raise ZeroDivisionError("stage failed")
+
+
+def _graph():
+    return [
+        Stage("combine", combine, deps=("total", "scaled")),
+        Stage("scaled", scaled, deps=("source",), kwargs={"factor": 3}),
+        Stage("total", total, deps=("source",)),
+        Stage("source", source, kwargs={"n": 10}),
+    ]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_stages_run_after_their_dependencies(workers):
+    order = []
+    stages = _graph()
+    results, timings = run_stages(stages, workers, on_result=lambda name, _: order.append(name))
+    assert results == {"source": list(range(10)), "total": 45, "scaled": [3 * v for v in range(10)], "combine": 180}
+    assert sorted(order) == sorted(s.name for s in stages)
+    for s in stages:
+        assert all(order.index(d) < order.index(s.name) for d in s.deps)
+        assert timings[s.name].start >= max((timings[d].end for d in s.deps), default=0)
+
+
+def test_local_stages_run_in_the_parent():
+    results, _ = run_stages([Stage("pooled", pid), Stage("local", pid, local=True)], workers=2)
+    assert results["local"] == os.getpid()
+    assert results["pooled"] != os.getpid()
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_cycle_is_an_error(workers):
+    stages = [Stage("source", source, kwargs={"n": 1}),
+              Stage("a", total, deps=("b",)), Stage("b", total, deps=("a",))]
+    with pytest.raises(ValueError, match="cycle"):
+        run_stages(stages, workers)
+
+
+def test_unknown_dependency_and_duplicate_names():
+    with pytest.raises(ValueError, match="unknown stages"):
+        run_stages([Stage("total", total, deps=("missing",))], workers=1)
+    with pytest.raises(ValueError, match="Duplicate"):
+        run_stages([Stage("a", pid), Stage("a", pid)], workers=1)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_stage_exception_propagates(workers):
+    seen = []
+    stages = [Stage("source", source, kwargs={"n": 3}), Stage("broken", fail, deps=("source",))]
+    with pytest.raises(ZeroDivisionError, match="stage failed"):
+        run_stages(stages, workers, on_result=lambda name, _: seen.append(name))
+    assert seen == ["source"]
+
+
+def test_critical_path():
+    stages = [
+        Stage("load", pid),
+        Stage("stats", pid, deps=("load",)),
+        Stage("fit", pid, deps=("load",)),
+        Stage("plot", pid, deps=("stats", "fit")),
+        Stage("side", pid),
+    ]
+    spans = {"load": (0, 1), "stats": (1, 3), "fit": (1, 6), "plot": (6, 7), "side": (0, 4)}
+    timings = {name: StageTiming(name, start, end, peak_rss_mb=100.0) for name, (start, end) in spans.items()}
+    path, seconds = critical_path(stages, timings)
+    assert path == ["load", "fit", "plot"]
+    assert seconds == pytest.approx(7.0)
+    assert "critical path: load -> fit -> plot (7.00s; serial sum 13.00s)" in format_report(stages, timings)
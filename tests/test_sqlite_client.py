@@ -0,0 +1,113 @@
+import gzip
+import json
+
+import pytest
+
+from sqlite_client import SQLiteClient
+from supabase_client import SupabaseError
+
+ROWS = [
+    {"run_id": "a", "cluster_id": 0, "cluster_ids": "01", "value": 1.5},
+    {"run_id": "a", "cluster_id": 1, "cluster_ids": "12", "value": 2.5},
+    {"run_id": "a", "cluster_id": 2, "cluster_ids": "23", "value": None},
+    {"run_id": "b", "cluster_id": 0, "cluster_ids": "00", "value": 4.0},
+]
+
+
+@pytest.fixture
+def client(tmp_path) -> SQLiteClient:
+    client = SQLiteClient(str(tmp_path / "test.db"))
+    client.table("rows").insert(ROWS).execute()
+    return client
+
+
+def _ids(response) -> list:
+    return [(r["run_id"], r["cluster_id"]) for r in response.data]
+
+
+def test_filters(client):
+    query = client.table("rows").select("run_id,cluster_id")
+    assert _ids(query.eq("run_id", "a").order("cluster_id").execute()) == [("a", 0), ("a", 1), ("a", 2)]
+    assert _ids(client.table("rows").select("*").neq("run_id", "a").execute()) == [("b", 0)]
+    assert _ids(client.table("rows").select("*").eq("run_id", "a").gte("cluster_id", 1).order("id").execute()) == \
+        [("a", 1), ("a", 2)]
+    assert _ids(client.table("rows").select("*").in_("cluster_id", [2, 5]).execute()) == [("a", 2)]
+    assert client.table("rows").select("*").in_("cluster_id", []).execute().data == []
+    # match is a regular expression, as PostgREST's ~ operator
+    assert _ids(client.table("rows").select("*").match("cluster_ids", "^.[12]").order("id").execute()) == \
+        [("a", 0), ("a", 1)]
+
+
+def test_order_range_and_count(client):
+    response = client.table("rows").select("cluster_id", count="exact").eq("run_id", "a") \
+        .order("cluster_id", desc=True).range(1, 2).execute()
+    assert [r["cluster_id"] for r in response.data] == [1, 0]
+    assert response.count == 3
+    assert client.table("rows").select("*").execute().count is None
+
+
+def test_missing_table_and_column(client):
+    response = client.table("absent").select("*", count="exact").execute()
+    assert response.data == [] and response.count == 0
+    with pytest.raises(SupabaseError) as excinfo:
+        client.table("rows").select("no_such_column").execute()
+    assert excinfo.value.status_code == 400
+    with pytest.raises(SupabaseError):
+        client.table("rows").select("*").eq("no_such_column", 1).execute()
+
+
+def test_upsert_updates_on_conflict(client):
+    stats = client.table("stats")
+    stats.upsert([{"run_id": "a", "feature_name": "cpu", "mean_val": 1.0},
+                  {"run_id": "a", "feature_name": "mem", "mean_val": 2.0}], on_conflict="run_id,feature_name").execute()
+    client.table("stats").upsert({"run_id": "a", "feature_name": "cpu", "mean_val": 5.0},
+                                 on_conflict="run_id,feature_name").execute()
+    client.table("stats").upsert({"run_id": "b", "feature_name": "cpu", "mean_val": 7.0},
+                                 on_conflict="run_id,feature_name").execute()
+    rows = client.table("stats").select("run_id,feature_name,mean_val").order("id").execute().data
+    assert [(r["run_id"], r["feature_name"], r["mean_val"]) for r in rows] == \
+        [("a", "cpu", 5.0), ("a", "mem", 2.0), ("b", "cpu", 7.0)]
+
+
+def test_update_and_delete(client):
+    client.table("rows").update({"run_id": "c"}).eq("run_id", "a").gte("cluster_id", 1).execute()
+    assert _ids(client.table("rows").select("*").eq("run_id", "c").order("id").execute()) == [("c", 1), ("c", 2)]
+    client.table("rows").delete().eq("run_id", "c").execute()
+    assert _ids(client.table("rows").select("*").order("id").execute()) == [("a", 0), ("b", 0)]
+
+
+def test_bulk_insert_columns_and_new_columns(client):
+    sent = client.bulk_insert_columns("rows", ["run_id", "cluster_id", "extra"],
+                                      [[["d", "d"], [3, 4], ["x", None]]])
+    assert sent == 2
+    rows = client.table("rows").select("cluster_id,extra").eq("run_id", "d").order("id").execute().data
+    assert rows == [{"cluster_id": 3, "extra": "x"}, {"cluster_id": 4, "extra": None}]
+
+
+def test_insert_encoded_plain_and_gzipped(client):
+    body = json.dumps([{"run_id": "e", "cluster_id": 5}, {"run_id": "e", "cluster_id": 6}]).encode()
+    client.table("rows").insert_encoded(body).execute()
+    client.table("rows").insert_encoded(gzip.compress(body), "application/json", "gzip").execute()
+    rows = client.table("rows").select("cluster_id").eq("run_id", "e").order("id").execute().data
+    assert [r["cluster_id"] for r in rows] == [5, 6, 5, 6]
+    with pytest.raises(ValueError):
+        client.table("rows").insert_encoded(body, "application/json", "br")
+
+
+def test_read_only_client_cannot_write(client):
+    reader = SQLiteClient(client.path, read_only=True)
+    assert len(reader.table("rows").select("*").execute().data) == len(ROWS)
+    with pytest.raises(SupabaseError):
+        reader.table("rows").delete().eq("run_id", "a").execute()
+
+
+def test_storage_round_trip(client, tmp_path):
+    source = tmp_path / "state.bin"
+    source.write_bytes(b"\x00model\xff" * 1000)
+    client.upload_file("models", "run.joblib", str(source))
+    target = tmp_path / "copy.bin"
+    client.download_file("models", "run.joblib", str(target))
+    assert target.read_bytes() == source.read_bytes()
+    client.remove_files("models", ["run.joblib"])
+    with pytest.raises(SupabaseError):
+        client.download_file("models", "run.joblib", str(target))
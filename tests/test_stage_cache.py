@@ -0,0 +1,142 @@
+import os
+
+import numpy as np
+import pytest
+
+import process
+from scheduler import Stage, run_stages
+from stage_cache import StageCache, file_digest
+
+
+def _blob(n_bytes: int, seed: int) -> bytes:
+    """Incompressible bytes, so an entry's size on disk is about n_bytes."""
+    return np.random.default_rng(seed).bytes(n_bytes)
+
+
+def _age(cache: StageCache, key: str, seconds_ago: float):
+    when = os.path.getmtime(cache._path(key)) - seconds_ago
+    os.utime(cache._path(key), (when, when))
+
+
+def test_key_changes_with_its_inputs(tmp_path):
+    cache = StageCache(str(tmp_path), 1 << 20, code_version="v1")
+    base = cache.key("kmeans", {"n_clusters": 3, "chunk_rows": 1000}, ["scale-key"])
+    assert cache.key("kmeans", {"chunk_rows": 1000, "n_clusters": 3}, ["scale-key"]) == base
+    assert cache.key("kmeans", {"n_clusters": 4, "chunk_rows": 1000}, ["scale-key"]) != base
+    assert cache.key("kmeans", {"n_clusters": 3, "chunk_rows": 1000}, ["other-key"]) != base
+    assert cache.key("elbow", {"n_clusters": 3, "chunk_rows": 1000}, ["scale-key"]) != base
+    assert StageCache(str(tmp_path), 1 << 20, code_version="v2").key(
+        "kmeans", {"n_clusters": 3, "chunk_rows": 1000}, ["scale-key"]) != base
+
+
+def test_key_follows_the_file_digest(tmp_path):
+    cache = StageCache(str(tmp_path / "cache"), 1 << 20)
+    csv = tmp_path / "input.csv"
+    csv.write_text("a,b\n1,2\n")
+    first = cache.key("preprocess", {"csv": file_digest(str(csv))}, [])
+    os.utime(csv, (0, 0))  # touching the file is not a change
+    assert cache.key("preprocess", {"csv": file_digest(str(csv))}, []) == first
+    csv.write_text("a,b\n1,3\n")
+    assert cache.key("preprocess", {"csv": file_digest(str(csv))}, []) != first
+
+
+def test_get_put_round_trip_and_miss(tmp_path):
+    cache = StageCache(str(tmp_path), 1 << 20)
+    assert cache.get("absent") == (False, None)
+    value = {"rows": np.arange(10), "label": "x"}
+    cache.put("k1", value)
+    hit, stored = cache.get("k1")
+    assert hit and stored["label"] == "x"
+    np.testing.assert_array_equal(stored["rows"], value["rows"])
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+
+def test_corrupt_entry_is_a_miss(tmp_path):
+    cache = StageCache(str(tmp_path), 1 << 20)
+    cache.put("k1", list(range(1000)))
+    path = cache._path("k1")
+    with open(path, "r+b") as fh:
+        fh.truncate(os.path.getsize(path) // 2)
+    assert cache.get("k1") == (False, None)
+    assert not os.path.exists(path)
+    with open(cache._path("k2"), "wb") as fh:
+        fh.write(b"not a joblib file")
+    assert cache.get("k2") == (False, None)
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, monkeypatch):
+    monkeypatch.setattr(process, "PIPELINE_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(process, "PIPELINE_CACHE_MB", 0.25)  # 256 KiB
+    cache = process.open_stage_cache()
+    assert cache.max_bytes == 256 * 1024
+
+    for i, key in enumerate(("old", "used", "new")):
+        cache.put(key, _blob(80 * 1024, i))
+        _age(cache, key, 100 - 10 * i)
+    assert cache.get("used")[0]  # a hit makes "used" the most recent entry
+    cache.put("newest", _blob(80 * 1024, 3))
+    assert not os.path.exists(cache._path("old"))
+    assert all(os.path.exists(cache._path(k)) for k in ("used", "new", "newest"))
+    assert sum(os.path.getsize(cache._path(k)) for k in ("used", "new", "newest")) <= cache.max_bytes
+
+    # An entry larger than the whole budget does not stay
+    cache.put("huge", _blob(300 * 1024, 4))
+    assert not os.path.exists(cache._path("huge"))
+
+
+def test_cache_disabled_at_zero(monkeypatch):
+    monkeypatch.setattr(process, "PIPELINE_CACHE_MB", 0)
+    assert process.open_stage_cache() is None
+
+
+# Module-level stage functions, as the scheduler needs
+CALLS = []
+
+
+def load(n):
+    CALLS.append("load")
+    return list(range(n))
+
+
+def power(values, exponent):
+    CALLS.append("power")
+    return [v ** exponent for v in values]
+
+
+def total(values):
+    CALLS.append("total")
+    return sum(values)
+
+
+def _graph(n, exponent):
+    return [
+        Stage("load", load, kwargs={"n": n}),
+        Stage("power", power, deps=("load",), kwargs={"exponent": exponent}),
+        Stage("total", total, deps=("power",)),
+    ]
+
+
+def test_scheduler_recomputes_only_downstream_of_a_change(tmp_path):
+    cache = StageCache(str(tmp_path), 1 << 20)
+    CALLS.clear()
+    results, _ = run_stages(_graph(5, 2), workers=1, cache=cache)
+    assert results["total"] == 30 and CALLS == ["load", "power", "total"]
+
+    CALLS.clear()
+    results, timings = run_stages(_graph(5, 2), workers=1, cache=cache)
+    assert results["total"] == 30 and CALLS == []
+    assert all(t.cached for t in timings.values())
+
+    CALLS.clear()
+    results, timings = run_stages(_graph(5, 3), workers=1, cache=cache)
+    assert results["total"] == 100 and CALLS == ["power", "total"]
+    assert timings["load"].cached and not timings["power"].cached
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_cached_results_match_a_fresh_run(tmp_path, workers):
+    cache = StageCache(str(tmp_path), 1 << 20)
+    fresh, _ = run_stages(_graph(7, 2), workers=workers)
+    run_stages(_graph(7, 2), workers=workers, cache=cache)
+    cached, timings = run_stages(_graph(7, 2), workers=workers, cache=cache)
+    assert cached == fresh and all(t.cached for t in timings.values())
@@ -0,0 +1,257 @@
+import csv
+import gzip
+import io
+import json
+from datetime import timedelta
+
+import httpx
+import numpy as np
+import pandas as pd
+import pytest
+
+import process
+import supabase_client as sc
+
+
+class _Server:
+    """Scripted PostgREST stand-in: each request takes the next reply (a status, a response or an exception)."""
+
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.requests: list[httpx.Request] = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        reply = self.replies.pop(0) if len(self.replies) > 1 else self.replies[0]
+        if isinstance(reply, Exception):
+            raise reply
+        if isinstance(reply, int):
+            reply = httpx.Response(reply, json=[] if reply < 400 else {"message": "error"})
+        return _timed(reply)
+
+
+def _timed(response: httpx.Response) -> httpx.Response:
+    # A real transport sets elapsed when the body is read; execute() records it
+    response.elapsed = timedelta(milliseconds=1)
+    return response
+
+
+@pytest.fixture
+def sleeps(monkeypatch) -> list:
+    """Delays execute() would have slept, instead of sleeping them."""
+    slept = []
+    monkeypatch.setattr(sc.time, "sleep", slept.append)
+    return slept
+
+
+def _client(server: _Server) -> sc.SupabaseClient:
+    client = sc.SupabaseClient("http://localhost", "key")
+    client._http = httpx.Client(transport=httpx.MockTransport(server))
+    return client
+
+
+def _connect_error() -> httpx.ConnectError:
+    return httpx.ConnectError("connection refused")
+
+
+# -- Which requests are retried ----------------------------------------------
+
+@pytest.mark.parametrize("replies", [
+    [_connect_error(), 201],
+    [httpx.PoolTimeout("no free connection"), 201],
+    [429, 201],
+    [503, 503, 201],
+])
+def test_plain_insert_retried_when_it_cannot_have_run(replies, sleeps):
+    server = _Server(*replies)
+    _client(server).table("raw_data").insert([{"a": 1}]).execute(retries=3)
+    assert len(server.requests) == len(replies)
+    assert len(sleeps) == len(replies) - 1
+
+
+@pytest.mark.parametrize("reply", [500, 502, 504, 408, httpx.ReadTimeout("timed out")])
+def test_plain_insert_not_retried_when_it_may_have_run(reply, sleeps):
+    server = _Server(reply, 201)
+    with pytest.raises((sc.SupabaseError, httpx.ReadTimeout)):
+        _client(server).table("raw_data").insert([{"a": 1}]).execute(retries=3)
+    assert len(server.requests) == 1 and sleeps == []
+
+
+@pytest.mark.parametrize("status", sorted(sc.RETRYABLE_STATUS))
+def test_upsert_and_reads_retried_on_transient_errors(status, sleeps):
+    server = _Server(status, 201)
+    _client(server).table("data_stats").upsert([{"a": 1}], on_conflict="run_id,feature_name").execute(retries=1)
+    assert len(server.requests) == 2
+    assert server.requests[0].headers["Prefer"].startswith("resolution=merge-duplicates")
+
+    server = _Server(status, httpx.Response(200, json=[{"id": 1}], headers={"Content-Range": "0-0/1"}))
+    response = _client(server).table("raw_data").select("id", count="exact").execute(retries=1)
+    assert response.data == [{"id": 1}] and response.count == 1
+    assert len(server.requests) == 2
+
+
+def test_idempotent_requests_retried_on_read_timeout(sleeps):
+    server = _Server(httpx.ReadTimeout("timed out"), 204)
+    _client(server).table("raw_data").delete().eq("run_id", "r").execute(retries=1)
+    assert len(server.requests) == 2
+
+
+def test_client_errors_and_exhausted_retries_raise(sleeps):
+    server = _Server(409)
+    with pytest.raises(sc.SupabaseError) as excinfo:
+        _client(server).table("pipeline_version").upsert({"id": 1}, on_conflict="id").execute(retries=3)
+    assert excinfo.value.status_code == 409 and len(server.requests) == 1
+
+    server = _Server(503)
+    with pytest.raises(sc.SupabaseError):
+        _client(server).table("raw_data").insert([{"a": 1}]).execute(retries=2)
+    assert len(server.requests) == 3 and len(sleeps) == 2
+
+
+def test_retry_after_is_honoured(sleeps):
+    server = _Server(httpx.Response(429, headers={"Retry-After": "7"}), 201)
+    _client(server).table("raw_data").insert([{"a": 1}]).execute(retries=1)
+    assert sleeps == [7.0]
+
+    # Without the header the backoff grows with each attempt (with jitter)
+    server = _Server(503, 503, 503, 201)
+    _client(server).table("raw_data").insert([{"a": 1}]).execute(retries=3, backoff=1.0)
+    waits = sleeps[1:]
+    assert all(0.5 * 2 ** i <= w <= 1.5 * 2 ** i for i, w in enumerate(waits))
+
+
+def test_retry_after_is_capped(sleeps, monkeypatch):
+    monkeypatch.setattr(sc, "UPLOAD_MAX_RETRY_AFTER", 30.0)
+    server = _Server(httpx.Response(503, headers={"Retry-After": "86400"}), 201)
+    _client(server).table("raw_data").insert([{"a": 1}]).execute(retries=1)
+    assert sleeps == [30.0]
+
+
+# -- Chunking ------------------------------------------------------------------
+
+def test_oversize_rows_are_split_under_max_chunk_bytes():
+    rows = [{"id": i, "note": "x" * (5000 if i % 97 == 0 else 20)} for i in range(3000)]
+    chunks = list(sc._encode_chunks(iter(rows), max_bytes=16_000, max_rows=5000))
+    assert all(len(payload) <= 16_000 for payload, _ in chunks)
+    assert [r for payload, _ in chunks for r in json.loads(payload)] == rows
+    assert [n for _, n in chunks] == [len(json.loads(payload)) for payload, _ in chunks]
+
+    # A single row larger than the limit still goes out, alone
+    big = [{"id": 0, "note": "y" * 50_000}, {"id": 1, "note": ""}]
+    assert [n for _, n in sc._encode_chunks(iter(big), max_bytes=16_000, max_rows=5000)] == [1, 1]
+
+
+def test_bulk_insert_sends_every_row_once(sleeps):
+    received = []
+
+    def handler(request):
+        received.extend(json.loads(request.content))
+        return _timed(httpx.Response(201))
+
+    client = sc.SupabaseClient("http://localhost", "key")
+    client._http = httpx.Client(transport=httpx.MockTransport(handler))
+    rows = [{"id": i, "value": i * 0.5} for i in range(10_000)]
+    sent = client.bulk_insert("raw_data", rows, workers=4, max_chunk_bytes=20_000, max_chunk_rows=800)
+    assert sent == len(rows)
+    assert sorted(received, key=lambda r: r["id"]) == rows
+
+
+# -- CSV bulk loads ------------------------------------------------------------
+
+@pytest.fixture
+def gzip_accepted():
+    """Each test starts (and leaves) the process-wide gzip rejection unset."""
+    sc._gzip_rejected.clear()
+    yield
+    sc._gzip_rejected.clear()
+
+
+def _csv_frame(n: int = 300) -> pd.DataFrame:
+    rng = np.random.default_rng(5)
+    value = rng.normal(size=n) * 10.0 ** rng.integers(-8, 8, n)
+    value[::7] = np.nan
+    return pd.DataFrame({
+        "value": value,
+        "count": np.arange(n),
+        "flag": np.arange(n) % 3 == 0,
+        "note": [None if i % 5 == 0 else f'say "hi", {i}' for i in range(n)],
+        "timestamp": pd.date_range("2024-01-01", periods=n, freq="min"),
+    })
+
+
+class _CsvServer:
+    """Records each CSV request body (decompressed) and whether it came gzipped; gzip bodies get reject_gzip."""
+
+    def __init__(self, reject_gzip: int | None = None):
+        self.reject_gzip = reject_gzip
+        self.bodies: list[tuple[bool, bytes]] = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        assert request.headers["Content-Type"] == sc.CSV_CONTENT_TYPE
+        gzipped = request.headers.get("Content-Encoding") == "gzip"
+        self.bodies.append((gzipped, gzip.decompress(request.content) if gzipped else request.content))
+        if gzipped and self.reject_gzip:
+            return _timed(httpx.Response(self.reject_gzip, json={"message": "unsupported encoding"}))
+        return _timed(httpx.Response(201))
+
+
+def _send_csv(server: _CsvServer, df: pd.DataFrame, compress: bool) -> int:
+    columns = process.frame_columns(df, "run-1")
+    batches = process.iter_column_batches(df, 64, "run-1")
+    return _client(server).bulk_insert_columns(
+        "raw_data", columns, batches, workers=1, max_chunk_bytes=4000, max_chunk_rows=5000, compress=compress)
+
+
+def _parsed(bodies: list[bytes]) -> tuple[list, list]:
+    """Headers and data rows of CSV bodies."""
+    headers, rows = [], []
+    for body in bodies:
+        header, *lines = csv.reader(io.StringIO(body.decode()))
+        headers.append(header)
+        rows.extend(lines)
+    return headers, rows
+
+
+def test_csv_body_encodes_values_for_postgrest(gzip_accepted):
+    df = _csv_frame()
+    server = _CsvServer()
+    assert _send_csv(server, df, compress=False) == len(df)
+    assert len(server.bodies) > 1 and not any(gzipped for gzipped, _ in server.bodies)
+
+    headers, rows = _parsed([body for _, body in server.bodies])
+    # One header line per body, in columns order
+    assert headers == [process.frame_columns(df, "run-1")] * len(server.bodies)
+    assert len(rows) == len(df)
+    for record, (value, count, flag, note, timestamp, run_id) in zip(df.to_dict("records"), rows):
+        if np.isnan(record["value"]):
+            assert value == sc.CSV_NULL
+        else:
+            assert float(value) == record["value"]  # repr round-trips, exponents included
+        assert int(count) == record["count"]
+        # PostgreSQL's boolean input is case-insensitive
+        assert flag.lower() == str(record["flag"]).lower()
+        assert note == (sc.CSV_NULL if pd.isna(record["note"]) else record["note"])
+        assert pd.Timestamp(timestamp) == record["timestamp"]
+        assert run_id == "run-1"
+
+
+def test_gzip_body_decompresses_to_the_plain_csv(gzip_accepted):
+    df = _csv_frame()
+    plain, compressed = _CsvServer(), _CsvServer()
+    _send_csv(plain, df, compress=False)
+    _send_csv(compressed, df, compress=True)
+    assert all(gzipped for gzipped, _ in compressed.bodies)
+    assert [body for _, body in compressed.bodies] == [body for _, body in plain.bodies]
+
+
+@pytest.mark.parametrize("status", sorted(sc.GZIP_REJECTED_STATUS))
+def test_rejected_gzip_body_is_resent_plain(gzip_accepted, status, sleeps):
+    df = _csv_frame()
+    server = _CsvServer(reject_gzip=status)
+    assert _send_csv(server, df, compress=True) == len(df)
+    assert sc._gzip_rejected.is_set()
+    # The first chunk goes gzipped, is refused, and goes once more plain; the rest are plain only
+    assert [gzipped for gzipped, _ in server.bodies] == [True] + [False] * (len(server.bodies) - 1)
+    assert server.bodies[0][1] == server.bodies[1][1]
+    assert len(_parsed([body for _, body in server.bodies[1:]])[1]) == len(df)
+    assert sleeps == []